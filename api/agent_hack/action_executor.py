@@ -0,0 +1,132 @@
+import asyncio
+import concurrent.futures
+import functools
+import threading
+import time
+from typing import Any
+from typing import Callable
+from typing import TypeVar
+
+from core import logging
+from pydantic import BaseModel
+
+ResultT = TypeVar('ResultT')
+
+
+class ActionExecutorStats(BaseModel):
+    maxWorkers: int
+    waitingCount: int
+    queuedCount: int
+    activeCount: int
+    completedCount: int
+    failureCount: int
+    timeoutCount: int
+    totalDurationSeconds: float
+
+
+class ActionTimeoutException(Exception):
+    pass
+
+
+class ActionExecutor:
+
+    def __init__(self, maxWorkers: int = 8, maxConcurrentActionsPerUser: int = 2, timeoutSeconds: float = 180) -> None:
+        self.maxWorkers = maxWorkers
+        self.maxConcurrentActionsPerUser = maxConcurrentActionsPerUser
+        self.timeoutSeconds = timeoutSeconds
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=maxWorkers, thread_name_prefix='cdp-action')
+        self._userSemaphores: dict[str, asyncio.Semaphore] = {}
+        self._userReferenceCounts: dict[str, int] = {}
+        self._threadStatsLock = threading.Lock()
+        self.waitingCount = 0
+        self.queuedCount = 0
+        self.activeCount = 0
+        self.completedCount = 0
+        self.failureCount = 0
+        self.timeoutCount = 0
+        self.totalDurationSeconds = 0.0
+
+    def _run_in_thread(self, func: Callable[..., ResultT], kwargs: dict[str, Any]) -> ResultT:
+        with self._threadStatsLock:
+            self.queuedCount -= 1
+            self.activeCount += 1
+        startTime = time.perf_counter()
+        try:
+            return func(**kwargs)
+        finally:
+            with self._threadStatsLock:
+                self.activeCount -= 1
+                self.totalDurationSeconds += time.perf_counter() - startTime
+
+    def _reference_user_semaphore(self, userId: str) -> asyncio.Semaphore:
+        userSemaphore = self._userSemaphores.get(userId)
+        if userSemaphore is None:
+            userSemaphore = asyncio.Semaphore(self.maxConcurrentActionsPerUser)
+            self._userSemaphores[userId] = userSemaphore
+        self._userReferenceCounts[userId] = self._userReferenceCounts.get(userId, 0) + 1
+        return userSemaphore
+
+    def _dereference_user_semaphore(self, userId: str) -> None:
+        self._userReferenceCounts[userId] -= 1
+        if self._userReferenceCounts[userId] == 0:
+            del self._userReferenceCounts[userId]
+            del self._userSemaphores[userId]
+
+    def _release_user_semaphore(self, userId: str) -> None:
+        self._userSemaphores[userId].release()
+        self._dereference_user_semaphore(userId=userId)
+
+    def _submit(self, userId: str, func: Callable[..., ResultT], kwargs: dict[str, Any]) -> asyncio.Future[ResultT]:
+        with self._threadStatsLock:
+            self.queuedCount += 1
+        try:
+            future = asyncio.get_running_loop().run_in_executor(self.executor, functools.partial(self._run_in_thread, func, kwargs))
+        except BaseException:
+            with self._threadStatsLock:
+                self.queuedCount -= 1
+            self._release_user_semaphore(userId=userId)
+            raise
+        # The user's slot is given back when the thread finishes, not when the caller stops waiting,
+        # so actions that timed out but are still running keep counting against the per-user limit
+        future.add_done_callback(lambda _: self._release_user_semaphore(userId=userId))
+        return future
+
+    async def run(self, userId: str, actionName: str, func: Callable[..., ResultT], kwargs: dict[str, Any] | None = None, timeoutSeconds: float | None = None) -> ResultT:
+        timeoutSeconds = timeoutSeconds if timeoutSeconds is not None else self.timeoutSeconds
+        userSemaphore = self._reference_user_semaphore(userId=userId)
+        self.waitingCount += 1
+        try:
+            await userSemaphore.acquire()
+        except BaseException:
+            self._dereference_user_semaphore(userId=userId)
+            raise
+        finally:
+            self.waitingCount -= 1
+        future = self._submit(userId=userId, func=func, kwargs=kwargs or {})
+        try:
+            result = await asyncio.wait_for(asyncio.shield(future), timeout=timeoutSeconds)
+        except asyncio.TimeoutError as exception:
+            self.timeoutCount += 1
+            logging.error(f'Action {actionName} for {userId} timed out after {timeoutSeconds}s')
+            raise ActionTimeoutException(f'{actionName} did not finish within {timeoutSeconds} seconds, it may still complete in the background') from exception
+        except Exception:
+            self.failureCount += 1
+            raise
+        self.completedCount += 1
+        return result
+
+    def get_stats(self) -> ActionExecutorStats:
+        with self._threadStatsLock:
+            return ActionExecutorStats(
+                maxWorkers=self.maxWorkers,
+                waitingCount=self.waitingCount,
+                queuedCount=self.queuedCount,
+                activeCount=self.activeCount,
+                completedCount=self.completedCount,
+                failureCount=self.failureCount,
+                timeoutCount=self.timeoutCount,
+                totalDurationSeconds=self.totalDurationSeconds,
+            )
+
+    async def close(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
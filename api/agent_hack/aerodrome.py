@@ -5,16 +5,25 @@ from core.exceptions import NotFoundException
 from core.requester import Requester
 
 from agent_hack import uniswap_queries
+from agent_hack.uniswap import Token
 from agent_hack.uniswap import TokenWithPools
+from agent_hack.uniswap import list_subgraph_tokens_by_addresses
 from agent_hack.util import load_or_query
 
 
-async def get_token_by_address(requester: Requester, chainId: int, tokenAddress: str) -> TokenWithPools:
+def _get_query_url(chainId: int) -> str:
     if chainId == 8453:
-        queryUrl = f'https://gateway.thegraph.com/api/{os.environ["GRAPH_API_KEY"]}/subgraphs/id/GENunSHWLBXm59mBSgPzQ8metBEp9YDfdqwFr91Av1UM'
-    else:
-        raise KibaException('Unsupported network, only base is supported')
-    tokenDicts = await load_or_query(requester=requester, source='aerodrome', entityName='tokens', cacheEntityName=f'token-{tokenAddress}', hasInlinedItems=True, url=queryUrl, dataDict={
+        return f'https://gateway.thegraph.com/api/{os.environ["GRAPH_API_KEY"]}/subgraphs/id/GENunSHWLBXm59mBSgPzQ8metBEp9YDfdqwFr91Av1UM'
+    raise KibaException(f'Unsupported chain {chainId} for aerodrome, only base is supported')
+
+
+async def list_tokens_by_addresses(requester: Requester, chainId: int, tokenAddresses: list[str]) -> dict[str, Token]:
+    return await list_subgraph_tokens_by_addresses(requester=requester, source='aerodrome', chainId=chainId, queryUrl=_get_query_url(chainId=chainId), tokenAddresses=tokenAddresses)
+
+
+async def get_token_by_address(requester: Requester, chainId: int, tokenAddress: str) -> TokenWithPools:
+    queryUrl = _get_query_url(chainId=chainId)
+    tokenDicts = await load_or_query(requester=requester, source='aerodrome', entityName='tokens', cacheEntityName=f'token-{chainId}-{tokenAddress}', hasInlinedItems=True, url=queryUrl, dataDict={
         'query': uniswap_queries.GET_TOKEN,
         'variables': {
             'tokenAddress': tokenAddress.lower(),
@@ -0,0 +1,108 @@
+import asyncio
+import collections
+import functools
+import time
+from typing import Awaitable
+from typing import Callable
+from typing import Generic
+from typing import TypeVar
+
+from core import logging
+from pydantic import BaseModel
+
+ItemT = TypeVar('ItemT')
+
+
+class AgentExecutorPoolStats(BaseModel):
+    size: int
+    maxSize: int
+    hitCount: int
+    missCount: int
+    evictionCount: int
+
+
+class PoolEntry(Generic[ItemT]):
+
+    def __init__(self, item: ItemT, lastUsedTime: float) -> None:
+        self.item = item
+        self.lastUsedTime = lastUsedTime
+
+
+class AgentExecutorPool(Generic[ItemT]):
+
+    def __init__(self, maxSize: int = 100, idleSeconds: float = 1800) -> None:
+        self.maxSize = maxSize
+        self.idleSeconds = idleSeconds
+        self.hitCount = 0
+        self.missCount = 0
+        self.evictionCount = 0
+        self._entries: collections.OrderedDict[str, PoolEntry[ItemT]] = collections.OrderedDict()
+        self._pendingBuilds: dict[str, asyncio.Task[ItemT]] = {}
+
+    def _evict_idle(self, now: float) -> None:
+        while len(self._entries) > 0:
+            key, entry = next(iter(self._entries.items()))
+            if now - entry.lastUsedTime < self.idleSeconds:
+                break
+            del self._entries[key]
+            self.evictionCount += 1
+
+    def _evict_overflow(self) -> None:
+        while len(self._entries) > self.maxSize:
+            self._entries.popitem(last=False)
+            self.evictionCount += 1
+
+    async def _build(self, key: str, factory: Callable[[], Awaitable[ItemT]]) -> ItemT:
+        item = await factory()
+        self._entries[key] = PoolEntry(item=item, lastUsedTime=time.monotonic())
+        self._evict_overflow()
+        logging.info(f'Built agent executor for {key} (pool size {len(self._entries)})')
+        return item
+
+    def _on_build_done(self, key: str, task: asyncio.Task[ItemT]) -> None:
+        if self._pendingBuilds.get(key) is task:
+            del self._pendingBuilds[key]
+        # Retrieve the exception so a build whose callers have all gone away doesn't log "exception never retrieved"
+        if not task.cancelled():
+            task.exception()
+
+    async def get(self, key: str, factory: Callable[[], Awaitable[ItemT]]) -> ItemT:
+        while True:
+            now = time.monotonic()
+            self._evict_idle(now=now)
+            entry = self._entries.get(key)
+            if entry is not None:
+                self.hitCount += 1
+                entry.lastUsedTime = now
+                self._entries.move_to_end(key)
+                return entry.item
+            pendingBuild = self._pendingBuilds.get(key)
+            if pendingBuild is not None and not pendingBuild.done():
+                self.hitCount += 1
+            else:
+                self.missCount += 1
+                pendingBuild = asyncio.create_task(self._build(key=key, factory=factory))
+                pendingBuild.add_done_callback(functools.partial(self._on_build_done, key))
+                self._pendingBuilds[key] = pendingBuild
+            try:
+                return await asyncio.shield(pendingBuild)
+            except asyncio.CancelledError:
+                # A cancelled build (rather than a cancelled caller) has cleared its slot, so the next attempt starts a new one
+                currentTask = asyncio.current_task()
+                if not pendingBuild.cancelled() or (currentTask is not None and currentTask.cancelling() > 0):
+                    raise
+
+    def remove(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def get_stats(self) -> AgentExecutorPoolStats:
+        return AgentExecutorPoolStats(
+            size=len(self._entries),
+            maxSize=self.maxSize,
+            hitCount=self.hitCount,
+            missCount=self.missCount,
+            evictionCount=self.evictionCount,
+        )
@@ -0,0 +1,157 @@
+import abc
+import datetime
+import math
+
+import aiosqlite
+from core.exceptions import KibaException
+from pydantic import BaseModel
+
+from agent_hack import tracing
+
+
+class ApySample(BaseModel):
+    vaultAddress: str
+    sampleDate: datetime.datetime
+    totalApy: float
+    baseApy: float
+    totalDepositsUsd: float
+
+
+class ApyStatistics(BaseModel):
+    chainId: int
+    vaultAddress: str
+    sampleCount: int
+    firstSampleDate: datetime.datetime
+    lastSampleDate: datetime.datetime
+    meanApy: float
+    apyVolatility: float
+    minApy: float
+    maxApy: float
+    latestApy: float
+    drawdown: float
+
+
+class ApyHistoryStore(abc.ABC):
+
+    async def connect(self) -> None:
+        pass
+
+    async def disconnect(self) -> None:
+        pass
+
+    @abc.abstractmethod
+    async def add_samples(self, chainId: int, samples: list[ApySample]) -> None:
+        pass
+
+    @abc.abstractmethod
+    async def get_statistics(self, chainId: int) -> dict[str, ApyStatistics]:
+        pass
+
+    @abc.abstractmethod
+    async def get_vault_statistics(self, chainId: int, vaultAddress: str) -> ApyStatistics | None:
+        pass
+
+
+class SqliteApyHistoryStore(ApyHistoryStore):
+
+    def __init__(self, filePath: str, sampleIntervalSeconds: int = 3600, windowSeconds: int = 30 * 24 * 60 * 60, retentionSeconds: int = 90 * 24 * 60 * 60) -> None:
+        self.filePath = filePath
+        self.sampleIntervalSeconds = sampleIntervalSeconds
+        self.windowSeconds = windowSeconds
+        self.retentionSeconds = retentionSeconds
+        self._connection: aiosqlite.Connection | None = None
+        self._statisticsSampleTimes: dict[int, int] = {}
+
+    async def connect(self) -> None:
+        if self._connection is not None:
+            return
+        self._connection = await aiosqlite.connect(self.filePath)
+        await self._connection.execute('PRAGMA journal_mode=WAL;')
+        await self._connection.execute('CREATE TABLE IF NOT EXISTS apy_samples (chain_id INTEGER NOT NULL, vault_address TEXT NOT NULL, sample_time INTEGER NOT NULL, total_apy REAL NOT NULL, base_apy REAL NOT NULL, total_deposits_usd REAL NOT NULL, PRIMARY KEY (chain_id, vault_address, sample_time)) WITHOUT ROWID;')
+        await self._connection.execute('CREATE TABLE IF NOT EXISTS apy_statistics (chain_id INTEGER NOT NULL, vault_address TEXT NOT NULL, sample_count INTEGER NOT NULL, first_sample_time INTEGER NOT NULL, last_sample_time INTEGER NOT NULL, mean_apy REAL NOT NULL, apy_variance REAL NOT NULL, min_apy REAL NOT NULL, max_apy REAL NOT NULL, latest_apy REAL NOT NULL, PRIMARY KEY (chain_id, vault_address)) WITHOUT ROWID;')
+        await self._connection.commit()
+
+    async def disconnect(self) -> None:
+        if self._connection is not None:
+            await self._connection.close()
+        self._connection = None
+
+    def _get_connection(self) -> aiosqlite.Connection:
+        if self._connection is None:
+            raise KibaException('SqliteApyHistoryStore has not been connected')
+        return self._connection
+
+    @staticmethod
+    def _row_to_statistics(row: aiosqlite.Row) -> ApyStatistics:
+        return ApyStatistics(
+            chainId=row[0],
+            vaultAddress=row[1],
+            sampleCount=row[2],
+            firstSampleDate=datetime.datetime.fromtimestamp(row[3], tz=datetime.timezone.utc),
+            lastSampleDate=datetime.datetime.fromtimestamp(row[4], tz=datetime.timezone.utc),
+            meanApy=row[5],
+            apyVolatility=math.sqrt(max(row[6], 0.0)),
+            minApy=row[7],
+            maxApy=row[8],
+            latestApy=row[9],
+            drawdown=row[8] - row[9],
+        )
+
+    async def add_samples(self, chainId: int, samples: list[ApySample]) -> None:
+        if len(samples) == 0:
+            return
+        connection = self._get_connection()
+        sampleTime = int(max(sample.sampleDate for sample in samples).timestamp()) // self.sampleIntervalSeconds * self.sampleIntervalSeconds
+        with tracing.span('apy_history_write'):
+            await connection.executemany(
+                'INSERT OR REPLACE INTO apy_samples (chain_id, vault_address, sample_time, total_apy, base_apy, total_deposits_usd) VALUES (?, ?, ?, ?, ?, ?);',
+                [(chainId, sample.vaultAddress.lower(), sampleTime, sample.totalApy, sample.baseApy, sample.totalDepositsUsd) for sample in samples],
+            )
+            if self._statisticsSampleTimes.get(chainId) == sampleTime:
+                await connection.commit()
+                return
+            await connection.execute('DELETE FROM apy_samples WHERE chain_id = ? AND sample_time < ?;', (chainId, sampleTime - self.retentionSeconds))
+            async with connection.execute(
+                'SELECT vault_address, COUNT(*), MIN(sample_time), MAX(sample_time), AVG(total_apy), AVG(total_apy * total_apy) - AVG(total_apy) * AVG(total_apy), MIN(total_apy), MAX(total_apy) '
+                'FROM apy_samples WHERE chain_id = ? AND sample_time >= ? GROUP BY vault_address;',
+                (chainId, sampleTime - self.windowSeconds),
+            ) as cursor:
+                statisticsRows = await cursor.fetchall()
+            latestApys = {sample.vaultAddress.lower(): sample.totalApy for sample in samples}
+            await connection.execute('DELETE FROM apy_statistics WHERE chain_id = ?;', (chainId, ))
+            await connection.executemany(
+                'INSERT INTO apy_statistics (chain_id, vault_address, sample_count, first_sample_time, last_sample_time, mean_apy, apy_variance, min_apy, max_apy, latest_apy) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?);',
+                [(chainId, *row, latestApys[row[0]]) for row in statisticsRows if row[0] in latestApys],
+            )
+            await connection.commit()
+        self._statisticsSampleTimes[chainId] = sampleTime
+
+    async def get_statistics(self, chainId: int) -> dict[str, ApyStatistics]:
+        query = 'SELECT chain_id, vault_address, sample_count, first_sample_time, last_sample_time, mean_apy, apy_variance, min_apy, max_apy, latest_apy FROM apy_statistics WHERE chain_id = ?;'
+        async with self._get_connection().execute(query, (chainId, )) as cursor:
+            rows = await cursor.fetchall()
+        return {row[1]: self._row_to_statistics(row=row) for row in rows}
+
+    async def get_vault_statistics(self, chainId: int, vaultAddress: str) -> ApyStatistics | None:
+        query = 'SELECT chain_id, vault_address, sample_count, first_sample_time, last_sample_time, mean_apy, apy_variance, min_apy, max_apy, latest_apy FROM apy_statistics WHERE chain_id = ? AND vault_address = ?;'
+        async with self._get_connection().execute(query, (chainId, vaultAddress.lower())) as cursor:
+            row = await cursor.fetchone()
+        return self._row_to_statistics(row=row) if row else None
+
+
+def create_apy_history_store(connectionString: str, sampleIntervalSeconds: int = 3600, windowSeconds: int = 30 * 24 * 60 * 60) -> ApyHistoryStore:
+    if connectionString.startswith('sqlite:///'):
+        return SqliteApyHistoryStore(filePath=connectionString.removeprefix('sqlite:///'), sampleIntervalSeconds=sampleIntervalSeconds, windowSeconds=windowSeconds)
+    raise KibaException(f'Unsupported apy history store connection string: {connectionString}')
+
+
+_apyHistoryStore: ApyHistoryStore | None = None
+
+
+def set_apy_history_store(apyHistoryStore: ApyHistoryStore | None) -> None:
+    global _apyHistoryStore  # pylint: disable=global-statement
+    _apyHistoryStore = apyHistoryStore
+
+
+def get_apy_history_store() -> ApyHistoryStore | None:
+    return _apyHistoryStore
@@ -0,0 +1,166 @@
+import asyncio
+import base64
+import collections
+import datetime
+import hashlib
+import re
+import time
+
+from core import logging
+from core.exceptions import UnauthorizedException
+from eth_account.messages import encode_defunct
+from pydantic import BaseModel
+from web3 import Web3
+
+ISSUED_AT_PATTERN = re.compile(r'^\s*issued[ _-]?at\s*:\s*(\S+)\s*$', re.IGNORECASE | re.MULTILINE)
+EXPIRATION_TIME_PATTERN = re.compile(r'^\s*expiration[ _-]?time\s*:\s*(\S+)\s*$', re.IGNORECASE | re.MULTILINE)
+MAX_CLOCK_SKEW_SECONDS = 300
+
+w3 = Web3()
+
+
+class AuthToken(BaseModel):
+    message: str
+    signature: str
+
+
+class AuthTokenClaims(BaseModel):
+    signerId: str
+    issuedAt: datetime.datetime | None = None
+    expirationTime: datetime.datetime | None = None
+
+
+class AuthTokenVerifierStats(BaseModel):
+    size: int
+    maxSize: int
+    hitCount: int
+    missCount: int
+    failureCount: int
+    expiredCount: int
+    totalVerificationSeconds: float
+    maxVerificationSeconds: float
+
+
+class CacheEntry:
+
+    def __init__(self, claims: AuthTokenClaims, expiryTime: float) -> None:
+        self.claims = claims
+        self.expiryTime = expiryTime
+
+
+def _parse_date(value: str) -> datetime.datetime | None:
+    try:
+        date = datetime.datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    return date if date.tzinfo else date.replace(tzinfo=datetime.timezone.utc)
+
+
+def parse_auth_token_claims(signerId: str, message: str) -> AuthTokenClaims:
+    issuedAtMatch = ISSUED_AT_PATTERN.search(message)
+    expirationTimeMatch = EXPIRATION_TIME_PATTERN.search(message)
+    return AuthTokenClaims(
+        signerId=signerId,
+        issuedAt=_parse_date(issuedAtMatch.group(1)) if issuedAtMatch else None,
+        expirationTime=_parse_date(expirationTimeMatch.group(1)) if expirationTimeMatch else None,
+    )
+
+
+def recover_auth_token_claims(authorizationHeader: str) -> AuthTokenClaims:
+    authTokenJson = base64.b64decode(authorizationHeader).decode('utf-8')
+    authToken = AuthToken.model_validate_json(authTokenJson)
+    signerId = w3.eth.account.recover_message(encode_defunct(text=authToken.message), signature=authToken.signature)
+    return parse_auth_token_claims(signerId=signerId, message=authToken.message)
+
+
+class AuthTokenVerifier:
+
+    def __init__(self, maxSize: int = 10000, ttlSeconds: float = 3600, maxTokenAgeSeconds: float | None = None) -> None:
+        self.maxSize = maxSize
+        self.ttlSeconds = ttlSeconds
+        self.maxTokenAgeSeconds = maxTokenAgeSeconds
+        self.hitCount = 0
+        self.missCount = 0
+        self.failureCount = 0
+        self.expiredCount = 0
+        self.totalVerificationSeconds = 0.0
+        self.maxVerificationSeconds = 0.0
+        self._entries: collections.OrderedDict[bytes, CacheEntry] = collections.OrderedDict()
+
+    def _get_token_expiry_date(self, claims: AuthTokenClaims) -> datetime.datetime | None:
+        expiryDates = []
+        if claims.expirationTime is not None:
+            expiryDates.append(claims.expirationTime)
+        if claims.issuedAt is not None and self.maxTokenAgeSeconds is not None:
+            expiryDates.append(claims.issuedAt + datetime.timedelta(seconds=self.maxTokenAgeSeconds))
+        return min(expiryDates) if expiryDates else None
+
+    def _get_cached_claims(self, key: bytes) -> AuthTokenClaims | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expiryTime <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry.claims
+
+    def _set_cached_claims(self, key: bytes, claims: AuthTokenClaims, ttlSeconds: float) -> None:
+        self._entries[key] = CacheEntry(claims=claims, expiryTime=time.monotonic() + ttlSeconds)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxSize:
+            self._entries.popitem(last=False)
+
+    async def _recover_claims(self, authorizationHeader: str) -> AuthTokenClaims:
+        startTime = time.perf_counter()
+        try:
+            return await asyncio.to_thread(recover_auth_token_claims, authorizationHeader)
+        finally:
+            durationSeconds = time.perf_counter() - startTime
+            self.totalVerificationSeconds += durationSeconds
+            self.maxVerificationSeconds = max(self.maxVerificationSeconds, durationSeconds)
+
+    async def verify(self, authorizationHeader: str | None, userId: str) -> AuthTokenClaims:
+        if authorizationHeader is None:
+            raise UnauthorizedException()
+        key = hashlib.sha256(authorizationHeader.encode()).digest()
+        claims = self._get_cached_claims(key=key)
+        if claims is not None:
+            self.hitCount += 1
+        else:
+            self.missCount += 1
+            try:
+                claims = await self._recover_claims(authorizationHeader=authorizationHeader)
+            except Exception as exception:
+                self.failureCount += 1
+                logging.info(f'Signature verification failed: {exception}')
+                raise UnauthorizedException() from exception
+            if claims.issuedAt is not None and claims.issuedAt > datetime.datetime.now(tz=datetime.timezone.utc) + datetime.timedelta(seconds=MAX_CLOCK_SKEW_SECONDS):
+                self.failureCount += 1
+                raise UnauthorizedException('Auth token was issued in the future')
+            ttlSeconds = self.ttlSeconds
+            expiryDate = self._get_token_expiry_date(claims=claims)
+            if expiryDate is not None:
+                ttlSeconds = min(ttlSeconds, (expiryDate - datetime.datetime.now(tz=datetime.timezone.utc)).total_seconds())
+            if ttlSeconds <= 0:
+                self.expiredCount += 1
+                raise UnauthorizedException('Auth token has expired')
+            self._set_cached_claims(key=key, claims=claims, ttlSeconds=ttlSeconds)
+        if claims.signerId.lower() != userId.lower():
+            raise UnauthorizedException()
+        return claims
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def get_stats(self) -> AuthTokenVerifierStats:
+        return AuthTokenVerifierStats(
+            size=len(self._entries),
+            maxSize=self.maxSize,
+            hitCount=self.hitCount,
+            missCount=self.missCount,
+            failureCount=self.failureCount,
+            expiredCount=self.expiredCount,
+            totalVerificationSeconds=self.totalVerificationSeconds,
+            maxVerificationSeconds=self.maxVerificationSeconds,
+        )
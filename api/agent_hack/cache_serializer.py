@@ -0,0 +1,104 @@
+import abc
+import json
+from typing import Any
+
+from core.exceptions import KibaException
+
+CACHE_FORMAT_VERSION = 1
+_HEADER_PREFIX = b'agent-hack-cache'
+_ORJSON_JSON_FALLBACK_PREFIX = b'json:'
+
+
+class CacheSerializer(abc.ABC):
+    name: str
+
+    @abc.abstractmethod
+    def serialize(self, value: Any) -> bytes:
+        pass
+
+    @abc.abstractmethod
+    def deserialize(self, content: bytes) -> Any:
+        pass
+
+    def get_header(self) -> bytes:
+        return _HEADER_PREFIX + f':{CACHE_FORMAT_VERSION}:{self.name}\n'.encode()
+
+    def dump(self, value: Any) -> bytes:
+        return self.get_header() + self.serialize(value=value)
+
+    def load(self, content: bytes) -> Any | None:
+        header = self.get_header()
+        if not content.startswith(header):
+            return None
+        return self.deserialize(content=content[len(header):])
+
+
+class JsonCacheSerializer(CacheSerializer):
+    name = 'json'
+
+    def serialize(self, value: Any) -> bytes:
+        return json.dumps(value, separators=(',', ':')).encode()
+
+    def deserialize(self, content: bytes) -> Any:
+        return json.loads(content)
+
+
+class OrjsonCacheSerializer(CacheSerializer):
+    name = 'orjson'
+
+    def __init__(self) -> None:
+        try:
+            import orjson  # pylint: disable=import-outside-toplevel
+        except ImportError as exception:
+            raise KibaException('OrjsonCacheSerializer requires orjson to be installed') from exception
+        self._orjson = orjson
+
+    def serialize(self, value: Any) -> bytes:
+        try:
+            return self._orjson.dumps(value)  # pylint: disable=no-member
+        except TypeError:
+            # orjson only supports 64-bit integers (token supplies can be bigger) so fall back to json
+            return _ORJSON_JSON_FALLBACK_PREFIX + json.dumps(value, separators=(',', ':')).encode()
+
+    def deserialize(self, content: bytes) -> Any:
+        if content.startswith(_ORJSON_JSON_FALLBACK_PREFIX):
+            return json.loads(content[len(_ORJSON_JSON_FALLBACK_PREFIX):])
+        return self._orjson.loads(content)  # pylint: disable=no-member
+
+
+class ZstdCacheSerializer(CacheSerializer):
+
+    def __init__(self, innerSerializer: CacheSerializer, compressionLevel: int = 3) -> None:
+        try:
+            import zstandard  # pylint: disable=import-outside-toplevel
+        except ImportError as exception:
+            raise KibaException('ZstdCacheSerializer requires zstandard to be installed') from exception
+        self.name = f'{innerSerializer.name}-zstd'
+        self.innerSerializer = innerSerializer
+        self._compressor = zstandard.ZstdCompressor(level=compressionLevel)
+        self._decompressor = zstandard.ZstdDecompressor()
+
+    def serialize(self, value: Any) -> bytes:
+        return self._compressor.compress(self.innerSerializer.serialize(value=value))
+
+    def deserialize(self, content: bytes) -> Any:
+        return self.innerSerializer.deserialize(content=self._decompressor.decompress(content))
+
+
+def create_cache_serializer(name: str) -> CacheSerializer:
+    if name == 'json':
+        return JsonCacheSerializer()
+    if name == 'orjson':
+        return OrjsonCacheSerializer()
+    if name == 'json-zstd':
+        return ZstdCacheSerializer(innerSerializer=JsonCacheSerializer())
+    if name == 'orjson-zstd':
+        return ZstdCacheSerializer(innerSerializer=OrjsonCacheSerializer())
+    raise KibaException(f'Unknown cache serializer: {name}')
+
+
+def create_default_cache_serializer() -> CacheSerializer:
+    try:
+        return OrjsonCacheSerializer()
+    except KibaException:
+        return JsonCacheSerializer()
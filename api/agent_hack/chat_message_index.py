@@ -0,0 +1,139 @@
+import abc
+import datetime
+
+import aiosqlite
+from core.exceptions import KibaException
+from pydantic import BaseModel
+
+
+class IndexedChatMessage(BaseModel):
+    messageId: int
+    threadId: str
+    externalId: str
+    content: str
+    isUser: bool
+    createdDate: datetime.datetime
+
+
+class ChatMessagePage(BaseModel):
+    messages: list[IndexedChatMessage]
+    hasMore: bool
+    latestMessageId: int | None
+
+
+class ChatMessageIndex(abc.ABC):
+
+    async def connect(self) -> None:
+        pass
+
+    async def disconnect(self) -> None:
+        pass
+
+    @abc.abstractmethod
+    async def add_messages(self, threadId: str, messages: list[tuple[str, str, bool]]) -> None:
+        pass
+
+    @abc.abstractmethod
+    async def has_messages(self, threadId: str) -> bool:
+        pass
+
+    @abc.abstractmethod
+    async def get_latest_message_id(self, threadId: str) -> int | None:
+        pass
+
+    @abc.abstractmethod
+    async def get_latest_external_id(self, threadId: str) -> str | None:
+        pass
+
+    @abc.abstractmethod
+    async def get_latest_user_message(self, threadId: str) -> IndexedChatMessage | None:
+        pass
+
+    @abc.abstractmethod
+    async def list_messages(self, threadId: str, limit: int, beforeMessageId: int | None = None, sinceMessageId: int | None = None) -> ChatMessagePage:
+        pass
+
+
+class SqliteChatMessageIndex(ChatMessageIndex):
+
+    def __init__(self, filePath: str) -> None:
+        self.filePath = filePath
+        self._connection: aiosqlite.Connection | None = None
+
+    async def connect(self) -> None:
+        if self._connection is not None:
+            return
+        self._connection = await aiosqlite.connect(self.filePath)
+        await self._connection.execute('PRAGMA journal_mode=WAL;')
+        await self._connection.execute('CREATE TABLE IF NOT EXISTS chat_messages (message_id INTEGER PRIMARY KEY AUTOINCREMENT, thread_id TEXT NOT NULL, external_id TEXT NOT NULL, content TEXT NOT NULL, is_user INTEGER NOT NULL, created_date TEXT NOT NULL, UNIQUE (thread_id, external_id));')
+        await self._connection.commit()
+
+    async def disconnect(self) -> None:
+        if self._connection is not None:
+            await self._connection.close()
+        self._connection = None
+
+    def _get_connection(self) -> aiosqlite.Connection:
+        if self._connection is None:
+            raise KibaException('SqliteChatMessageIndex has not been connected')
+        return self._connection
+
+    @staticmethod
+    def _row_to_message(row: aiosqlite.Row) -> IndexedChatMessage:
+        return IndexedChatMessage(messageId=row[0], threadId=row[1], externalId=row[2], content=row[3], isUser=bool(row[4]), createdDate=datetime.datetime.fromisoformat(row[5]))
+
+    async def add_messages(self, threadId: str, messages: list[tuple[str, str, bool]]) -> None:
+        if len(messages) == 0:
+            return
+        connection = self._get_connection()
+        createdDate = datetime.datetime.now(tz=datetime.timezone.utc).isoformat()
+        await connection.executemany(
+            'INSERT INTO chat_messages (thread_id, external_id, content, is_user, created_date) VALUES (?, ?, ?, ?, ?) ON CONFLICT (thread_id, external_id) DO NOTHING;',
+            [(threadId, externalId, content, int(isUser), createdDate) for (externalId, content, isUser) in messages],
+        )
+        await connection.commit()
+
+    async def has_messages(self, threadId: str) -> bool:
+        async with self._get_connection().execute('SELECT 1 FROM chat_messages WHERE thread_id = ? LIMIT 1;', (threadId, )) as cursor:
+            row = await cursor.fetchone()
+        return row is not None
+
+    async def get_latest_message_id(self, threadId: str) -> int | None:
+        async with self._get_connection().execute('SELECT MAX(message_id) FROM chat_messages WHERE thread_id = ?;', (threadId, )) as cursor:
+            row = await cursor.fetchone()
+        return row[0] if row else None
+
+    async def get_latest_external_id(self, threadId: str) -> str | None:
+        async with self._get_connection().execute('SELECT external_id FROM chat_messages WHERE thread_id = ? ORDER BY message_id DESC LIMIT 1;', (threadId, )) as cursor:
+            row = await cursor.fetchone()
+        return row[0] if row else None
+
+    async def get_latest_user_message(self, threadId: str) -> IndexedChatMessage | None:
+        async with self._get_connection().execute('SELECT message_id, thread_id, external_id, content, is_user, created_date FROM chat_messages WHERE thread_id = ? AND is_user = 1 ORDER BY message_id DESC LIMIT 1;', (threadId, )) as cursor:
+            row = await cursor.fetchone()
+        return self._row_to_message(row=row) if row else None
+
+    async def list_messages(self, threadId: str, limit: int, beforeMessageId: int | None = None, sinceMessageId: int | None = None) -> ChatMessagePage:
+        columns = 'message_id, thread_id, external_id, content, is_user, created_date'
+        if sinceMessageId is not None:
+            query = f'SELECT {columns} FROM chat_messages WHERE thread_id = ? AND message_id > ? ORDER BY message_id ASC LIMIT ?;'
+            parameters: tuple[str | int, ...] = (threadId, sinceMessageId, limit + 1)
+        elif beforeMessageId is not None:
+            query = f'SELECT {columns} FROM chat_messages WHERE thread_id = ? AND message_id < ? ORDER BY message_id DESC LIMIT ?;'
+            parameters = (threadId, beforeMessageId, limit + 1)
+        else:
+            query = f'SELECT {columns} FROM chat_messages WHERE thread_id = ? ORDER BY message_id DESC LIMIT ?;'
+            parameters = (threadId, limit + 1)
+        async with self._get_connection().execute(query, parameters) as cursor:
+            rows = list(await cursor.fetchall())
+        hasMore = len(rows) > limit
+        messages = [self._row_to_message(row=row) for row in rows[:limit]]
+        if sinceMessageId is None:
+            messages.reverse()
+        return ChatMessagePage(messages=messages, hasMore=hasMore, latestMessageId=await self.get_latest_message_id(threadId=threadId))
+
+
+def create_chat_message_index(connectionString: str) -> ChatMessageIndex:
+    if connectionString.startswith('sqlite:///'):
+        return SqliteChatMessageIndex(filePath=connectionString.removeprefix('sqlite:///'))
+    raise KibaException(f'Unsupported chat message index connection string: {connectionString}')
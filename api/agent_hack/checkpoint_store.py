@@ -0,0 +1,247 @@
+import abc
+import asyncio
+import builtins
+import contextlib
+from typing import Any
+from typing import AsyncIterator
+from typing import Iterator
+from typing import Sequence
+
+import aiosqlite
+from core import logging
+from core.exceptions import KibaException
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.base import ChannelVersions
+from langgraph.checkpoint.base import Checkpoint
+from langgraph.checkpoint.base import CheckpointMetadata
+from langgraph.checkpoint.base import CheckpointTuple
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+from agent_hack import tracing
+
+
+class TracedCheckpointSaver(BaseCheckpointSaver):  # type: ignore[type-arg]
+    """Wraps a checkpointer to record spans for checkpoint reads and writes."""
+
+    def __init__(self, checkpointer: BaseCheckpointSaver) -> None:  # type: ignore[type-arg]
+        super().__init__(serde=checkpointer.serde)
+        self.checkpointer = checkpointer
+
+    @property
+    def config_specs(self) -> builtins.list:  # type: ignore[type-arg]
+        return self.checkpointer.config_specs
+
+    def get_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        return self.checkpointer.get_tuple(config)
+
+    def list(self, config: RunnableConfig | None, **kwargs: Any) -> Iterator[CheckpointTuple]:
+        return self.checkpointer.list(config, **kwargs)
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata, new_versions: ChannelVersions) -> RunnableConfig:  # pylint: disable=invalid-name
+        return self.checkpointer.put(config, checkpoint, metadata, new_versions)
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str, task_path: str = '') -> None:  # pylint: disable=invalid-name
+        self.checkpointer.put_writes(config, writes, task_id, task_path)
+
+    def delete_thread(self, thread_id: str) -> None:  # pylint: disable=invalid-name
+        self.checkpointer.delete_thread(thread_id)
+
+    async def aget_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        with tracing.span('checkpoint_read'):
+            return await self.checkpointer.aget_tuple(config)
+
+    async def alist(self, config: RunnableConfig | None, **kwargs: Any) -> AsyncIterator[CheckpointTuple]:  # type: ignore[override]
+        async for checkpointTuple in self.checkpointer.alist(config, **kwargs):
+            yield checkpointTuple
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata, new_versions: ChannelVersions) -> RunnableConfig:  # pylint: disable=invalid-name
+        with tracing.span('checkpoint_write'):
+            return await self.checkpointer.aput(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str, task_path: str = '') -> None:  # pylint: disable=invalid-name
+        with tracing.span('checkpoint_write_pending'):
+            await self.checkpointer.aput_writes(config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:  # pylint: disable=invalid-name
+        await self.checkpointer.adelete_thread(thread_id)
+
+    def get_next_version(self, current: Any, channel: Any) -> Any:
+        return self.checkpointer.get_next_version(current, channel)
+
+
+class CheckpointStore(abc.ABC):
+
+    @abc.abstractmethod
+    async def connect(self) -> None:
+        pass
+
+    @abc.abstractmethod
+    async def disconnect(self) -> None:
+        pass
+
+    @abc.abstractmethod
+    def get_checkpointer(self) -> BaseCheckpointSaver:
+        pass
+
+    async def prune(self, keepCheckpointsPerThread: int) -> int:  # pylint: disable=unused-argument
+        return 0
+
+    @contextlib.asynccontextmanager
+    async def reader(self) -> AsyncIterator[BaseCheckpointSaver]:
+        yield self.get_checkpointer()
+
+
+class SqliteCheckpointStore(CheckpointStore):
+
+    def __init__(self, filePath: str, readerPoolSize: int = 4, busyTimeoutMillis: int = 5000) -> None:
+        self.filePath = filePath
+        self.readerPoolSize = readerPoolSize
+        self.busyTimeoutMillis = busyTimeoutMillis
+        self._connections: list[aiosqlite.Connection] = []
+        self._writer: AsyncSqliteSaver | None = None
+        self._tracedWriter: TracedCheckpointSaver | None = None
+        self._readers: asyncio.Queue[TracedCheckpointSaver] = asyncio.Queue()
+
+    async def _open_connection(self) -> aiosqlite.Connection:
+        connection = await aiosqlite.connect(self.filePath)
+        await connection.execute('PRAGMA journal_mode=WAL;')
+        await connection.execute('PRAGMA synchronous=NORMAL;')
+        await connection.execute(f'PRAGMA busy_timeout={int(self.busyTimeoutMillis)};')
+        self._connections.append(connection)
+        return connection
+
+    async def connect(self) -> None:
+        if self._writer is not None:
+            return
+        self._writer = AsyncSqliteSaver(conn=await self._open_connection())
+        await self._writer.setup()
+        self._tracedWriter = TracedCheckpointSaver(checkpointer=self._writer)
+        for _ in range(self.readerPoolSize):
+            reader = AsyncSqliteSaver(conn=await self._open_connection())
+            await reader.setup()
+            self._readers.put_nowait(TracedCheckpointSaver(checkpointer=reader))
+        logging.info(f'Connected sqlite checkpoint store at {self.filePath} with {self.readerPoolSize} readers')
+
+    async def disconnect(self) -> None:
+        for connection in self._connections:
+            await connection.close()
+        self._connections = []
+        self._writer = None
+        self._tracedWriter = None
+        self._readers = asyncio.Queue()
+
+    def get_checkpointer(self) -> BaseCheckpointSaver:
+        if self._tracedWriter is None:
+            raise KibaException('CheckpointStore has not been connected')
+        return self._tracedWriter
+
+    async def prune(self, keepCheckpointsPerThread: int) -> int:
+        writer = self._writer
+        if writer is None:
+            raise KibaException('CheckpointStore has not been connected')
+        async with writer.lock:
+            cursor = await writer.conn.execute(
+                'DELETE FROM checkpoints WHERE (thread_id, checkpoint_ns, checkpoint_id) IN ('
+                'SELECT thread_id, checkpoint_ns, checkpoint_id FROM ('
+                'SELECT thread_id, checkpoint_ns, checkpoint_id, ROW_NUMBER() OVER (PARTITION BY thread_id, checkpoint_ns ORDER BY checkpoint_id DESC) AS row_number FROM checkpoints'
+                ') WHERE row_number > ?);',
+                (keepCheckpointsPerThread, ),
+            )
+            deletedCount = cursor.rowcount
+            await writer.conn.execute('DELETE FROM writes WHERE (thread_id, checkpoint_ns, checkpoint_id) NOT IN (SELECT thread_id, checkpoint_ns, checkpoint_id FROM checkpoints);')
+            await writer.conn.commit()
+        return deletedCount
+
+    @contextlib.asynccontextmanager
+    async def reader(self) -> AsyncIterator[BaseCheckpointSaver]:
+        if self.readerPoolSize <= 0:
+            yield self.get_checkpointer()
+            return
+        reader = await self._readers.get()
+        try:
+            yield reader
+        finally:
+            self._readers.put_nowait(reader)
+
+
+class PostgresCheckpointStore(CheckpointStore):
+
+    def __init__(self, connectionString: str, poolSize: int = 10) -> None:
+        self.connectionString = connectionString
+        self.poolSize = poolSize
+        self._pool = None
+        self._checkpointer: BaseCheckpointSaver | None = None
+
+    async def connect(self) -> None:
+        if self._checkpointer is not None:
+            return
+        try:
+            # pylint: disable=import-outside-toplevel
+            from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+            from psycopg.rows import dict_row
+            from psycopg_pool import AsyncConnectionPool
+        except ImportError as exception:
+            raise KibaException('PostgresCheckpointStore requires langgraph-checkpoint-postgres and psycopg-pool to be installed') from exception
+        self._pool = AsyncConnectionPool(conninfo=self.connectionString, max_size=self.poolSize, open=False, kwargs={'autocommit': True, 'prepare_threshold': 0, 'row_factory': dict_row})
+        await self._pool.open()
+        checkpointer = AsyncPostgresSaver(conn=self._pool)
+        await checkpointer.setup()
+        self._checkpointer = TracedCheckpointSaver(checkpointer=checkpointer)
+        logging.info(f'Connected postgres checkpoint store with pool size {self.poolSize}')
+
+    async def disconnect(self) -> None:
+        if self._pool is not None:
+            await self._pool.close()
+        self._pool = None
+        self._checkpointer = None
+
+    def get_checkpointer(self) -> BaseCheckpointSaver:
+        if self._checkpointer is None:
+            raise KibaException('CheckpointStore has not been connected')
+        return self._checkpointer
+
+
+class CheckpointPruner:
+
+    def __init__(self, checkpointStore: CheckpointStore, keepCheckpointsPerThread: int = 5, intervalSeconds: float = 3600) -> None:
+        self.checkpointStore = checkpointStore
+        self.keepCheckpointsPerThread = keepCheckpointsPerThread
+        self.intervalSeconds = intervalSeconds
+        self._task: asyncio.Task[None] | None = None
+
+    async def prune(self) -> int:
+        deletedCount = await self.checkpointStore.prune(keepCheckpointsPerThread=self.keepCheckpointsPerThread)
+        logging.info(f'Pruned {deletedCount} old checkpoints')
+        return deletedCount
+
+    async def _run_prune_loop(self) -> None:
+        while True:
+            try:
+                await self.prune()
+            except Exception as exception:  # pylint: disable=broad-exception-caught
+                logging.error(f'Failed to prune checkpoints: {exception}')
+            await asyncio.sleep(self.intervalSeconds)
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run_prune_loop())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+
+def create_checkpoint_store(connectionString: str, poolSize: int | None = None) -> CheckpointStore:
+    if connectionString.startswith('postgres://') or connectionString.startswith('postgresql://'):
+        if poolSize is None:
+            return PostgresCheckpointStore(connectionString=connectionString)
+        return PostgresCheckpointStore(connectionString=connectionString, poolSize=poolSize)
+    filePath = connectionString.removeprefix('sqlite:///')
+    if poolSize is None:
+        return SqliteCheckpointStore(filePath=filePath)
+    return SqliteCheckpointStore(filePath=filePath, readerPoolSize=poolSize)
@@ -0,0 +1,111 @@
+import json
+from typing import Any
+
+from langchain_core.messages import AIMessage
+from langchain_core.messages import BaseMessage
+from langchain_core.messages import HumanMessage
+from langchain_core.messages import SystemMessage
+from langchain_core.messages import ToolMessage
+from pydantic import BaseModel
+
+from agent_hack.yield_option_formatter import estimate_token_count
+
+OMITTED_HISTORY_NOTE = 'Earlier messages in this conversation were omitted to save space, ask the wallet holder if you need details from them.'
+
+
+class CompactionConfig(BaseModel):
+    maxContextTokens: int = 12000
+    maxTurns: int = 20
+    fullToolResultTurns: int = 1
+    maxToolResultTokens: int = 3000
+    toolResultStubMinTokens: int = 50
+
+
+class ConversationCompactorStats(BaseModel):
+    requestCount: int
+    compactedRequestCount: int
+    droppedMessageCount: int
+    stubbedToolResultCount: int
+    truncatedToolResultCount: int
+
+
+def estimate_message_token_count(message: BaseMessage) -> int:
+    content = message.content if isinstance(message.content, str) else json.dumps(message.content)
+    tokenCount = estimate_token_count(content)
+    if isinstance(message, AIMessage) and message.tool_calls:
+        tokenCount += estimate_token_count(json.dumps([toolCall['args'] for toolCall in message.tool_calls]))
+    return tokenCount
+
+
+def split_turns(messages: list[BaseMessage]) -> list[list[BaseMessage]]:
+    turns: list[list[BaseMessage]] = []
+    for message in messages:
+        if isinstance(message, HumanMessage) or len(turns) == 0:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+
+class ConversationCompactor:
+
+    def __init__(self, systemPrompt: str, config: CompactionConfig | None = None) -> None:
+        self.systemPrompt = systemPrompt
+        self.config = config or CompactionConfig()
+        self.requestCount = 0
+        self.compactedRequestCount = 0
+        self.droppedMessageCount = 0
+        self.stubbedToolResultCount = 0
+        self.truncatedToolResultCount = 0
+
+    def _stub_tool_result(self, message: ToolMessage) -> ToolMessage:
+        if estimate_message_token_count(message) < self.config.toolResultStubMinTokens:
+            return message
+        self.stubbedToolResultCount += 1
+        return message.model_copy(update={'content': f'[{message.name or "tool"} result from an earlier turn omitted, call the tool again if it is needed]'})
+
+    def _truncate_tool_result(self, message: ToolMessage) -> ToolMessage:
+        if estimate_message_token_count(message) <= self.config.maxToolResultTokens:
+            return message
+        self.truncatedToolResultCount += 1
+        content = message.content if isinstance(message.content, str) else json.dumps(message.content)
+        return message.model_copy(update={'content': f'{content[:self.config.maxToolResultTokens * 4]}\n[result truncated]'})
+
+    def compact_messages(self, messages: list[BaseMessage]) -> tuple[list[BaseMessage], int]:
+        turns = split_turns(messages=messages)
+        compactedTurns: list[list[BaseMessage]] = []
+        for turnIndex, turn in enumerate(turns):
+            isRecentTurn = turnIndex >= len(turns) - self.config.fullToolResultTurns
+            compactedTurns.append([
+                (self._truncate_tool_result(message) if isRecentTurn else self._stub_tool_result(message)) if isinstance(message, ToolMessage) else message
+                for message in turn
+            ])
+        # Whole turns are dropped so tool calls always stay paired with their results
+        keptTurns: list[list[BaseMessage]] = []
+        tokenCount = estimate_token_count(self.systemPrompt)
+        for turn in reversed(compactedTurns):
+            turnTokenCount = sum(estimate_message_token_count(message) for message in turn)
+            if len(keptTurns) > 0 and (tokenCount + turnTokenCount > self.config.maxContextTokens or len(keptTurns) >= self.config.maxTurns):
+                break
+            keptTurns.insert(0, turn)
+            tokenCount += turnTokenCount
+        droppedMessageCount = sum(len(turn) for turn in compactedTurns[:len(compactedTurns) - len(keptTurns)])
+        return [message for turn in keptTurns for message in turn], droppedMessageCount
+
+    def build_prompt(self, state: dict[str, Any]) -> list[BaseMessage]:
+        messages, droppedMessageCount = self.compact_messages(messages=state['messages'])
+        self.requestCount += 1
+        systemPrompt = self.systemPrompt
+        if droppedMessageCount > 0:
+            self.compactedRequestCount += 1
+            self.droppedMessageCount += droppedMessageCount
+            systemPrompt = f'{systemPrompt}{OMITTED_HISTORY_NOTE}'
+        return [SystemMessage(content=systemPrompt)] + messages
+
+    def get_stats(self) -> ConversationCompactorStats:
+        return ConversationCompactorStats(
+            requestCount=self.requestCount,
+            compactedRequestCount=self.compactedRequestCount,
+            droppedMessageCount=self.droppedMessageCount,
+            stubbedToolResultCount=self.stubbedToolResultCount,
+            truncatedToolResultCount=self.truncatedToolResultCount,
+        )
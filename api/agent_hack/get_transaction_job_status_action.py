@@ -0,0 +1,38 @@
+from typing import Callable
+
+from cdp import Wallet
+from pydantic import BaseModel
+from pydantic import Field
+
+from agent_hack.base_action import BaseAction
+from agent_hack.transaction_jobs import get_transaction_job_manager
+
+PROMPT = """
+This tool will get the status of transaction jobs started by actions like morpho_deposit.
+Pass the job_id returned by the action to check a single job, or leave it empty to list all jobs for this wallet.
+A job is pending or running until its transaction is confirmed, then it is complete (with a transaction link) or failed (with an error).
+A job is unknown if its transaction was not confirmed in time, it may still land so check its transaction hash before retrying.
+"""
+
+class GetTransactionJobStatusInput(BaseModel):
+    job_id: str | None = Field(None, description="The id of the transaction job to check")  # pylint: disable=invalid-name
+
+async def get_transaction_job_status(wallet: Wallet, job_id: str | None = None) -> str:  # pylint: disable=invalid-name
+    transactionJobManager = get_transaction_job_manager()
+    if job_id:
+        job = await transactionJobManager.get_job(jobId=job_id)
+        if job is None or job.walletId != wallet.id:
+            return f'No transaction job found with id {job_id}'
+        jobs = [job]
+    else:
+        jobs = await transactionJobManager.list_wallet_jobs(walletId=wallet.id)
+    if len(jobs) == 0:
+        return 'There are no transaction jobs for this wallet'
+    return '\n'.join(job.model_dump_json(exclude_none=True, exclude={'walletId'}) for job in jobs)
+
+
+class GetTransactionJobStatusAction(BaseAction):
+    name: str = "get_transaction_job_status"
+    description: str = PROMPT
+    args_schema: type[BaseModel] | None = GetTransactionJobStatusInput
+    afunc: Callable[..., str] = get_transaction_job_status
@@ -0,0 +1,36 @@
+from typing import Callable
+
+from cdp import Wallet
+from pydantic import BaseModel
+from pydantic import Field
+
+from agent_hack import yield_option_formatter
+from agent_hack import yield_options
+from agent_hack import yield_snapshot_refresher
+from agent_hack.base_action import BaseAction
+
+PROMPT = """
+This tool will get the full details of a single yield option listed by list_all_yield_options, morpho_list_vaults or search_yield_options.
+It includes the vault address (needed for deposits), each reward asset and the liquidity of each reward token on Uniswap and Aerodrome.
+"""
+
+class GetYieldOptionDetailsInput(BaseModel):
+    identifier: str = Field(..., description="The name, symbol or address of the yield option")
+
+async def get_yield_option_details(wallet: Wallet, identifier: str) -> str:
+    chainId = yield_options.get_chain_id(networkId=wallet.network_id)
+    yieldOptions = await yield_snapshot_refresher.get_all_yield_options(chainId=chainId)
+    yieldOption = yield_option_formatter.find_yield_option(yieldOptions=yieldOptions, identifier=identifier)
+    if yieldOption is None:
+        yieldIndex = await yield_snapshot_refresher.get_yield_index()
+        yieldOption = yield_option_formatter.find_yield_option(yieldOptions=yieldIndex.yieldOptions, identifier=identifier)
+    if yieldOption is None:
+        return f'No yield option found matching {identifier}'
+    return yield_option_formatter.format_yield_option_details(yieldOption=yieldOption)
+
+
+class GetYieldOptionDetailsAction(BaseAction):
+    name: str = "get_yield_option_details"
+    description: str = PROMPT
+    args_schema: type[BaseModel] | None = GetYieldOptionDetailsInput
+    afunc: Callable[..., str] = get_yield_option_details
@@ -0,0 +1,40 @@
+from typing import Callable
+
+from cdp import Wallet
+from pydantic import BaseModel
+from pydantic import Field
+
+from agent_hack import yield_option_formatter
+from agent_hack import yield_options
+from agent_hack import yield_snapshot_refresher
+from agent_hack.apy_history_store import get_apy_history_store
+from agent_hack.base_action import BaseAction
+
+PROMPT = """
+This tool will describe how stable the APY of a single yield option has been.
+It includes the mean, range and volatility of the APY over the recorded history, how far it is below its recent high and Morpho's daily, weekly and monthly APYs.
+APYs are fractions, e.g. 0.05 = 5%.
+"""
+
+class GetYieldStabilityInput(BaseModel):
+    identifier: str = Field(..., description="The name, symbol or address of the yield option")
+
+async def get_yield_stability(wallet: Wallet, identifier: str) -> str:
+    chainId = yield_options.get_chain_id(networkId=wallet.network_id)
+    yieldOptions = await yield_snapshot_refresher.get_all_yield_options(chainId=chainId)
+    yieldOption = yield_option_formatter.find_yield_option(yieldOptions=yieldOptions, identifier=identifier)
+    if yieldOption is None:
+        yieldIndex = await yield_snapshot_refresher.get_yield_index()
+        yieldOption = yield_option_formatter.find_yield_option(yieldOptions=yieldIndex.yieldOptions, identifier=identifier)
+    if yieldOption is None:
+        return f'No yield option found matching {identifier}'
+    apyHistoryStore = get_apy_history_store()
+    apyStatistics = await apyHistoryStore.get_vault_statistics(chainId=yieldOption.chainId, vaultAddress=yieldOption.address) if apyHistoryStore else None
+    return yield_option_formatter.format_yield_option_stability(yieldOption=yieldOption, apyStatistics=apyStatistics)
+
+
+class GetYieldStabilityAction(BaseAction):
+    name: str = "get_yield_stability"
+    description: str = PROMPT
+    args_schema: type[BaseModel] | None = GetYieldStabilityInput
+    afunc: Callable[..., str] = get_yield_stability
@@ -8,6 +8,7 @@ To use this tool, you must first set as environment variables:
 
 """
 
+import functools
 from typing import Any
 from typing import Callable
 
@@ -16,14 +17,19 @@ from cdp_langchain.tools.cdp_tool import CdpTool
 from cdp_langchain.utils.cdp_agentkit_wrapper import CdpAgentkitWrapper
 from langchain_core.callbacks import CallbackManagerForToolRun
 
+from agent_hack.action_executor import ActionExecutor
+from agent_hack.action_executor import ActionTimeoutException
+
 
 class KibaCdpTool(CdpTool):  # type: ignore[override]
 
     func: Callable[..., str] | None = None
     afunc: Callable[..., str] | None = None
+    action_executor: ActionExecutor | None = None
+    user_id: str | None = None
 
     @classmethod
-    def from_cdp_action(cls, cdp_action: CdpAction, cdp_agentkit_wrapper: CdpAgentkitWrapper) -> "CdpTool":
+    def from_cdp_action(cls, cdp_action: CdpAction, cdp_agentkit_wrapper: CdpAgentkitWrapper, action_executor: ActionExecutor | None = None, user_id: str | None = None) -> "CdpTool":
         """Create a CdpTool from a CdpAction."""
         if not hasattr(cdp_action, "func") and not hasattr(cdp_action, "afunc"):
             raise ValueError("CdpAction must have either func or afunc")
@@ -34,6 +40,8 @@ class KibaCdpTool(CdpTool):  # type: ignore[override]
             args_schema=cdp_action.args_schema,
             func=cdp_action.func if hasattr(cdp_action, "func") else None,
             afunc=cdp_action.afunc if hasattr(cdp_action, "afunc") else None,
+            action_executor=action_executor,
+            user_id=user_id,
         )
 
     async def _arun(
@@ -53,4 +61,15 @@ class KibaCdpTool(CdpTool):  # type: ignore[override]
             parsed_input_args = {"instructions": instructions}
         if self.afunc is not None:
             return await self.cdp_agentkit_wrapper.arun_action(self.afunc, **parsed_input_args)
-        return self.cdp_agentkit_wrapper.run_action(self.func, **parsed_input_args)
+        if self.action_executor is None:
+            return self.cdp_agentkit_wrapper.run_action(self.func, **parsed_input_args)
+        # Sync actions block on network calls and transaction receipts so they run off the event loop.
+        try:
+            return await self.action_executor.run(
+                userId=self.user_id or "",
+                actionName=self.name,
+                func=functools.partial(self.cdp_agentkit_wrapper.run_action, self.func),
+                kwargs=parsed_input_args,
+            )
+        except ActionTimeoutException as exception:
+            return f"Error: {exception}"
@@ -1,29 +1,30 @@
 from typing import Callable
 
 from cdp import Wallet
-from core.exceptions import KibaException
 from pydantic import BaseModel
+from pydantic import Field
 
+from agent_hack import yield_option_formatter
 from agent_hack import yield_options
+from agent_hack import yield_snapshot_refresher
 from agent_hack.base_action import BaseAction
+from agent_hack.yield_option_formatter import DEFAULT_YIELD_OPTION_LIMIT
+from agent_hack.yield_option_formatter import MAX_YIELD_OPTION_LIMIT
 
 # NOTE(krishan711): this could really be a langchain tool directly but easier to just follow the cdp pattern for now.
 PROMPT = """
 This tool will list vaults for achieving yield that are hosted on the Morpho protocol.
 Each yield will come with details about its APY and rewards.
+Results are a compact table of the best options, use get_yield_option_details for more about a single option.
 """
 
 class ListAllYieldOptionsInput(BaseModel):
-    pass
+    limit: int = Field(DEFAULT_YIELD_OPTION_LIMIT, ge=1, le=MAX_YIELD_OPTION_LIMIT, description="The maximum number of options to list, best first")
 
-async def list_all_yield_options(wallet: Wallet) -> str:
-    if wallet.network_id == 'base-mainnet':
-        chainId = yield_options.BASE_CHAIN_ID
-    else:
-        raise KibaException('Unsupported network, only base is supported')
-    yieldOptions = await yield_options.list_all_yield_options(chainId=chainId)
-    yieldOptionJsons = [yieldOption.model_dump_json() for yieldOption in yieldOptions]
-    output = f'Available vaults are here in a json list: {yieldOptionJsons}'
+async def list_all_yield_options(wallet: Wallet, limit: int = DEFAULT_YIELD_OPTION_LIMIT) -> str:
+    chainId = yield_options.get_chain_id(networkId=wallet.network_id)
+    yieldOptions = await yield_snapshot_refresher.get_all_yield_options(chainId=chainId)
+    output = yield_option_formatter.format_yield_options_table(yieldOptions=yieldOptions, limit=limit)
     return output
 
 
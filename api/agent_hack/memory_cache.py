@@ -0,0 +1,134 @@
+import asyncio
+import collections
+import time
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import Hashable
+
+from core import logging
+from pydantic import BaseModel
+
+Loader = Callable[[], Awaitable[tuple[Any, float]]]
+
+
+def _retrieve_load_exception(task: asyncio.Task[Any]) -> None:
+    # Retrieve the exception so a load whose callers were all cancelled doesn't log "exception never retrieved"
+    if not task.cancelled():
+        task.exception()
+
+
+class MemoryCacheStats(BaseModel):
+    size: int
+    maxSize: int
+    hitCount: int
+    staleHitCount: int
+    missCount: int
+    coalescedCount: int
+    evictionCount: int
+    refreshFailureCount: int
+
+
+class CacheEntry:
+
+    def __init__(self, value: Any, loadedTime: float) -> None:
+        self.value = value
+        self.loadedTime = loadedTime
+
+
+class MemoryCache:
+
+    def __init__(self, maxSize: int = 512, maxStaleSeconds: float = 3600) -> None:
+        self.maxSize = maxSize
+        self.maxStaleSeconds = maxStaleSeconds
+        self.hitCount = 0
+        self.staleHitCount = 0
+        self.missCount = 0
+        self.coalescedCount = 0
+        self.evictionCount = 0
+        self.refreshFailureCount = 0
+        self._entries: collections.OrderedDict[Hashable, CacheEntry] = collections.OrderedDict()
+        self._inflightLoads: dict[Hashable, asyncio.Task[Any]] = {}
+
+    def _set(self, key: Hashable, value: Any, loadedTime: float) -> None:
+        self._entries[key] = CacheEntry(value=value, loadedTime=loadedTime)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxSize:
+            self._entries.popitem(last=False)
+            self.evictionCount += 1
+
+    async def _load(self, key: Hashable, loader: Loader) -> Any:
+        try:
+            value, loadedTime = await loader()
+        finally:
+            self._inflightLoads.pop(key, None)
+        self._set(key=key, value=value, loadedTime=loadedTime)
+        return value
+
+    def _start_load(self, key: Hashable, loader: Loader) -> tuple[asyncio.Task[Any], bool]:
+        inflightLoad = self._inflightLoads.get(key)
+        if inflightLoad is not None:
+            self.coalescedCount += 1
+            return inflightLoad, True
+        inflightLoad = asyncio.create_task(self._load(key=key, loader=loader))
+        inflightLoad.add_done_callback(_retrieve_load_exception)
+        self._inflightLoads[key] = inflightLoad
+        return inflightLoad, False
+
+    def _on_refresh_done(self, key: Hashable, task: asyncio.Task[Any]) -> None:
+        if task.cancelled():
+            return
+        exception = task.exception()
+        if exception is not None:
+            self.refreshFailureCount += 1
+            logging.error(f'Failed to refresh cache entry {key}: {exception}')
+
+    async def get_or_load(self, key: Hashable, loader: Loader, expirySeconds: float) -> tuple[Any, bool]:
+        # Returns the value and whether it came from a load another caller had already started
+        entry = self._entries.get(key)
+        if entry is not None:
+            ageSeconds = time.time() - entry.loadedTime
+            if ageSeconds < expirySeconds:
+                self.hitCount += 1
+                self._entries.move_to_end(key)
+                return entry.value, False
+            if ageSeconds < expirySeconds + self.maxStaleSeconds:
+                self.staleHitCount += 1
+                self._entries.move_to_end(key)
+                if key not in self._inflightLoads:
+                    refreshTask, _ = self._start_load(key=key, loader=loader)
+                    refreshTask.add_done_callback(lambda task: self._on_refresh_done(key=key, task=task))
+                return entry.value, False
+        self.missCount += 1
+        inflightLoad, isCoalesced = self._start_load(key=key, loader=loader)
+        # Shielded so a cancelled caller doesn't cancel the load other callers are waiting on
+        return await asyncio.shield(inflightLoad), isCoalesced
+
+    def get(self, key: Hashable, expirySeconds: float) -> Any | None:
+        entry = self._entries.get(key)
+        if entry is None or time.time() - entry.loadedTime >= expirySeconds:
+            return None
+        self.hitCount += 1
+        self._entries.move_to_end(key)
+        return entry.value
+
+    def set(self, key: Hashable, value: Any, loadedTime: float | None = None) -> None:
+        self._set(key=key, value=value, loadedTime=loadedTime if loadedTime is not None else time.time())
+
+    def invalidate(self, key: Hashable) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def get_stats(self) -> MemoryCacheStats:
+        return MemoryCacheStats(
+            size=len(self._entries),
+            maxSize=self.maxSize,
+            hitCount=self.hitCount,
+            staleHitCount=self.staleHitCount,
+            missCount=self.missCount,
+            coalescedCount=self.coalescedCount,
+            evictionCount=self.evictionCount,
+            refreshFailureCount=self.refreshFailureCount,
+        )
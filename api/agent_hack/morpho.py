@@ -1,24 +1,24 @@
+import asyncio
+from typing import Any
+from typing import Callable
+
+from core.exceptions import KibaException
 from core.exceptions import NotFoundException
 from core.requester import Requester
 from pydantic import BaseModel
-from pydantic import Field
 
 from agent_hack import morpho_queries
+from agent_hack import tracing
+from agent_hack.token_registry import Asset
+from agent_hack.token_registry import get_token_registry
 from agent_hack.util import load_or_query
 
 
-class Asset(BaseModel):
-    morphoId: str = Field(default=None, serialization_alias='data')
-    address: str
-    decimals: int
-    name: str
-    symbol: str
-    tags: list[str] | None
-    logoURI: str | None
-    totalSupply: int
-    priceUsd: float | None
-    oraclePriceUsd: float | None
-    spotPriceEth: float | None
+MORPHO_TOKEN_MAX_AGE_SECONDS = 3600
+MORPHO_TOKEN_ADDRESSES = {
+    1: '0x58d97b57bb95320f9a05dc918aef65434969c2b2',
+    8453: '0xbaa5cc21fd487b8fcc2f632f3f4e8d37262a0842',
+}
 
 
 class VaultReward(BaseModel):
@@ -35,11 +35,21 @@ class Vault(BaseModel):
     creationTimestamp: int
     totalApy: float
     baseApy: float
+    dailyApy: float | None
+    weeklyApy: float | None
+    monthlyApy: float | None
     rewardApys: list[VaultReward]
 
 
+def get_morpho_token_address(chainId: int) -> str:
+    morphoTokenAddress = MORPHO_TOKEN_ADDRESSES.get(chainId)
+    if morphoTokenAddress is None:
+        raise KibaException(f'Unsupported chain {chainId} for morpho')
+    return morphoTokenAddress
+
+
 async def get_asset_by_symbol(requester: Requester, chainId: int, assetSymbol: str) -> Asset:
-    assetDicts = await load_or_query(requester=requester, source='morpho', entityName='assets', cacheEntityName=f'asset-{assetSymbol}', url='https://blue-api.morpho.org/graphql', dataDict={
+    assetDicts = await load_or_query(requester=requester, source='morpho', entityName='assets', cacheEntityName=f'asset-{chainId}-{assetSymbol}', url='https://blue-api.morpho.org/graphql', dataDict={
         'query': morpho_queries.GET_CHAIN_ASSET_QUERY,
         'variables': {
             'chainId': chainId,
@@ -49,11 +59,13 @@ async def get_asset_by_symbol(requester: Requester, chainId: int, assetSymbol: s
     assetDict = next((assetDict for assetDict in assetDicts if assetDict['symbol'] == assetSymbol), None)
     if assetDict is None:
         raise NotFoundException()
-    return Asset.model_validate(assetDict)
+    tokenRegistry = get_token_registry()
+    tokenRegistry.set_symbol_address(chainId=chainId, symbol=assetSymbol, address=assetDict['address'])
+    return tokenRegistry.intern_asset(chainId=chainId, assetDict=assetDict)
 
 
 async def get_asset_by_address(requester: Requester, chainId: int, assetAddress: str) -> Asset:
-    assetDicts = await load_or_query(requester=requester, source='morpho', entityName='assets', cacheEntityName=f'asset-{assetAddress}', url='https://blue-api.morpho.org/graphql', dataDict={
+    assetDicts = await load_or_query(requester=requester, source='morpho', entityName='assets', cacheEntityName=f'asset-{chainId}-{assetAddress}', url='https://blue-api.morpho.org/graphql', dataDict={
         'query': morpho_queries.GET_CHAIN_ASSET_BY_ADDRESS_QUERY,
         'variables': {
             'chainId': chainId,
@@ -63,21 +75,40 @@ async def get_asset_by_address(requester: Requester, chainId: int, assetAddress:
     assetDict = next((assetDict for assetDict in assetDicts if assetDict['address'].lower() == assetAddress.lower()), None)
     if assetDict is None:
         raise NotFoundException()
-    return Asset.model_validate(assetDict)
+    return get_token_registry().intern_asset(chainId=chainId, assetDict=assetDict)
 
 
-async def list_vaults(requester: Requester, chainId: int, assetAddress: str) -> list[Vault]:
-    vaults = await load_or_query(requester=requester, source='morpho', entityName='vaults', cacheEntityName=f'vaults-{assetAddress}', url='https://blue-api.morpho.org/graphql', dataDict={
-        'query': morpho_queries.LIST_CHAIN_ASSET_VAULTS_QUERY,
-        'variables': {
-            'chainId': chainId,
-            'assetAddress': assetAddress,
-        },
-    })
-    print(f'Loaded {len(vaults)} vaults')
-    orderedVaults = sorted(vaults, key=lambda vault: vault['state']['totalAssetsUsd'], reverse=True)
+async def list_vaults(requester: Requester, chainId: int, assetAddress: str, onRewardAssetAddresses: Callable[[list[str]], None] | None = None) -> list[Vault]:
+    morphoTokenAddress = get_morpho_token_address(chainId=chainId)
+    tokenRegistry = get_token_registry()
+    if onRewardAssetAddresses is not None:
+        onRewardAssetAddresses([morphoTokenAddress])
+
+    def on_vaults_page(vaultDicts: list[dict[str, Any]]) -> None:
+        if onRewardAssetAddresses is not None:
+            onRewardAssetAddresses([reward['asset']['address'] for vaultDict in vaultDicts if len(vaultDict['warnings']) == 0 for reward in vaultDict['state']['rewards']])
+
+    async def load_vault_dicts() -> list[dict[str, Any]]:
+        with tracing.span('morpho_vaults'):
+            return await load_or_query(requester=requester, source='morpho', entityName='vaults', cacheEntityName=f'vaults-lean-{chainId}-{assetAddress}', url='https://blue-api.morpho.org/graphql', onPage=on_vaults_page, dataDict={
+                'query': morpho_queries.LIST_CHAIN_ASSET_VAULTS_LEAN_QUERY,
+                'variables': {
+                    'chainId': chainId,
+                    'assetAddress': assetAddress,
+                },
+            })
+
+    async def load_morpho_asset() -> Asset:
+        morphoAsset = tokenRegistry.get_asset(chainId=chainId, address=morphoTokenAddress, maxAgeSeconds=MORPHO_TOKEN_MAX_AGE_SECONDS)
+        if morphoAsset is not None:
+            return morphoAsset
+        with tracing.span('morpho_reward_asset'):
+            return await get_asset_by_address(requester=requester, chainId=chainId, assetAddress=morphoTokenAddress)
+
+    vaultDicts, morphoAsset = await asyncio.gather(load_vault_dicts(), load_morpho_asset())
+    print(f'Loaded {len(vaultDicts)} vaults')
+    orderedVaults = sorted(vaultDicts, key=lambda vault: vault['state']['totalAssetsUsd'], reverse=True)
     vaults: list[Vault] = []
-    morphoAsset = await get_asset_by_address(requester=requester, chainId=chainId, assetAddress='0xbaa5cc21fd487b8fcc2f632f3f4e8d37262a0842')
     for vault in orderedVaults:
         if len(vault['warnings']) > 0:
             continue
@@ -89,7 +120,7 @@ async def list_vaults(requester: Requester, chainId: int, assetAddress: str) ->
         morphoApy = netApy - netApyWithoutRewards - rewardsApy
         rewardApys = [VaultReward(asset=morphoAsset, apy=morphoApy)] + [
             VaultReward(
-                asset=Asset.model_validate(reward['asset']),
+                asset=tokenRegistry.intern_asset(chainId=chainId, assetDict=reward['asset']),
                 apy=reward['supplyApr']
             )
             for reward in vaultState['rewards']
@@ -103,6 +134,9 @@ async def list_vaults(requester: Requester, chainId: int, assetAddress: str) ->
             creationTimestamp=vault['creationTimestamp'],
             totalApy=netApy,
             baseApy=netApyWithoutRewards,
+            dailyApy=vaultState.get('dailyNetApy'),
+            weeklyApy=vaultState.get('weeklyNetApy'),
+            monthlyApy=vaultState.get('monthlyNetApy'),
             rewardApys=rewardApys
         )
         vaults.append(vaultObject)
@@ -1,14 +1,22 @@
+import asyncio
+import functools
 from collections.abc import Callable
 from decimal import Decimal
 
 from cdp import Asset
+from cdp import SmartContract
+from cdp import Transaction
 from cdp import Wallet
-from cdp_agentkit_core.actions import CdpAction
+from cdp_agentkit_core.actions.constants import ERC20_APPROVE_ABI
 from cdp_agentkit_core.actions.morpho.constants import METAMORPHO_ABI
-from cdp_agentkit_core.actions.utils import approve
+from core.exceptions import KibaException
 from pydantic import BaseModel
 from pydantic import Field
 
+from agent_hack.base_action import BaseAction
+from agent_hack.transaction_jobs import TransactionJob
+from agent_hack.transaction_jobs import get_transaction_job_manager
+
 
 class MorphoDepositInput(BaseModel):
     """Input schema for Morpho Vault deposit action."""
@@ -31,17 +39,72 @@ It takes:
 Important notes:
 - Make sure to use the exact amount provided. Do not convert units for assets for this action.
 - Please use a token address (example 0x4200000000000000000000000000000000000006) for the asset_address field. If you are unsure of the token address, please clarify what the requested token address is before continuing.
+- The deposit runs in the background and this returns a transaction job id, approval is skipped if the vault is already allowed to spend the amount.
 """
 
+CONFIRMATION_TIMEOUT_SECONDS = 300
+
+ERC20_ALLOWANCE_ABI = [
+    {
+        "inputs": [
+            {"internalType": "address", "name": "owner", "type": "address"},
+            {"internalType": "address", "name": "spender", "type": "address"},
+        ],
+        "name": "allowance",
+        "outputs": [{"internalType": "uint256", "name": "", "type": "uint256"}],
+        "stateMutability": "view",
+        "type": "function",
+    },
+]
 
-def deposit_to_morpho(
+
+def _run_deposit_job(
+    job: TransactionJob,
+    wallet: Wallet,
+    vaultAddress: str,
+    assetAddress: str,
+    receiver: str,
+    atomicAssets: str,
+) -> None:
+    job.update(step="checking_allowance")
+    allowance = SmartContract.read(
+        network_id=wallet.network_id,
+        contract_address=assetAddress,
+        method="allowance",
+        abi=ERC20_ALLOWANCE_ABI,
+        args={"owner": wallet.default_address.address_id, "spender": vaultAddress},
+    )
+    if int(allowance or 0) < int(atomicAssets):
+        job.update(step="approving")
+        approvalInvocation = wallet.invoke_contract(
+            contract_address=assetAddress,
+            method="approve",
+            abi=ERC20_APPROVE_ABI,
+            args={"spender": vaultAddress, "value": atomicAssets},
+        ).wait(timeout_seconds=CONFIRMATION_TIMEOUT_SECONDS)
+        job.update(approvalTransactionHash=approvalInvocation.transaction_hash)
+        if approvalInvocation.status == Transaction.Status.FAILED:
+            raise KibaException(f"Approval transaction failed: {approvalInvocation.transaction_link}")
+    job.update(step="depositing")
+    invocation = wallet.invoke_contract(
+        contract_address=vaultAddress,
+        method="deposit",
+        abi=METAMORPHO_ABI,
+        args={"assets": atomicAssets, "receiver": receiver},
+    ).wait(timeout_seconds=CONFIRMATION_TIMEOUT_SECONDS)
+    job.update(transactionHash=invocation.transaction_hash, transactionLink=invocation.transaction_link)
+    if invocation.status == Transaction.Status.FAILED:
+        raise KibaException(f"Deposit transaction failed: {invocation.transaction_link}")
+
+
+async def deposit_to_morpho(
     wallet: Wallet,
     vault_address: str,  # pylint: disable=invalid-name
     asset_amount: str,  # pylint: disable=invalid-name
     asset_address: str,  # pylint: disable=invalid-name
     receiver: str,
 ) -> str:
-    """Deposit assets into a Morpho Vault.
+    """Start a deposit of assets into a Morpho Vault.
 
     Args:
         wallet (Wallet): The wallet to execute the deposit from
@@ -51,30 +114,26 @@ def deposit_to_morpho(
         asset_address (str): The address of the token to approve
 
     Returns:
-        str: A success message with transaction hash or error message
+        str: The id of the transaction job tracking the deposit or an error message
 
     """
     if float(asset_amount) <= 0:
         return "Error: Assets amount must be greater than 0"
-    tokenAsset = Asset.fetch(wallet.network_id, asset_address)
+    tokenAsset = await asyncio.to_thread(Asset.fetch, wallet.network_id, asset_address)
     atomicAssets = str(int(tokenAsset.to_atomic_amount(Decimal(asset_amount))))
-    approvalResult = approve(wallet, asset_address, vault_address, atomicAssets)
-    if approvalResult.startswith("Error"):
-        return f"Error approving Morpho Vault as spender: {approvalResult}"
-    depositArgs = {"assets": atomicAssets, "receiver": receiver}
-    invocation = wallet.invoke_contract(
-        contract_address=vault_address,
-        method="deposit",
-        abi=METAMORPHO_ABI,
-        args=depositArgs,
-    ).wait()
-    return f"Deposited {atomicAssets} to Morpho Vault {vault_address} with transaction hash: {invocation.transaction_hash} and transaction link: {invocation.transaction_link}"
+    job = await get_transaction_job_manager().submit(
+        walletId=wallet.id,
+        kind="morpho_deposit",
+        description=f"Deposit {asset_amount} {tokenAsset.asset_id} to Morpho Vault {vault_address}",
+        jobFunction=functools.partial(_run_deposit_job, wallet=wallet, vaultAddress=vault_address, assetAddress=asset_address, receiver=receiver, atomicAssets=atomicAssets),
+    )
+    return f"Started depositing {atomicAssets} to Morpho Vault {vault_address} as transaction job {job.jobId}. It usually confirms within a minute, use get_transaction_job_status to check on it."
 
 
-class MorphoDepositAction(CdpAction):
+class MorphoDepositAction(BaseAction):
     """Morpho Vault deposit action."""
 
     name: str = "morpho_deposit"
     description: str = DEPOSIT_PROMPT
-    args_schema: type[BaseModel] = MorphoDepositInput
-    func: Callable[..., str] = deposit_to_morpho
+    args_schema: type[BaseModel] | None = MorphoDepositInput
+    afunc: Callable[..., str] = deposit_to_morpho
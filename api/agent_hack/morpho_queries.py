@@ -183,3 +183,51 @@ query ListChainAssetVaults($skip: Int!, $chainId: Int!, $assetAddress: String!)
   }
 }
 '''
+
+LIST_CHAIN_ASSET_VAULTS_LEAN_QUERY = '''
+query ListChainAssetVaultsLean($skip: Int!, $chainId: Int!, $assetAddress: String!) {
+  vaults(first: 1000, skip: $skip, where: {chainId_in: [$chainId], assetAddress_in: [$assetAddress]}) {
+    items {
+      name
+      address
+      symbol
+      creationTimestamp
+      state {
+        totalAssets
+        totalAssetsUsd
+        netApyWithoutRewards
+        netApy
+        dailyNetApy
+        weeklyNetApy
+        monthlyNetApy
+        rewards {
+          supplyApr
+          asset {
+            id
+            address
+            decimals
+            name
+            symbol
+            tags
+            logoURI
+            totalSupply
+            priceUsd
+            oraclePriceUsd
+            spotPriceEth
+          }
+        }
+      }
+      warnings {
+        type
+        level
+      }
+    }
+    pageInfo {
+      countTotal
+      count
+      limit
+      skip
+    }
+  }
+}
+'''
@@ -0,0 +1,121 @@
+import asyncio
+import random
+import time
+import urllib.parse
+from typing import Any
+from typing import Mapping
+from typing import MutableMapping
+from typing import Sequence
+
+import httpx
+from core import logging
+from core.exceptions import KibaException
+from core.requester import FileContent
+from core.requester import HttpxFileTypes
+from core.requester import KibaResponse
+from core.requester import Requester
+from core.util.typing_util import Json
+from pydantic import BaseModel
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class HostRequestStats(BaseModel):
+    host: str
+    requestCount: int = 0
+    errorCount: int = 0
+    retryCount: int = 0
+    totalDurationSeconds: float = 0
+    maxDurationSeconds: float = 0
+
+
+class PooledRequester(Requester):
+
+    def __init__(
+        self,
+        maxConcurrentRequestsPerHost: int = 8,
+        hostConcurrencyLimits: dict[str, int] | None = None,
+        maxRetries: int = 3,
+        retryBaseDelaySeconds: float = 0.5,
+        retryMaxDelaySeconds: float = 8,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(**kwargs)
+        self.maxConcurrentRequestsPerHost = maxConcurrentRequestsPerHost
+        self.hostConcurrencyLimits = hostConcurrencyLimits or {}
+        self.maxRetries = maxRetries
+        self.retryBaseDelaySeconds = retryBaseDelaySeconds
+        self.retryMaxDelaySeconds = retryMaxDelaySeconds
+        self._hostSemaphores: dict[str, asyncio.Semaphore] = {}
+        self._hostStats: dict[str, HostRequestStats] = {}
+
+    def _get_host_semaphore(self, host: str) -> asyncio.Semaphore:
+        semaphore = self._hostSemaphores.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.hostConcurrencyLimits.get(host, self.maxConcurrentRequestsPerHost))
+            self._hostSemaphores[host] = semaphore
+        return semaphore
+
+    def _get_retry_delay_seconds(self, attempt: int) -> float:
+        return random.uniform(0, min(self.retryMaxDelaySeconds, self.retryBaseDelaySeconds * (2 ** attempt)))  # nosec B311
+
+    async def make_request(
+        self,
+        method: str,
+        url: str,
+        dataDict: Json | None = None,
+        data: bytes | None = None,
+        formDataDict: Mapping[str, str | FileContent] | None = None,
+        formFiles: Sequence[tuple[str, HttpxFileTypes]] | None = None,
+        timeout: int | None = 10,
+        headers: MutableMapping[str, str] | None = None,
+        outputFilePath: str | None = None,
+    ) -> KibaResponse:
+        host = urllib.parse.urlparse(url).netloc
+        stats = self._hostStats.setdefault(host, HostRequestStats(host=host))
+        attempt = 0
+        while True:
+            startTime = time.perf_counter()
+            try:
+                async with self._get_host_semaphore(host=host):
+                    response = await super().make_request(method=method, url=url, dataDict=dataDict, data=data, formDataDict=formDataDict, formFiles=formFiles, timeout=timeout, headers=headers, outputFilePath=outputFilePath)
+            except (KibaException, httpx.TransportError) as exception:
+                statusCode = getattr(exception, 'statusCode', None)
+                isRetryable = isinstance(exception, httpx.TransportError) or statusCode in RETRYABLE_STATUS_CODES
+                self._record(stats=stats, durationSeconds=time.perf_counter() - startTime, isError=True)
+                if not isRetryable or attempt >= self.maxRetries:
+                    raise
+                delaySeconds = self._get_retry_delay_seconds(attempt=attempt)
+                logging.info(f'Retrying {method} {host} after {statusCode or type(exception).__name__} in {delaySeconds:.2f}s')
+                stats.retryCount += 1
+                attempt += 1
+                await asyncio.sleep(delaySeconds)
+                continue
+            self._record(stats=stats, durationSeconds=time.perf_counter() - startTime, isError=False)
+            return response
+
+    @staticmethod
+    def _record(stats: HostRequestStats, durationSeconds: float, isError: bool) -> None:
+        stats.requestCount += 1
+        stats.totalDurationSeconds += durationSeconds
+        stats.maxDurationSeconds = max(stats.maxDurationSeconds, durationSeconds)
+        if isError:
+            stats.errorCount += 1
+
+    def get_stats(self) -> list[HostRequestStats]:
+        return [stats.model_copy() for stats in self._hostStats.values()]
+
+
+_sharedRequester: Requester | None = None
+
+
+def set_shared_requester(requester: Requester | None) -> None:
+    global _sharedRequester  # pylint: disable=global-statement
+    _sharedRequester = requester
+
+
+def get_shared_requester() -> Requester:
+    global _sharedRequester  # pylint: disable=global-statement
+    if _sharedRequester is None:
+        _sharedRequester = PooledRequester()
+    return _sharedRequester
@@ -0,0 +1,161 @@
+import re
+import time
+import zlib
+from typing import Callable
+
+import numpy as np
+from pydantic import BaseModel
+
+CACHEABLE_PATTERN = re.compile(r'\b(yields?|apys?|aprs?|vaults?|rates?|interest|earn(ing)?|returns?|best|highest|options?)\b')
+BYPASS_PATTERN = re.compile(r'\b(my|me|mine|i|i\'m|im|wallet|balances?|deposit|withdraw|transfer|send|trade|swap|wrap|deploy|sign|buy|sell|stake|address|job|transactions?)\b|0x[0-9a-f]{6,}')
+READ_ONLY_TOOL_NAMES = {'list_all_yield_options', 'morpho_list_vaults', 'get_yield_option_details', 'get_spark_yield', 'search_yield_options', 'get_yield_stability'}
+STOP_WORDS = {'a', 'an', 'the', 'is', 'are', 'was', 'what', 'whats', 'what\'s', 'which', 'who', 'how', 'can', 'could', 'do', 'does', 'to', 'for', 'of', 'on', 'in', 'at', 'with', 'there', 'any', 'some', 'right', 'now', 'today', 'currently', 'current', 'please', 'tell', 'show', 'give', 'list', 'get', 'find', 'you', 'us', 'and', 'or', 'about', 'available', 'top', 'good', 'one', 'ones'}
+GENERIC_WORDS = {'yield', 'yields', 'apy', 'apys', 'apr', 'aprs', 'vault', 'vaults', 'rate', 'rates', 'interest', 'earn', 'earning', 'return', 'returns', 'best', 'highest', 'option', 'options', 'pool', 'pools', 'lending', 'place', 'places'}
+
+
+class ResponseCacheStats(BaseModel):
+    size: int
+    maxSize: int
+    hitCount: int
+    missCount: int
+    bypassCount: int
+    storeCount: int
+
+
+class CacheEntry:
+
+    def __init__(self, normalizedQuestion: str, keyWords: frozenset[str], response: str, expiryTime: float) -> None:
+        self.normalizedQuestion = normalizedQuestion
+        self.keyWords = keyWords
+        self.response = response
+        self.expiryTime = expiryTime
+
+
+def normalize_question(question: str) -> str:
+    normalizedQuestion = re.sub(r'[^a-z0-9\s\']', ' ', question.lower())
+    return ' '.join(normalizedQuestion.split())
+
+
+def get_content_words(normalizedQuestion: str) -> list[str]:
+    return [word for word in normalizedQuestion.split() if word not in STOP_WORDS]
+
+
+def get_key_words(normalizedQuestion: str) -> frozenset[str]:
+    return frozenset(word for word in get_content_words(normalizedQuestion=normalizedQuestion) if word not in GENERIC_WORDS)
+
+
+def embed_question(normalizedQuestion: str, dimensions: int) -> np.ndarray:
+    contentWords = get_content_words(normalizedQuestion=normalizedQuestion)
+    features = list(contentWords)
+    paddedQuestion = f' {" ".join(contentWords)} '
+    features += [paddedQuestion[index:index + 3] for index in range(len(paddedQuestion) - 2)]
+    embedding = np.zeros(dimensions, dtype=np.float32)
+    for feature in features:
+        embedding[zlib.crc32(feature.encode()) % dimensions] += 1
+    norm = np.linalg.norm(embedding)
+    return embedding / norm if norm > 0 else embedding
+
+
+def is_cacheable_question(normalizedQuestion: str) -> bool:
+    return CACHEABLE_PATTERN.search(normalizedQuestion) is not None and BYPASS_PATTERN.search(normalizedQuestion) is None
+
+
+def is_cacheable_turn(normalizedQuestion: str, previousQuestion: str | None) -> bool:
+    # A cached response ignores the conversation so it only answers the first question in a thread
+    # or one that follows another general question, never a follow-up to something about the user's own wallet
+    if previousQuestion is not None and not is_cacheable_question(normalizedQuestion=normalize_question(question=previousQuestion)):
+        return False
+    return is_cacheable_question(normalizedQuestion=normalizedQuestion)
+
+
+class ResponseCache:
+
+    def __init__(
+        self,
+        versionProvider: Callable[[], str | None],
+        maxSize: int = 500,
+        ttlSeconds: float = 600,
+        similarityThreshold: float = 0.8,
+        embeddingDimensions: int = 1024,
+    ) -> None:
+        self.versionProvider = versionProvider
+        self.maxSize = maxSize
+        self.ttlSeconds = ttlSeconds
+        self.similarityThreshold = similarityThreshold
+        self.embeddingDimensions = embeddingDimensions
+        self.hitCount = 0
+        self.missCount = 0
+        self.bypassCount = 0
+        self.storeCount = 0
+        self._version: str | None = None
+        self._entries: list[CacheEntry] = []
+        self._embeddings = np.zeros((0, embeddingDimensions), dtype=np.float32)
+
+    def _sync_version(self) -> str | None:
+        version = self.versionProvider()
+        if version != self._version:
+            self.clear()
+            self._version = version
+        return version
+
+    def _remove_expired(self) -> None:
+        now = time.monotonic()
+        keptIndices = [index for index, entry in enumerate(self._entries) if entry.expiryTime > now]
+        if len(keptIndices) < len(self._entries):
+            self._entries = [self._entries[index] for index in keptIndices]
+            self._embeddings = self._embeddings[keptIndices]
+
+    def get(self, question: str, previousQuestion: str | None = None) -> str | None:
+        normalizedQuestion = normalize_question(question=question)
+        if not is_cacheable_turn(normalizedQuestion=normalizedQuestion, previousQuestion=previousQuestion) or self._sync_version() is None:
+            self.bypassCount += 1
+            return None
+        self._remove_expired()
+        if len(self._entries) == 0:
+            self.missCount += 1
+            return None
+        keyWords = get_key_words(normalizedQuestion=normalizedQuestion)
+        similarities = self._embeddings @ embed_question(normalizedQuestion=normalizedQuestion, dimensions=self.embeddingDimensions)
+        similarities[[entry.keyWords != keyWords for entry in self._entries]] = -1
+        bestIndex = int(np.argmax(similarities))
+        if similarities[bestIndex] < self.similarityThreshold:
+            self.missCount += 1
+            return None
+        self.hitCount += 1
+        return self._entries[bestIndex].response
+
+    def set(self, question: str, response: str, toolNames: set[str], previousQuestion: str | None = None) -> bool:
+        normalizedQuestion = normalize_question(question=question)
+        if not is_cacheable_turn(normalizedQuestion=normalizedQuestion, previousQuestion=previousQuestion) or len(response) == 0:
+            return False
+        # Only answers built from the read-only yield tools are shared, one written from the thread's context alone is not
+        if len(toolNames) == 0 or not toolNames.issubset(READ_ONLY_TOOL_NAMES):
+            return False
+        if self._sync_version() is None:
+            return False
+        self._remove_expired()
+        existingIndices = [index for index, entry in enumerate(self._entries) if entry.normalizedQuestion == normalizedQuestion]
+        if len(existingIndices) > 0:
+            self._entries.pop(existingIndices[0])
+            self._embeddings = np.delete(self._embeddings, existingIndices[0], axis=0)
+        if len(self._entries) >= self.maxSize:
+            self._entries.pop(0)
+            self._embeddings = self._embeddings[1:]
+        self._entries.append(CacheEntry(normalizedQuestion=normalizedQuestion, keyWords=get_key_words(normalizedQuestion=normalizedQuestion), response=response, expiryTime=time.monotonic() + self.ttlSeconds))
+        self._embeddings = np.vstack([self._embeddings, embed_question(normalizedQuestion=normalizedQuestion, dimensions=self.embeddingDimensions)])
+        self.storeCount += 1
+        return True
+
+    def clear(self) -> None:
+        self._entries = []
+        self._embeddings = np.zeros((0, self.embeddingDimensions), dtype=np.float32)
+
+    def get_stats(self) -> ResponseCacheStats:
+        return ResponseCacheStats(
+            size=len(self._entries),
+            maxSize=self.maxSize,
+            hitCount=self.hitCount,
+            missCount=self.missCount,
+            bypassCount=self.bypassCount,
+            storeCount=self.storeCount,
+        )
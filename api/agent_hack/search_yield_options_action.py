@@ -0,0 +1,59 @@
+from typing import Callable
+
+from cdp import Wallet
+from pydantic import BaseModel
+from pydantic import Field
+
+from agent_hack import yield_option_formatter
+from agent_hack import yield_options
+from agent_hack import yield_snapshot_refresher
+from agent_hack.base_action import BaseAction
+from agent_hack.yield_index import YieldIndexQuery
+from agent_hack.yield_option_formatter import DEFAULT_YIELD_OPTION_LIMIT
+from agent_hack.yield_option_formatter import MAX_YIELD_OPTION_LIMIT
+
+PROMPT = """
+This tool will search the yield options indexed across every supported network, deposit asset and protocol.
+It can filter by the deposited asset symbol (e.g. USDC or WETH), network, protocol, minimum total deposits in USD and minimum APY.
+Use this instead of list_all_yield_options when the wallet holder asks about a specific asset, network or size of vault.
+Results are a compact table of the best matches, use get_yield_option_details for more about a single option.
+"""
+
+class SearchYieldOptionsInput(BaseModel):
+    asset_symbol: str | None = Field(None, description="The symbol of the asset to deposit, e.g. USDC or WETH")  # pylint: disable=invalid-name
+    network_id: str | None = Field(None, description="The network to search, e.g. base-mainnet or ethereum-mainnet, all indexed networks are searched if not given")  # pylint: disable=invalid-name
+    protocol: str | None = Field(None, description="The protocol to search, e.g. morpho or spark")
+    min_total_deposits_usd: float | None = Field(None, description="The minimum total value deposited in the vault in USD")  # pylint: disable=invalid-name
+    min_apy: float | None = Field(None, description="The minimum total APY as a fraction, e.g. 0.05 for 5%")  # pylint: disable=invalid-name
+    limit: int = Field(DEFAULT_YIELD_OPTION_LIMIT, ge=1, le=MAX_YIELD_OPTION_LIMIT, description="The maximum number of options to list, best first")
+
+async def search_yield_options(  # pylint: disable=invalid-name
+    wallet: Wallet,  # pylint: disable=unused-argument
+    asset_symbol: str | None = None,
+    network_id: str | None = None,
+    protocol: str | None = None,
+    min_total_deposits_usd: float | None = None,
+    min_apy: float | None = None,
+    limit: int = DEFAULT_YIELD_OPTION_LIMIT,
+) -> str:
+    yieldIndex = await yield_snapshot_refresher.get_yield_index()
+    result = yieldIndex.query(query=YieldIndexQuery(
+        assetSymbol=asset_symbol,
+        chainId=yield_options.get_chain_id(networkId=network_id) if network_id else None,
+        protocol=protocol,
+        minTotalDepositsUsd=min_total_deposits_usd,
+        minApy=min_apy,
+        limit=limit,
+    ))
+    if result.matchCount == 0:
+        networkIds = [yield_options.get_network_id(chainId=chainId) for chainId in yieldIndex.get_chain_ids()]
+        return f'No yield options match. Indexed assets are {", ".join(yieldIndex.get_asset_symbols())} on {", ".join(networkIds)} from {", ".join(yieldIndex.get_protocols())}.'
+    output = yield_option_formatter.format_yield_options_table(yieldOptions=result.yieldOptions, limit=limit, totalCount=result.matchCount, includeMarket=True)
+    return output
+
+
+class SearchYieldOptionsAction(BaseAction):
+    name: str = "search_yield_options"
+    description: str = PROMPT
+    args_schema: type[BaseModel] | None = SearchYieldOptionsInput
+    afunc: Callable[..., str] = search_yield_options
@@ -0,0 +1,251 @@
+import abc
+import asyncio
+import contextlib
+import fcntl
+import os
+import re
+import time
+import uuid
+from typing import Any
+from typing import AsyncIterator
+from typing import Awaitable
+from typing import Callable
+from typing import TypeVar
+
+from core import logging
+from core.exceptions import KibaException
+
+DEFAULT_LOCK_LEASE_SECONDS = 600
+LOCK_POLL_MIN_SECONDS = 0.01
+LOCK_POLL_MAX_SECONDS = 0.2
+
+LockHandleT = TypeVar('LockHandleT')
+
+
+class LockTimeoutException(KibaException):
+
+    def __init__(self, message: str | None = None) -> None:
+        super().__init__(message=message or 'Timed out waiting for lock', statusCode=409)
+
+
+class SharedState(abc.ABC):
+
+    async def connect(self) -> None:
+        pass
+
+    async def disconnect(self) -> None:
+        pass
+
+    @abc.abstractmethod
+    async def get(self, key: str) -> tuple[bytes, float] | None:
+        pass
+
+    @abc.abstractmethod
+    async def set(self, key: str, value: bytes, expirySeconds: int | None = None) -> None:
+        pass
+
+    @abc.abstractmethod
+    @contextlib.asynccontextmanager
+    async def lock(self, name: str, timeoutSeconds: float, leaseSeconds: float = DEFAULT_LOCK_LEASE_SECONDS) -> AsyncIterator[None]:
+        yield
+
+
+async def _poll_for_lock(name: str, timeoutSeconds: float, tryAcquire: Callable[[], Awaitable[LockHandleT | None]]) -> LockHandleT:
+    deadline = time.monotonic() + timeoutSeconds
+    pollSeconds = LOCK_POLL_MIN_SECONDS
+    while (lockHandle := await tryAcquire()) is None:
+        if time.monotonic() >= deadline:
+            raise LockTimeoutException(message=f'Timed out waiting for lock {name}')
+        await asyncio.sleep(pollSeconds)
+        pollSeconds = min(pollSeconds * 2, LOCK_POLL_MAX_SECONDS)
+    return lockHandle
+
+
+def _sanitize_name(name: str) -> str:
+    return re.sub(r'[^A-Za-z0-9._-]', '_', name)
+
+
+def _read_file_bytes(filePath: str) -> tuple[bytes, float] | None:
+    try:
+        with open(filePath, 'rb') as file:
+            return file.read(), os.fstat(file.fileno()).st_mtime
+    except FileNotFoundError:
+        return None
+
+
+def _write_file_bytes_atomically(filePath: str, content: bytes) -> None:
+    os.makedirs(os.path.dirname(filePath), exist_ok=True)
+    temporaryFilePath = f'{filePath}.{uuid.uuid4().hex}.tmp'
+    try:
+        with open(temporaryFilePath, 'wb') as file:
+            file.write(content)
+        os.replace(temporaryFilePath, filePath)
+    finally:
+        if os.path.exists(temporaryFilePath):
+            os.remove(temporaryFilePath)
+
+
+def _is_same_file(filePath: str, fileDescriptor: int) -> bool:
+    try:
+        pathStat = os.stat(filePath)
+    except FileNotFoundError:
+        return False
+    fileStat = os.fstat(fileDescriptor)
+    return (pathStat.st_dev, pathStat.st_ino) == (fileStat.st_dev, fileStat.st_ino)
+
+
+def _try_lock_file(filePath: str) -> int | None:
+    os.makedirs(os.path.dirname(filePath), exist_ok=True)
+    fileDescriptor = os.open(filePath, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fileDescriptor, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fileDescriptor)
+        return None
+    # Holders remove the file when they release, so a lock taken on a file that has since been removed
+    # (or replaced) is not the lock anyone else will see and has to be retried
+    if not _is_same_file(filePath=filePath, fileDescriptor=fileDescriptor):
+        _unlock_file(fileDescriptor=fileDescriptor)
+        return None
+    return fileDescriptor
+
+
+def _unlock_file(fileDescriptor: int) -> None:
+    try:
+        fcntl.flock(fileDescriptor, fcntl.LOCK_UN)
+    finally:
+        os.close(fileDescriptor)
+
+
+def _remove_and_unlock_file(filePath: str, fileDescriptor: int) -> None:
+    # Removed while still locked so nobody can lock this file after it is gone from the directory
+    try:
+        os.remove(filePath)
+    except FileNotFoundError:
+        pass
+    finally:
+        _unlock_file(fileDescriptor=fileDescriptor)
+
+
+class FileSharedState(SharedState):
+
+    def __init__(self, directoryPath: str = './data') -> None:
+        self.directoryPath = directoryPath
+
+    def _get_file_path(self, key: str) -> str:
+        return os.path.join(self.directoryPath, _sanitize_name(key))
+
+    async def get(self, key: str) -> tuple[bytes, float] | None:
+        return await asyncio.to_thread(_read_file_bytes, filePath=self._get_file_path(key=key))
+
+    async def set(self, key: str, value: bytes, expirySeconds: int | None = None) -> None:
+        await asyncio.to_thread(_write_file_bytes_atomically, filePath=self._get_file_path(key=key), content=value)
+
+    @contextlib.asynccontextmanager
+    async def lock(self, name: str, timeoutSeconds: float, leaseSeconds: float = DEFAULT_LOCK_LEASE_SECONDS) -> AsyncIterator[None]:
+        lockFilePath = os.path.join(self.directoryPath, 'locks', f'{_sanitize_name(name)}.lock')
+
+        async def try_acquire() -> int | None:
+            return _try_lock_file(filePath=lockFilePath)
+
+        fileDescriptor = await _poll_for_lock(name=name, timeoutSeconds=timeoutSeconds, tryAcquire=try_acquire)
+        try:
+            yield
+        finally:
+            _remove_and_unlock_file(filePath=lockFilePath, fileDescriptor=fileDescriptor)
+
+
+class RedisSharedState(SharedState):
+
+    def __init__(self, url: str, keyPrefix: str = 'agent-hack:', client: Any | None = None) -> None:
+        self.url = url
+        self.keyPrefix = keyPrefix
+        self._client = client
+
+    async def connect(self) -> None:
+        if self._client is not None:
+            return
+        try:
+            import redis.asyncio  # pylint: disable=import-outside-toplevel
+        except ImportError as exception:
+            raise KibaException('RedisSharedState requires redis to be installed') from exception
+        self._client = redis.asyncio.Redis.from_url(self.url)
+        await self._client.ping()
+        logging.info('Connected redis shared state')
+
+    async def disconnect(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+        self._client = None
+
+    def _get_client(self) -> Any:
+        if self._client is None:
+            raise KibaException('RedisSharedState has not been connected')
+        return self._client
+
+    async def get(self, key: str) -> tuple[bytes, float] | None:
+        value, setTime = await self._get_client().hmget(f'{self.keyPrefix}{key}', ['value', 'setTime'])
+        if value is None or setTime is None:
+            return None
+        return value, float(setTime)
+
+    async def set(self, key: str, value: bytes, expirySeconds: int | None = None) -> None:
+        redisKey = f'{self.keyPrefix}{key}'
+        async with self._get_client().pipeline(transaction=True) as pipeline:
+            pipeline.delete(redisKey)
+            pipeline.hset(redisKey, mapping={'value': value, 'setTime': str(time.time())})
+            if expirySeconds is not None:
+                pipeline.expire(redisKey, expirySeconds)
+            await pipeline.execute()
+
+    async def _release_lock(self, lockKey: str, token: str) -> bool:
+        # A compare-and-delete with watch rather than a lua script so servers without scripting work too
+        async with self._get_client().pipeline(transaction=True) as pipeline:
+            await pipeline.watch(lockKey)
+            if await pipeline.get(lockKey) != token.encode():
+                await pipeline.unwatch()
+                return False
+            pipeline.multi()
+            pipeline.delete(lockKey)
+            await pipeline.execute()
+        return True
+
+    @contextlib.asynccontextmanager
+    async def lock(self, name: str, timeoutSeconds: float, leaseSeconds: float = DEFAULT_LOCK_LEASE_SECONDS) -> AsyncIterator[None]:
+        lockKey = f'{self.keyPrefix}lock:{name}'
+        token = uuid.uuid4().hex
+
+        async def try_acquire() -> bool | None:
+            return await self._get_client().set(lockKey, token, nx=True, px=int(leaseSeconds * 1000)) or None
+
+        await _poll_for_lock(name=name, timeoutSeconds=timeoutSeconds, tryAcquire=try_acquire)
+        try:
+            yield
+        finally:
+            try:
+                isReleased = await self._release_lock(lockKey=lockKey, token=token)
+            except Exception as exception:  # pylint: disable=broad-exception-caught
+                logging.error(f'Failed to release lock {name}: {exception}')
+            else:
+                if not isReleased:
+                    logging.error(f'Lock {name} expired before it was released')
+
+
+def create_shared_state(connectionString: str) -> SharedState:
+    if connectionString.startswith('redis://') or connectionString.startswith('rediss://'):
+        return RedisSharedState(url=connectionString)
+    if connectionString.startswith('file://'):
+        return FileSharedState(directoryPath=connectionString.removeprefix('file://'))
+    raise KibaException(f'Unsupported shared state connection string: {connectionString}')
+
+
+_sharedState: SharedState = FileSharedState()
+
+
+def set_shared_state(sharedState: SharedState) -> None:
+    global _sharedState  # pylint: disable=global-statement
+    _sharedState = sharedState
+
+
+def get_shared_state() -> SharedState:
+    return _sharedState
@@ -0,0 +1,170 @@
+import asyncio
+import datetime
+from typing import Any
+
+from core import logging
+from core.requester import Requester
+from pydantic import BaseModel
+from pydantic import Field
+
+from agent_hack import aerodrome
+from agent_hack import uniswap
+from agent_hack.uniswap import Token
+
+LIQUIDITY_DEXES = ('uniswap', 'aerodrome')
+
+
+class Asset(BaseModel):
+    morphoId: str = Field(default=None, serialization_alias='data')
+    address: str
+    decimals: int
+    name: str
+    symbol: str
+    tags: list[str] | None
+    logoURI: str | None
+    totalSupply: int
+    priceUsd: float | None
+    oraclePriceUsd: float | None
+    spotPriceEth: float | None
+
+
+class TokenRecord(BaseModel):
+    chainId: int
+    address: str
+    asset: Asset | None = None
+    assetUpdatedDate: datetime.datetime | None = None
+    uniswapToken: Token | None = None
+    uniswapUpdatedDate: datetime.datetime | None = None
+    aerodromeToken: Token | None = None
+    aerodromeUpdatedDate: datetime.datetime | None = None
+
+
+class TokenRegistryStats(BaseModel):
+    tokenCount: int
+    assetInternHitCount: int
+    assetInternMissCount: int
+    liquidityHitCount: int
+    liquidityLoadCount: int
+
+
+class TokenRegistry:
+
+    def __init__(self, liquidityTtlSeconds: float = 3600) -> None:
+        self.liquidityTtlSeconds = liquidityTtlSeconds
+        self._records: dict[tuple[int, str], TokenRecord] = {}
+        self._assetDicts: dict[tuple[int, str], dict[str, Any]] = {}
+        self._symbolAddresses: dict[tuple[int, str], str] = {}
+        self._pendingLiquidityLoads: dict[tuple[int, str, str], asyncio.Task[None]] = {}
+        self.assetInternHitCount = 0
+        self.assetInternMissCount = 0
+        self.liquidityHitCount = 0
+        self.liquidityLoadCount = 0
+
+    def _get_or_create_record(self, chainId: int, address: str) -> TokenRecord:
+        key = (chainId, address.lower())
+        record = self._records.get(key)
+        if record is None:
+            record = TokenRecord(chainId=chainId, address=address.lower())
+            self._records[key] = record
+        return record
+
+    def intern_asset(self, chainId: int, assetDict: dict[str, Any]) -> Asset:
+        key = (chainId, assetDict['address'].lower())
+        record = self._records.get(key)
+        if record is not None and record.asset is not None and self._assetDicts.get(key) == assetDict:
+            self.assetInternHitCount += 1
+            record.assetUpdatedDate = datetime.datetime.now(tz=datetime.timezone.utc)
+            return record.asset
+        self.assetInternMissCount += 1
+        record = self._get_or_create_record(chainId=chainId, address=assetDict['address'])
+        record.asset = Asset.model_validate(assetDict)
+        record.assetUpdatedDate = datetime.datetime.now(tz=datetime.timezone.utc)
+        self._assetDicts[key] = assetDict
+        return record.asset
+
+    def get_asset(self, chainId: int, address: str, maxAgeSeconds: float | None = None) -> Asset | None:
+        record = self._records.get((chainId, address.lower()))
+        if record is None or record.asset is None or record.assetUpdatedDate is None:
+            return None
+        if maxAgeSeconds is not None and (datetime.datetime.now(tz=datetime.timezone.utc) - record.assetUpdatedDate).total_seconds() > maxAgeSeconds:
+            return None
+        return record.asset
+
+    def set_symbol_address(self, chainId: int, symbol: str, address: str) -> None:
+        self._symbolAddresses[(chainId, symbol.upper())] = address.lower()
+
+    def get_symbol_address(self, chainId: int, symbol: str) -> str | None:
+        return self._symbolAddresses.get((chainId, symbol.upper()))
+
+    def get_token(self, chainId: int, address: str) -> TokenRecord | None:
+        return self._records.get((chainId, address.lower()))
+
+    def _is_stale(self, updatedDate: datetime.datetime | None, now: datetime.datetime) -> bool:
+        return updatedDate is None or (now - updatedDate).total_seconds() > self.liquidityTtlSeconds
+
+    @staticmethod
+    def _get_liquidity_updated_date(record: TokenRecord, dex: str) -> datetime.datetime | None:
+        return record.uniswapUpdatedDate if dex == 'uniswap' else record.aerodromeUpdatedDate
+
+    async def _load_liquidity(self, requester: Requester, chainId: int, dex: str, tokenAddresses: list[str], now: datetime.datetime) -> None:
+        loader = uniswap.list_tokens_by_addresses if dex == 'uniswap' else aerodrome.list_tokens_by_addresses
+        try:
+            tokensMap = await loader(requester=requester, chainId=chainId, tokenAddresses=tokenAddresses)
+        except Exception as exception:  # pylint: disable=broad-exception-caught
+            logging.error(f'Failed to load {dex} tokens: {exception}')
+            return
+        finally:
+            for tokenAddress in tokenAddresses:
+                self._pendingLiquidityLoads.pop((chainId, dex, tokenAddress), None)
+        for tokenAddress in tokenAddresses:
+            record = self._get_or_create_record(chainId=chainId, address=tokenAddress)
+            if dex == 'uniswap':
+                record.uniswapToken = tokensMap.get(tokenAddress)
+                record.uniswapUpdatedDate = now
+            else:
+                record.aerodromeToken = tokensMap.get(tokenAddress)
+                record.aerodromeUpdatedDate = now
+
+    async def refresh_liquidity(self, requester: Requester, chainId: int, tokenAddresses: list[str]) -> None:
+        now = datetime.datetime.now(tz=datetime.timezone.utc)
+        records = [self._get_or_create_record(chainId=chainId, address=tokenAddress) for tokenAddress in dict.fromkeys(tokenAddress.lower() for tokenAddress in tokenAddresses)]
+        loadTasks: set[asyncio.Task[None]] = set()
+        for dex in LIQUIDITY_DEXES:
+            staleTokenAddresses: list[str] = []
+            for record in records:
+                pendingLoadTask = self._pendingLiquidityLoads.get((chainId, dex, record.address))
+                if pendingLoadTask is not None:
+                    loadTasks.add(pendingLoadTask)
+                elif self._is_stale(updatedDate=self._get_liquidity_updated_date(record=record, dex=dex), now=now):
+                    staleTokenAddresses.append(record.address)
+            self.liquidityHitCount += len(records) - len(staleTokenAddresses)
+            if len(staleTokenAddresses) == 0:
+                continue
+            self.liquidityLoadCount += len(staleTokenAddresses)
+            loadTask = asyncio.create_task(self._load_liquidity(requester=requester, chainId=chainId, dex=dex, tokenAddresses=staleTokenAddresses, now=now))
+            for tokenAddress in staleTokenAddresses:
+                self._pendingLiquidityLoads[(chainId, dex, tokenAddress)] = loadTask
+            loadTasks.add(loadTask)
+        if len(loadTasks) > 0:
+            await asyncio.gather(*loadTasks)
+
+    def clear(self) -> None:
+        self._records = {}
+        self._assetDicts = {}
+        self._symbolAddresses = {}
+
+    def get_stats(self) -> TokenRegistryStats:
+        return TokenRegistryStats(
+            tokenCount=len(self._records),
+            assetInternHitCount=self.assetInternHitCount,
+            assetInternMissCount=self.assetInternMissCount,
+            liquidityHitCount=self.liquidityHitCount,
+            liquidityLoadCount=self.liquidityLoadCount,
+        )
+
+
+_tokenRegistry = TokenRegistry()
+
+
+def get_token_registry() -> TokenRegistry:
+    return _tokenRegistry
@@ -0,0 +1,261 @@
+import bisect
+import contextlib
+import contextvars
+import re
+import threading
+import time
+import uuid
+from typing import Any
+from typing import Callable
+from typing import Iterator
+from typing import Sequence
+
+from core import logging
+from langchain_core.callbacks import AsyncCallbackHandler
+from pydantic import BaseModel
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+METRIC_PREFIX = 'agent_hack'
+
+Labels = tuple[tuple[str, str], ...]
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+
+def _format_labels(labels: Labels, extraLabels: Labels = ()) -> str:
+    allLabels = labels + extraLabels
+    if len(allLabels) == 0:
+        return ''
+    formattedLabels = ','.join(f'{key}="{_escape_label_value(value)}"' for key, value in allLabels)
+    return f'{{{formattedLabels}}}'
+
+
+def _to_metric_name(name: str) -> str:
+    return re.sub(r'(?<!^)(?=[A-Z])', '_', name).lower()
+
+
+class Histogram:
+
+    def __init__(self, name: str, description: str, buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        self.name = name
+        self.description = description
+        self.buckets = tuple(sorted(buckets))
+        self._bucketCounts: dict[Labels, list[int]] = {}
+        self._sums: dict[Labels, float] = {}
+        self._counts: dict[Labels, int] = {}
+
+    def observe(self, value: float, labels: Labels = ()) -> None:
+        bucketCounts = self._bucketCounts.setdefault(labels, [0] * len(self.buckets))
+        bucketIndex = bisect.bisect_left(self.buckets, value)
+        if bucketIndex < len(self.buckets):
+            bucketCounts[bucketIndex] += 1
+        self._sums[labels] = self._sums.get(labels, 0.0) + value
+        self._counts[labels] = self._counts.get(labels, 0) + 1
+
+    def render(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} histogram']
+        for labels, bucketCounts in self._bucketCounts.items():
+            cumulativeCount = 0
+            for bucket, bucketCount in zip(self.buckets, bucketCounts):
+                cumulativeCount += bucketCount
+                lines.append(f'{self.name}_bucket{_format_labels(labels, (("le", str(bucket)), ))} {cumulativeCount}')
+            lines.append(f'{self.name}_bucket{_format_labels(labels, (("le", "+Inf"), ))} {self._counts[labels]}')
+            lines.append(f'{self.name}_sum{_format_labels(labels)} {self._sums[labels]}')
+            lines.append(f'{self.name}_count{_format_labels(labels)} {self._counts[labels]}')
+        return lines
+
+
+class Counter:
+
+    def __init__(self, name: str, description: str) -> None:
+        self.name = name
+        self.description = description
+        self._values: dict[Labels, float] = {}
+
+    def increment(self, value: float = 1, labels: Labels = ()) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) + value
+
+    def render(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} counter']
+        for labels, value in self._values.items():
+            lines.append(f'{self.name}{_format_labels(labels)} {value}')
+        return lines
+
+
+StatsCollector = Callable[[], BaseModel | Sequence[BaseModel]]
+
+
+class MetricsRegistry:
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.spanDurationHistogram = Histogram(name=f'{METRIC_PREFIX}_span_duration_seconds', description='Duration of traced operations')
+        self.eventCounter = Counter(name=f'{METRIC_PREFIX}_events_total', description='Counts of traced events such as cache hits and misses')
+        self._collectors: dict[str, StatsCollector] = {}
+
+    def observe_span(self, name: str, durationSeconds: float, labels: Labels = ()) -> None:
+        with self._lock:
+            self.spanDurationHistogram.observe(value=durationSeconds, labels=(('span', name), ) + labels)
+
+    def record_event(self, name: str, labels: Labels = ()) -> None:
+        with self._lock:
+            self.eventCounter.increment(labels=(('event', name), ) + labels)
+
+    def register_stats_collector(self, name: str, collector: StatsCollector) -> None:
+        self._collectors[name] = collector
+
+    def _render_collectors(self) -> list[str]:
+        lines: list[str] = []
+        for name, collector in self._collectors.items():
+            try:
+                statsResult = collector()
+            except Exception as exception:  # pylint: disable=broad-exception-caught
+                logging.error(f'Failed to collect {name} stats: {exception}')
+                continue
+            statsList = [statsResult] if isinstance(statsResult, BaseModel) else list(statsResult)
+            for stats in statsList:
+                statsValues = stats.model_dump()
+                labels = tuple((key, str(value)) for key, value in statsValues.items() if isinstance(value, str))
+                for key, value in statsValues.items():
+                    if isinstance(value, (int, float)) and not isinstance(value, bool):
+                        lines.append(f'{METRIC_PREFIX}_{_to_metric_name(name)}_{_to_metric_name(key)}{_format_labels(labels)} {value}')
+        return lines
+
+    def render(self) -> str:
+        with self._lock:
+            lines = self.spanDurationHistogram.render() + self.eventCounter.render()
+        lines += self._render_collectors()
+        return '\n'.join(lines) + '\n'
+
+
+class TraceSpan(BaseModel):
+    name: str
+    startOffsetSeconds: float
+    durationSeconds: float
+    labels: dict[str, str]
+
+
+class StageTiming(BaseModel):
+    name: str
+    spanCount: int
+    startOffsetSeconds: float
+    endOffsetSeconds: float
+    busySeconds: float
+
+
+class Trace:
+
+    def __init__(self, name: str, parentTrace: 'Trace | None' = None) -> None:
+        self.traceId = str(uuid.uuid4())
+        self.name = name
+        self.parentTrace = parentTrace
+        self.startTime = time.perf_counter()
+        self.spans: list[TraceSpan] = []
+
+    def add_span(self, name: str, durationSeconds: float, labels: Labels) -> None:
+        endOffsetSeconds = time.perf_counter() - self.startTime
+        self.spans.append(TraceSpan(name=name, startOffsetSeconds=max(endOffsetSeconds - durationSeconds, 0.0), durationSeconds=durationSeconds, labels=dict(labels)))
+        if self.parentTrace is not None:
+            self.parentTrace.add_span(name=name, durationSeconds=durationSeconds, labels=labels)
+
+    def get_stage_timings(self) -> list[StageTiming]:
+        stageTimings: dict[str, StageTiming] = {}
+        for traceSpan in self.spans:
+            endOffsetSeconds = traceSpan.startOffsetSeconds + traceSpan.durationSeconds
+            stageTiming = stageTimings.get(traceSpan.name)
+            if stageTiming is None:
+                stageTimings[traceSpan.name] = StageTiming(name=traceSpan.name, spanCount=1, startOffsetSeconds=traceSpan.startOffsetSeconds, endOffsetSeconds=endOffsetSeconds, busySeconds=traceSpan.durationSeconds)
+                continue
+            stageTiming.spanCount += 1
+            stageTiming.startOffsetSeconds = min(stageTiming.startOffsetSeconds, traceSpan.startOffsetSeconds)
+            stageTiming.endOffsetSeconds = max(stageTiming.endOffsetSeconds, endOffsetSeconds)
+            stageTiming.busySeconds += traceSpan.durationSeconds
+        return sorted(stageTimings.values(), key=lambda stageTiming: stageTiming.startOffsetSeconds)
+
+
+_metricsRegistry = MetricsRegistry()
+_currentTrace: contextvars.ContextVar[Trace | None] = contextvars.ContextVar('currentTrace', default=None)
+
+
+def get_metrics_registry() -> MetricsRegistry:
+    return _metricsRegistry
+
+
+def get_current_trace() -> Trace | None:
+    return _currentTrace.get()
+
+
+def record_span(name: str, durationSeconds: float, **labels: str) -> None:
+    labelTuple = tuple(sorted(labels.items()))
+    _metricsRegistry.observe_span(name=name, durationSeconds=durationSeconds, labels=labelTuple)
+    currentTrace = _currentTrace.get()
+    if currentTrace is not None:
+        currentTrace.add_span(name=name, durationSeconds=durationSeconds, labels=labelTuple)
+
+
+def record_event(name: str, **labels: str) -> None:
+    _metricsRegistry.record_event(name=name, labels=tuple(sorted(labels.items())))
+
+
+@contextlib.contextmanager
+def span(name: str, **labels: str) -> Iterator[None]:
+    startTime = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, time.perf_counter() - startTime, **labels)
+
+
+@contextlib.contextmanager
+def trace(name: str) -> Iterator[Trace]:
+    currentTrace = Trace(name=name, parentTrace=_currentTrace.get())
+    token = _currentTrace.set(currentTrace)
+    try:
+        yield currentTrace
+    finally:
+        try:
+            _currentTrace.reset(token)
+        except ValueError:
+            # Streaming responses can close their generator from a different context
+            pass
+        durationSeconds = time.perf_counter() - currentTrace.startTime
+        record_span(name, durationSeconds)
+        breakdown = ', '.join(f'{stageTiming.name}={stageTiming.busySeconds:.3f}s@{stageTiming.startOffsetSeconds:.3f}s' for stageTiming in currentTrace.get_stage_timings())
+        logging.info(f'{name} {currentTrace.traceId} took {durationSeconds:.3f}s ({breakdown})')
+
+
+class TracingCallbackHandler(AsyncCallbackHandler):
+    """Records a span for each llm call and tool invocation in an agent run."""
+
+    def __init__(self) -> None:
+        self._startTimes: dict[uuid.UUID, tuple[str, dict[str, str], float]] = {}
+
+    def _start(self, runId: uuid.UUID, name: str, **labels: str) -> None:
+        self._startTimes[runId] = (name, labels, time.perf_counter())
+
+    def _end(self, runId: uuid.UUID, isError: bool = False) -> None:
+        startInfo = self._startTimes.pop(runId, None)
+        if startInfo is None:
+            return
+        name, labels, startTime = startInfo
+        record_span(name, time.perf_counter() - startTime, **labels, status='error' if isError else 'ok')
+
+    async def on_chat_model_start(self, serialized: dict[str, Any], messages: list[list[Any]], *, run_id: uuid.UUID, **kwargs: Any) -> None:  # pylint: disable=arguments-differ
+        self._start(run_id, 'llm_call', model=str((serialized or {}).get('name', 'unknown')))
+
+    async def on_llm_end(self, response: Any, *, run_id: uuid.UUID, **kwargs: Any) -> None:  # pylint: disable=arguments-differ
+        self._end(run_id)
+
+    async def on_llm_error(self, error: BaseException, *, run_id: uuid.UUID, **kwargs: Any) -> None:  # pylint: disable=arguments-differ
+        self._end(run_id, isError=True)
+
+    async def on_tool_start(self, serialized: dict[str, Any], input_str: str, *, run_id: uuid.UUID, **kwargs: Any) -> None:  # pylint: disable=arguments-differ
+        self._start(run_id, 'tool_call', tool=str((serialized or {}).get('name', 'unknown')))
+
+    async def on_tool_end(self, output: Any, *, run_id: uuid.UUID, **kwargs: Any) -> None:  # pylint: disable=arguments-differ
+        self._end(run_id)
+
+    async def on_tool_error(self, error: BaseException, *, run_id: uuid.UUID, **kwargs: Any) -> None:  # pylint: disable=arguments-differ
+        self._end(run_id, isError=True)
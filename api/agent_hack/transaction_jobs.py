@@ -0,0 +1,162 @@
+import asyncio
+import concurrent.futures
+import datetime
+import functools
+import json
+import uuid
+from typing import Callable
+
+from core import logging
+from pydantic import BaseModel
+from pydantic import PrivateAttr
+
+from agent_hack.action_executor import ActionExecutor
+from agent_hack.action_executor import ActionTimeoutException
+from agent_hack.shared_state import SharedState
+from agent_hack.shared_state import get_shared_state
+
+JOB_LOCK_TIMEOUT_SECONDS = 30
+
+
+class TransactionJobStatus:
+    PENDING = 'pending'
+    RUNNING = 'running'
+    COMPLETE = 'complete'
+    FAILED = 'failed'
+    UNKNOWN = 'unknown'
+
+
+class TransactionJob(BaseModel):
+    jobId: str
+    walletId: str
+    kind: str
+    description: str
+    status: str
+    step: str | None = None
+    approvalTransactionHash: str | None = None
+    transactionHash: str | None = None
+    transactionLink: str | None = None
+    error: str | None = None
+    createdDate: datetime.datetime
+    updatedDate: datetime.datetime
+    _onUpdate: Callable[['TransactionJob'], None] | None = PrivateAttr(default=None)
+
+    def update(self, **kwargs: str | None) -> None:
+        for key, value in kwargs.items():
+            setattr(self, key, value)
+        self.updatedDate = datetime.datetime.now(tz=datetime.timezone.utc)
+        if self._onUpdate is not None:
+            self._onUpdate(self)
+
+
+JobFunction = Callable[[TransactionJob], None]
+
+
+class TransactionJobManager:
+    # Jobs are kept in the shared state so any worker can report on them, the thread running a job only lives in the
+    # worker that started it though, so a job that stops being updated (e.g. after a restart) is reported as unknown
+
+    def __init__(self, actionExecutor: ActionExecutor | None = None, sharedState: SharedState | None = None, maxJobsPerWallet: int = 100, timeoutSeconds: float = 900, jobExpirySeconds: int = 7 * 24 * 60 * 60) -> None:
+        self.actionExecutor = actionExecutor or ActionExecutor()
+        self.sharedState = sharedState or get_shared_state()
+        self.maxJobsPerWallet = maxJobsPerWallet
+        self.timeoutSeconds = timeoutSeconds
+        self.jobExpirySeconds = jobExpirySeconds
+        self._tasks: set[asyncio.Task[None]] = set()
+        self._saveLock = asyncio.Lock()
+
+    @staticmethod
+    def _get_job_key(jobId: str) -> str:
+        return f'transactionJob-{jobId}.json'
+
+    @staticmethod
+    def _get_wallet_jobs_key(walletId: str) -> str:
+        return f'transactionJobs-{walletId}.json'
+
+    async def _save_job(self, job: TransactionJob) -> None:
+        # Saves write the job as it is when they run (not when they were scheduled) so the last one always has the latest state
+        async with self._saveLock:
+            await self.sharedState.set(key=self._get_job_key(jobId=job.jobId), value=job.model_dump_json().encode(), expirySeconds=self.jobExpirySeconds)
+
+    @staticmethod
+    def _on_job_saved(jobId: str, saveFuture: concurrent.futures.Future[None]) -> None:
+        if not saveFuture.cancelled() and saveFuture.exception() is not None:
+            logging.error(f'Failed to save transaction job {jobId}: {saveFuture.exception()}')
+
+    def _on_job_updated(self, loop: asyncio.AbstractEventLoop, job: TransactionJob) -> None:
+        # Called from the worker thread running the job as well as from the event loop
+        saveFuture = asyncio.run_coroutine_threadsafe(self._save_job(job=job), loop)
+        saveFuture.add_done_callback(functools.partial(self._on_job_saved, job.jobId))
+
+    async def _add_wallet_job(self, job: TransactionJob) -> None:
+        walletJobsKey = self._get_wallet_jobs_key(walletId=job.walletId)
+        async with self.sharedState.lock(name=f'transaction-jobs-{job.walletId}', timeoutSeconds=JOB_LOCK_TIMEOUT_SECONDS):
+            storedValue = await self.sharedState.get(key=walletJobsKey)
+            jobIds = json.loads(storedValue[0]) if storedValue else []
+            jobIds = (jobIds + [job.jobId])[-self.maxJobsPerWallet:]
+            await self.sharedState.set(key=walletJobsKey, value=json.dumps(jobIds).encode(), expirySeconds=self.jobExpirySeconds)
+
+    async def _run_job(self, job: TransactionJob, jobFunction: JobFunction) -> None:
+        job.update(status=TransactionJobStatus.RUNNING)
+        try:
+            await self.actionExecutor.run(userId=job.walletId, actionName=job.kind, func=jobFunction, kwargs={'job': job}, timeoutSeconds=self.timeoutSeconds)
+        except ActionTimeoutException as exception:
+            # The transaction may still be mined after the wait gives up, so it isn't reported as failed
+            logging.error(f'Transaction job {job.jobId} timed out: {exception}')
+            job.update(status=TransactionJobStatus.UNKNOWN, error=f'Not confirmed within {self.timeoutSeconds} seconds, check the transaction hash to see whether it landed')
+            return
+        except Exception as exception:  # pylint: disable=broad-exception-caught
+            logging.error(f'Transaction job {job.jobId} failed: {exception}')
+            job.update(status=TransactionJobStatus.FAILED, error=str(exception))
+            return
+        job.update(status=TransactionJobStatus.COMPLETE, step=None)
+
+    async def submit(self, walletId: str, kind: str, description: str, jobFunction: JobFunction) -> TransactionJob:
+        now = datetime.datetime.now(tz=datetime.timezone.utc)
+        job = TransactionJob(jobId=str(uuid.uuid4()), walletId=walletId, kind=kind, description=description, status=TransactionJobStatus.PENDING, createdDate=now, updatedDate=now)
+        await self._save_job(job=job)
+        await self._add_wallet_job(job=job)
+        job._onUpdate = functools.partial(self._on_job_updated, asyncio.get_running_loop())  # pylint: disable=protected-access
+        task = asyncio.create_task(self._run_job(job=job, jobFunction=jobFunction))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    def _resolve_status(self, job: TransactionJob) -> TransactionJob:
+        if job.status not in (TransactionJobStatus.PENDING, TransactionJobStatus.RUNNING):
+            return job
+        if (datetime.datetime.now(tz=datetime.timezone.utc) - job.updatedDate).total_seconds() < self.timeoutSeconds:
+            return job
+        return job.model_copy(update={'status': TransactionJobStatus.UNKNOWN, 'error': 'No longer being tracked, check the transaction hash to see whether it landed'})
+
+    async def get_job(self, jobId: str) -> TransactionJob | None:
+        storedValue = await self.sharedState.get(key=self._get_job_key(jobId=jobId))
+        if storedValue is None:
+            return None
+        return self._resolve_status(job=TransactionJob.model_validate_json(storedValue[0]))
+
+    async def list_wallet_jobs(self, walletId: str) -> list[TransactionJob]:
+        storedValue = await self.sharedState.get(key=self._get_wallet_jobs_key(walletId=walletId))
+        if storedValue is None:
+            return []
+        jobs = await asyncio.gather(*[self.get_job(jobId=jobId) for jobId in json.loads(storedValue[0])])
+        return [job for job in jobs if job is not None]
+
+    async def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+
+
+_transactionJobManager: TransactionJobManager | None = None
+
+
+def set_transaction_job_manager(transactionJobManager: TransactionJobManager | None) -> None:
+    global _transactionJobManager  # pylint: disable=global-statement
+    _transactionJobManager = transactionJobManager
+
+
+def get_transaction_job_manager() -> TransactionJobManager:
+    global _transactionJobManager  # pylint: disable=global-statement
+    if _transactionJobManager is None:
+        _transactionJobManager = TransactionJobManager()
+    return _transactionJobManager
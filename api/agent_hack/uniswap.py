@@ -1,13 +1,20 @@
+import asyncio
 import os
+from typing import Any
 
+from core import logging
 from core.exceptions import KibaException
 from core.exceptions import NotFoundException
 from core.requester import Requester
+from core.util import list_util
 from pydantic import BaseModel
 from pydantic import Field
 
+from agent_hack import tracing
 from agent_hack import uniswap_queries
+from agent_hack.util import get_cached_items
 from agent_hack.util import load_or_query
+from agent_hack.util import set_cached_items
 
 
 class Token(BaseModel):
@@ -50,12 +57,62 @@ class TokenWithPools(Token):
     whitelistPools: list[WhitelistPool] | None = None
 
 
+TOKEN_BATCH_SIZE = 100
+
+
+SUBGRAPH_IDS = {
+    1: '5zvR82QoaXYFyDEKLZ9t6v9adgnptxYpKpSbxtgVENFV',
+    8453: 'GqzP4Xaehti8KSfQmv3ZctFSjnSUYZ4En5NRsiTbvZpz',
+}
+
+
+def _get_query_url(chainId: int) -> str:
+    subgraphId = SUBGRAPH_IDS.get(chainId)
+    if subgraphId is None:
+        raise KibaException(f'Unsupported chain {chainId} for uniswap')
+    return f'https://gateway.thegraph.com/api/{os.environ["GRAPH_API_KEY"]}/subgraphs/id/{subgraphId}'
+
+
+async def list_subgraph_tokens_by_addresses(requester: Requester, source: str, chainId: int, queryUrl: str, tokenAddresses: list[str]) -> dict[str, Token]:
+    tokenAddresses = sorted({tokenAddress.lower() for tokenAddress in tokenAddresses})
+    cachedTokenDictLists = await asyncio.gather(*[
+        get_cached_items(source=source, cacheEntityName=f'token-summary-{chainId}-{tokenAddress}') for tokenAddress in tokenAddresses
+    ])
+    tokenDicts: list[dict[str, Any]] = []
+    missingTokenAddresses: list[str] = []
+    for tokenAddress, cachedTokenDicts in zip(tokenAddresses, cachedTokenDictLists):
+        if cachedTokenDicts is None:
+            missingTokenAddresses.append(tokenAddress)
+        else:
+            tokenDicts += cachedTokenDicts
+    if len(missingTokenAddresses) > 0:
+        logging.info(f'querying {len(missingTokenAddresses)} {source} tokens...')
+        with tracing.span('graphql_request', entity='tokens'):
+            responses = await asyncio.gather(*[
+                requester.post_json(url=queryUrl, dataDict={
+                    'query': uniswap_queries.LIST_TOKENS_BY_ADDRESSES,
+                    'variables': {
+                        'tokenAddresses': tokenAddressBatch,
+                    },
+                }) for tokenAddressBatch in list_util.generate_chunks(lst=missingTokenAddresses, chunkSize=TOKEN_BATCH_SIZE)
+            ])
+        queriedTokenDicts = [tokenDict for response in responses for tokenDict in response.json()['data']['tokens']]
+        queriedTokenDictsMap = {tokenDict['id'].lower(): tokenDict for tokenDict in queriedTokenDicts}
+        await asyncio.gather(*[
+            set_cached_items(source=source, cacheEntityName=f'token-summary-{chainId}-{tokenAddress}', items=[queriedTokenDictsMap[tokenAddress]] if tokenAddress in queriedTokenDictsMap else [])
+            for tokenAddress in missingTokenAddresses
+        ])
+        tokenDicts += queriedTokenDicts
+    return {tokenDict['id'].lower(): Token.model_validate(tokenDict) for tokenDict in tokenDicts}
+
+
+async def list_tokens_by_addresses(requester: Requester, chainId: int, tokenAddresses: list[str]) -> dict[str, Token]:
+    return await list_subgraph_tokens_by_addresses(requester=requester, source='uniswap', chainId=chainId, queryUrl=_get_query_url(chainId=chainId), tokenAddresses=tokenAddresses)
+
+
 async def get_token_by_address(requester: Requester, chainId: int, tokenAddress: str) -> TokenWithPools:
-    if chainId == 8453:
-        queryUrl = f'https://gateway.thegraph.com/api/{os.environ["GRAPH_API_KEY"]}/subgraphs/id/GqzP4Xaehti8KSfQmv3ZctFSjnSUYZ4En5NRsiTbvZpz'
-    else:
-        raise KibaException('Unsupported network, only base is supported')
-    tokenDicts = await load_or_query(requester=requester, source='uniswap', entityName='tokens', cacheEntityName=f'token-{tokenAddress}', hasInlinedItems=True, url=queryUrl, dataDict={
+    queryUrl = _get_query_url(chainId=chainId)
+    tokenDicts = await load_or_query(requester=requester, source='uniswap', entityName='tokens', cacheEntityName=f'token-{chainId}-{tokenAddress}', hasInlinedItems=True, url=queryUrl, dataDict={
         'query': uniswap_queries.GET_TOKEN,
         'variables': {
             'tokenAddress': tokenAddress.lower(),
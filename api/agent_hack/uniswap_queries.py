@@ -67,4 +67,26 @@ query GetToken($tokenAddress: String!) {
     }
   }
 }
-'''
\ No newline at end of file
+'''
+
+LIST_TOKENS_BY_ADDRESSES = '''
+query ListTokensByAddresses($tokenAddresses: [String!]!) {
+  tokens(first: 1000, where: {id_in: $tokenAddresses}) {
+    id
+    name
+    symbol
+    decimals
+    totalSupply
+    volume
+    volumeUSD
+    untrackedVolumeUSD
+    feesUSD
+    txCount
+    poolCount
+    totalValueLocked
+    totalValueLockedUSD
+    totalValueLockedUSDUntracked
+    derivedETH
+  }
+}
+'''
@@ -1,9 +1,157 @@
-import json
+import asyncio
+import contextlib
+import glob
+import os
+import time
 from typing import Any
+from typing import Callable
 
 from core import logging
 from core.requester import Requester
-from core.util import file_util
+
+from agent_hack import tracing
+from agent_hack.cache_serializer import CacheSerializer
+from agent_hack.cache_serializer import create_default_cache_serializer
+from agent_hack.memory_cache import MemoryCache
+from agent_hack.shared_state import LockTimeoutException
+from agent_hack.shared_state import get_shared_state
+
+
+OFFLOAD_SERIALIZATION_BYTES = 256 * 1024
+CACHE_LOCK_TIMEOUT_SECONDS = 60
+LEGACY_CACHE_FILE_PATTERNS = ('morpho-*.json', 'uniswap-*.json', 'aerodrome-*.json')
+
+PageCallback = Callable[[list[Any]], None]
+
+_memoryCache = MemoryCache()
+_cacheSerializer = create_default_cache_serializer()
+
+
+def get_memory_cache() -> MemoryCache:
+    return _memoryCache
+
+
+def set_memory_cache(memoryCache: MemoryCache) -> None:
+    global _memoryCache  # pylint: disable=global-statement
+    _memoryCache = memoryCache
+
+
+def set_cache_serializer(cacheSerializer: CacheSerializer) -> None:
+    global _cacheSerializer  # pylint: disable=global-statement
+    _cacheSerializer = cacheSerializer
+
+
+def _remove_legacy_cache_files(directoryPath: str) -> int:
+    removedCount = 0
+    for pattern in LEGACY_CACHE_FILE_PATTERNS:
+        for filePath in glob.glob(os.path.join(directoryPath, pattern)):
+            os.remove(filePath)
+            removedCount += 1
+    return removedCount
+
+
+async def remove_legacy_cache_files(directoryPath: str = './data') -> None:
+    removedCount = await asyncio.to_thread(_remove_legacy_cache_files, directoryPath=directoryPath)
+    if removedCount > 0:
+        logging.info(f'Removed {removedCount} legacy cache files from {directoryPath}')
+
+
+def _get_cache_key(source: str, cacheEntityName: str) -> str:
+    return f'{source}-{cacheEntityName}.cache'
+
+
+async def _read_shared_cache(source: str, cacheEntityName: str, expirySeconds: int) -> tuple[Any, float] | None:
+    cachedValue = await get_shared_state().get(key=_get_cache_key(source=source, cacheEntityName=cacheEntityName))
+    if cachedValue is None:
+        return None
+    content, loadedTime = cachedValue
+    if time.time() - loadedTime >= expirySeconds:
+        return None
+    if len(content) > OFFLOAD_SERIALIZATION_BYTES:
+        items = await asyncio.to_thread(_cacheSerializer.load, content=content)
+    else:
+        items = _cacheSerializer.load(content=content)
+    if items is None:
+        return None
+    return items, loadedTime
+
+
+async def _write_shared_cache(source: str, cacheEntityName: str, items: Any, expirySeconds: int) -> None:
+    content = await asyncio.to_thread(_cacheSerializer.dump, value=items)
+    await get_shared_state().set(key=_get_cache_key(source=source, cacheEntityName=cacheEntityName), value=content, expirySeconds=expirySeconds)
+
+
+async def _query_page(requester: Requester, entityName: str, url: str, dataDict: dict[str, Any], skip: int, hasInlinedItems: bool) -> tuple[list[Any], dict[str, Any] | None]:
+    pageDataDict = {**dataDict, 'variables': {**dataDict['variables'], 'skip': skip}}
+    with tracing.span('graphql_request', entity=entityName):
+        response = await requester.post_json(url=url, dataDict=pageDataDict)
+    data = response.json()
+    if hasInlinedItems:
+        return data['data'][entityName], None
+    return data['data'][entityName]['items'], data['data'][entityName].get('pageInfo')
+
+
+async def _query_all_pages(requester: Requester, entityName: str, url: str, dataDict: dict[str, Any], hasInlinedItems: bool, maxConcurrentPages: int, onPage: PageCallback) -> list[Any]:
+    items, pageInfo = await _query_page(requester=requester, entityName=entityName, url=url, dataDict=dataDict, skip=0, hasInlinedItems=hasInlinedItems)
+    onPage(items)
+    if pageInfo is None or pageInfo['count'] < pageInfo['limit']:
+        return items
+    if pageInfo.get('countTotal') is not None:
+        semaphore = asyncio.Semaphore(maxConcurrentPages)
+
+        async def query_page_limited(skip: int) -> list[Any]:
+            async with semaphore:
+                pageItems, _ = await _query_page(requester=requester, entityName=entityName, url=url, dataDict=dataDict, skip=skip, hasInlinedItems=hasInlinedItems)
+                onPage(pageItems)
+                return pageItems
+
+        pageItemLists = await asyncio.gather(*[query_page_limited(skip=skip) for skip in range(len(items), pageInfo['countTotal'], pageInfo['limit'])])
+        for pageItems in pageItemLists:
+            items += pageItems
+        return items
+    while True:
+        pageItems, pageInfo = await _query_page(requester=requester, entityName=entityName, url=url, dataDict=dataDict, skip=len(items), hasInlinedItems=hasInlinedItems)
+        onPage(pageItems)
+        items += pageItems
+        if pageInfo is None or pageInfo['count'] < pageInfo['limit']:
+            break
+    return items
+
+
+async def _load_or_query_shared(
+    requester: Requester,
+    source: str,
+    entityName: str,
+    url: str,
+    dataDict: dict[str, Any],
+    cacheEntityName: str,
+    hasInlinedItems: bool,
+    expirySeconds: int,
+    maxConcurrentPages: int,
+    onPage: PageCallback,
+) -> tuple[Any, float]:
+    cachedResult = await _read_shared_cache(source=source, cacheEntityName=cacheEntityName, expirySeconds=expirySeconds)
+    if cachedResult is not None:
+        logging.info(f'loaded {cacheEntityName}')
+        tracing.record_event('cache_lookup', source=source, result='shared_hit')
+        return cachedResult
+    async with contextlib.AsyncExitStack() as exitStack:
+        try:
+            await exitStack.enter_async_context(get_shared_state().lock(name=f'cache-{source}-{cacheEntityName}', timeoutSeconds=CACHE_LOCK_TIMEOUT_SECONDS))
+        except LockTimeoutException:
+            logging.info(f'timed out waiting for another worker to query {cacheEntityName}')
+        else:
+            cachedResult = await _read_shared_cache(source=source, cacheEntityName=cacheEntityName, expirySeconds=expirySeconds)
+            if cachedResult is not None:
+                logging.info(f'loaded {cacheEntityName} after waiting')
+                tracing.record_event('cache_lookup', source=source, result='shared_wait_hit')
+                return cachedResult
+        logging.info(f'querying {cacheEntityName}...')
+        tracing.record_event('cache_lookup', source=source, result='miss')
+        items = await _query_all_pages(requester=requester, entityName=entityName, url=url, dataDict=dataDict, hasInlinedItems=hasInlinedItems, maxConcurrentPages=maxConcurrentPages, onPage=onPage)
+        if len(items) > 0:
+            await _write_shared_cache(source=source, cacheEntityName=cacheEntityName, items=items, expirySeconds=expirySeconds)
+    return items, time.time()
 
 
 async def load_or_query(
@@ -15,32 +163,53 @@ async def load_or_query(
     cacheEntityName: str | None = None,
     hasInlinedItems: bool = False,
     expirySeconds: int = 3600,  # Default 1 hour
-) -> dict[str, Any]:
+    maxConcurrentPages: int = 4,
+    onPage: PageCallback | None = None,
+) -> Any:
     if cacheEntityName is None:
         cacheEntityName = entityName
-    cacheFilePath = f'./data/{source}-{cacheEntityName}.json'
-    fileExists = await file_util.file_exists(filePath=cacheFilePath)
-    fileAgeMillis = await file_util.get_file_age_millis(filePath=cacheFilePath) if fileExists else 0
-    if fileExists and (fileAgeMillis / 1000) < expirySeconds:
-        logging.info(f'loading {cacheEntityName}...')
-        items = json.loads(await file_util.read_file(filePath=cacheFilePath))
-    else:
-        logging.info(f'querying {cacheEntityName}...')
-        items = []
-        while True:
-            dataDict['variables']['skip'] = len(items)
-            response = await requester.post_json(url=url, dataDict=dataDict)
-            data = response.json()
-            if hasInlinedItems:
-                items += data['data'][entityName]
-                pageInfo = None
-            else:
-                items += data['data'][entityName]['items']
-                pageInfo = data['data'][entityName].get('pageInfo')
-            if pageInfo is None:
-                break
-            if pageInfo['count'] < pageInfo['limit']:
-                break
-        if len(items) > 0:
-            await file_util.write_file(filePath=cacheFilePath, content=json.dumps(items, indent=2))
+    isMemoryHit = True
+    isWaiting = True
+    hasReportedPages = False
+
+    def on_loaded_page(pageItems: list[Any]) -> None:
+        nonlocal hasReportedPages
+        # A background refresh of a stale entry can outlive this call so its pages are not reported
+        if onPage is None or not isWaiting:
+            return
+        hasReportedPages = True
+        onPage(pageItems)
+
+    async def load() -> tuple[Any, float]:
+        nonlocal isMemoryHit
+        isMemoryHit = False
+        return await _load_or_query_shared(requester=requester, source=source, entityName=entityName, url=url, dataDict=dataDict, cacheEntityName=cacheEntityName, hasInlinedItems=hasInlinedItems, expirySeconds=expirySeconds, maxConcurrentPages=maxConcurrentPages, onPage=on_loaded_page)
+
+    try:
+        items, isCoalesced = await _memoryCache.get_or_load(key=(source, cacheEntityName), expirySeconds=expirySeconds, loader=load)
+    finally:
+        isWaiting = False
+    if isCoalesced:
+        tracing.record_event('cache_lookup', source=source, result='coalesced')
+    elif isMemoryHit:
+        tracing.record_event('cache_lookup', source=source, result='memory_hit')
+    if onPage is not None and not hasReportedPages:
+        onPage(items)
+    return items
+
+
+async def get_cached_items(source: str, cacheEntityName: str, expirySeconds: int = 3600) -> Any | None:
+    items = _memoryCache.get(key=(source, cacheEntityName), expirySeconds=expirySeconds)
+    if items is not None:
+        return items
+    cachedResult = await _read_shared_cache(source=source, cacheEntityName=cacheEntityName, expirySeconds=expirySeconds)
+    if cachedResult is None:
+        return None
+    items, loadedTime = cachedResult
+    _memoryCache.set(key=(source, cacheEntityName), value=items, loadedTime=loadedTime)
     return items
+
+
+async def set_cached_items(source: str, cacheEntityName: str, items: Any, expirySeconds: int = 3600) -> None:
+    _memoryCache.set(key=(source, cacheEntityName), value=items)
+    await _write_shared_cache(source=source, cacheEntityName=cacheEntityName, items=items, expirySeconds=expirySeconds)
@@ -0,0 +1,218 @@
+import abc
+import asyncio
+import collections
+import concurrent.futures
+import functools
+from typing import Any
+from typing import Callable
+from typing import TypeVar
+
+import aiosqlite
+from core import logging
+from core.exceptions import KibaException
+
+from agent_hack import tracing
+from agent_hack.kiba_cdp_agentkit_wrapper import KibaCdpAgentkitWrapper
+from agent_hack.shared_state import FileSharedState
+from agent_hack.shared_state import SharedState
+from agent_hack.shared_state import create_shared_state
+from agent_hack.shared_state import get_shared_state
+
+ReturnT = TypeVar('ReturnT')
+
+WALLET_LOCK_TIMEOUT_SECONDS = 120
+
+
+class WalletDataCipher:
+
+    def __init__(self, encryptionKey: str) -> None:
+        try:
+            from cryptography.fernet import Fernet  # pylint: disable=import-outside-toplevel
+        except ImportError as exception:
+            raise KibaException('WalletDataCipher requires cryptography to be installed') from exception
+        self._fernet = Fernet(encryptionKey.encode())
+
+    def encrypt(self, walletData: str) -> str:
+        return self._fernet.encrypt(walletData.encode()).decode()
+
+    def decrypt(self, encryptedWalletData: str) -> str:
+        return self._fernet.decrypt(encryptedWalletData.encode()).decode()
+
+
+class WalletStore(abc.ABC):
+
+    def __init__(self, cipher: WalletDataCipher | None = None) -> None:
+        self.cipher = cipher
+
+    async def connect(self) -> None:
+        pass
+
+    async def disconnect(self) -> None:
+        pass
+
+    @abc.abstractmethod
+    async def _get_stored_wallet_data(self, networkId: str, userId: str) -> str | None:
+        pass
+
+    @abc.abstractmethod
+    async def _set_stored_wallet_data(self, networkId: str, userId: str, storedWalletData: str) -> None:
+        pass
+
+    async def get_wallet_data(self, networkId: str, userId: str) -> str | None:
+        storedWalletData = await self._get_stored_wallet_data(networkId=networkId, userId=userId)
+        if storedWalletData is None or self.cipher is None:
+            return storedWalletData
+        # Wallets written before encryption was enabled are plain json, encrypt them the first time they are read
+        if storedWalletData.lstrip().startswith('{'):
+            await self.set_wallet_data(networkId=networkId, userId=userId, walletData=storedWalletData)
+            return storedWalletData
+        return self.cipher.decrypt(encryptedWalletData=storedWalletData)
+
+    async def set_wallet_data(self, networkId: str, userId: str, walletData: str) -> None:
+        storedWalletData = self.cipher.encrypt(walletData=walletData) if self.cipher else walletData
+        await self._set_stored_wallet_data(networkId=networkId, userId=userId, storedWalletData=storedWalletData)
+
+
+class SharedStateWalletStore(WalletStore):
+
+    def __init__(self, sharedState: SharedState, cipher: WalletDataCipher | None = None) -> None:
+        super().__init__(cipher=cipher)
+        self.sharedState = sharedState
+
+    async def connect(self) -> None:
+        await self.sharedState.connect()
+
+    async def disconnect(self) -> None:
+        await self.sharedState.disconnect()
+
+    @staticmethod
+    def _get_key(networkId: str, userId: str) -> str:
+        return f'walletData-{networkId}-{userId}.json'
+
+    async def _get_stored_wallet_data(self, networkId: str, userId: str) -> str | None:
+        storedValue = await self.sharedState.get(key=self._get_key(networkId=networkId, userId=userId))
+        if storedValue is None:
+            return None
+        return storedValue[0].decode()
+
+    async def _set_stored_wallet_data(self, networkId: str, userId: str, storedWalletData: str) -> None:
+        await self.sharedState.set(key=self._get_key(networkId=networkId, userId=userId), value=storedWalletData.encode())
+
+
+class FileWalletStore(SharedStateWalletStore):
+
+    def __init__(self, directoryPath: str = './data', cipher: WalletDataCipher | None = None) -> None:
+        super().__init__(sharedState=FileSharedState(directoryPath=directoryPath), cipher=cipher)
+        self.directoryPath = directoryPath
+
+
+class SqliteWalletStore(WalletStore):
+
+    def __init__(self, filePath: str, cipher: WalletDataCipher | None = None) -> None:
+        super().__init__(cipher=cipher)
+        self.filePath = filePath
+        self._connection: aiosqlite.Connection | None = None
+
+    async def connect(self) -> None:
+        if self._connection is not None:
+            return
+        self._connection = await aiosqlite.connect(self.filePath)
+        await self._connection.execute('PRAGMA journal_mode=WAL;')
+        await self._connection.execute('CREATE TABLE IF NOT EXISTS wallets (network_id TEXT NOT NULL, user_id TEXT NOT NULL, wallet_data TEXT NOT NULL, PRIMARY KEY (network_id, user_id));')
+        await self._connection.commit()
+
+    async def disconnect(self) -> None:
+        if self._connection is not None:
+            await self._connection.close()
+        self._connection = None
+
+    def _get_connection(self) -> aiosqlite.Connection:
+        if self._connection is None:
+            raise KibaException('SqliteWalletStore has not been connected')
+        return self._connection
+
+    async def _get_stored_wallet_data(self, networkId: str, userId: str) -> str | None:
+        async with self._get_connection().execute('SELECT wallet_data FROM wallets WHERE network_id = ? AND user_id = ?;', (networkId, userId)) as cursor:
+            row = await cursor.fetchone()
+        return row[0] if row else None
+
+    async def _set_stored_wallet_data(self, networkId: str, userId: str, storedWalletData: str) -> None:
+        connection = self._get_connection()
+        await connection.execute('INSERT INTO wallets (network_id, user_id, wallet_data) VALUES (?, ?, ?) ON CONFLICT (network_id, user_id) DO UPDATE SET wallet_data = excluded.wallet_data;', (networkId, userId, storedWalletData))
+        await connection.commit()
+
+
+def create_wallet_store(connectionString: str, encryptionKey: str | None = None) -> WalletStore:
+    cipher = WalletDataCipher(encryptionKey=encryptionKey) if encryptionKey else None
+    if connectionString.startswith('sqlite:///'):
+        return SqliteWalletStore(filePath=connectionString.removeprefix('sqlite:///'), cipher=cipher)
+    if connectionString.startswith('redis://') or connectionString.startswith('rediss://'):
+        return SharedStateWalletStore(sharedState=create_shared_state(connectionString=connectionString), cipher=cipher)
+    return FileWalletStore(directoryPath=connectionString.removeprefix('file://'), cipher=cipher)
+
+
+class WalletRegistry:
+
+    def __init__(self, cdpApiKeyName: str, cdpApiKeyPrivateKey: str, walletStore: WalletStore, maxSize: int = 1000, maxWorkers: int = 4, sharedState: SharedState | None = None) -> None:
+        self.cdpApiKeyName = cdpApiKeyName
+        self.cdpApiKeyPrivateKey = cdpApiKeyPrivateKey
+        self.walletStore = walletStore
+        self.sharedState = sharedState or get_shared_state()
+        self.maxSize = maxSize
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=maxWorkers, thread_name_prefix='cdp-wallet')
+        self._agentkits: collections.OrderedDict[tuple[str, str], KibaCdpAgentkitWrapper] = collections.OrderedDict()
+        self._persistedWalletData: dict[tuple[str, str], str] = {}
+        self._locks: dict[tuple[str, str], asyncio.Lock] = collections.defaultdict(asyncio.Lock)
+
+    async def run_blocking(self, func: Callable[..., ReturnT], *args: Any, **kwargs: Any) -> ReturnT:
+        return await asyncio.get_running_loop().run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    async def _hydrate(self, networkId: str, userId: str) -> KibaCdpAgentkitWrapper:
+        key = (networkId, userId)
+        values = {
+            "cdp_api_key_name": self.cdpApiKeyName,
+            "cdp_api_key_private_key": self.cdpApiKeyPrivateKey,
+            "network_id": networkId,
+        }
+        # Without the shared lock two workers hydrating a new user at the same time would each create
+        # (and persist) a different wallet, with it the second one waits and then loads the wallet the first one stored
+        async with self.sharedState.lock(name=f'wallet-{networkId}-{userId}', timeoutSeconds=WALLET_LOCK_TIMEOUT_SECONDS):
+            storedWalletData = await self.walletStore.get_wallet_data(networkId=networkId, userId=userId)
+            if storedWalletData is not None:
+                values["cdp_wallet_data"] = storedWalletData
+                self._persistedWalletData[key] = storedWalletData
+            with tracing.span('wallet_hydration'):
+                agentkit = await self.run_blocking(KibaCdpAgentkitWrapper, **values)
+                await self.persist_if_changed(networkId=networkId, userId=userId, agentkit=agentkit)
+        logging.info(f'Hydrated wallet for {networkId} {userId}')
+        return agentkit
+
+    async def persist_if_changed(self, networkId: str, userId: str, agentkit: KibaCdpAgentkitWrapper) -> None:
+        key = (networkId, userId)
+        walletData = await self.run_blocking(agentkit.export_wallet)
+        if walletData == self._persistedWalletData.get(key):
+            return
+        await self.walletStore.set_wallet_data(networkId=networkId, userId=userId, walletData=walletData)
+        self._persistedWalletData[key] = walletData
+
+    async def get_agentkit(self, networkId: str, userId: str) -> KibaCdpAgentkitWrapper:
+        key = (networkId, userId)
+        async with self._locks[key]:
+            agentkit = self._agentkits.get(key)
+            if agentkit is None:
+                agentkit = await self._hydrate(networkId=networkId, userId=userId)
+                self._agentkits[key] = agentkit
+            self._agentkits.move_to_end(key)
+        while len(self._agentkits) > self.maxSize:
+            evictedKey, _ = self._agentkits.popitem(last=False)
+            self._persistedWalletData.pop(evictedKey, None)
+            # A held lock means the key is being hydrated again, dropping it would let a second hydration in
+            evictedLock = self._locks.get(evictedKey)
+            if evictedLock is not None and not evictedLock.locked():
+                del self._locks[evictedKey]
+        return agentkit
+
+    async def close(self) -> None:
+        self._agentkits.clear()
+        self._persistedWalletData.clear()
+        self.executor.shutdown(wait=False, cancel_futures=True)
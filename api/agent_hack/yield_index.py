@@ -0,0 +1,95 @@
+import datetime
+from typing import Literal
+
+import numpy as np
+from pydantic import BaseModel
+
+from agent_hack import tracing
+from agent_hack.yield_options import YieldOption
+
+YieldIndexSortKey = Literal['riskAdjustedApy', 'totalApy', 'totalDepositsUsd']
+
+
+class YieldIndexQuery(BaseModel):
+    assetSymbol: str | None = None
+    chainId: int | None = None
+    protocol: str | None = None
+    minTotalDepositsUsd: float | None = None
+    minApy: float | None = None
+    sortBy: YieldIndexSortKey = 'riskAdjustedApy'
+    limit: int = 10
+
+
+class YieldIndexResult(BaseModel):
+    yieldOptions: list[YieldOption]
+    matchCount: int
+
+
+class YieldIndexStats(BaseModel):
+    yieldOptionCount: int
+    chainCount: int
+    assetCount: int
+    protocolCount: int
+    ageSeconds: float
+
+
+def _build_masks(values: list[str | int]) -> dict[str | int, np.ndarray]:
+    valuesArray = np.array(values, dtype=object)
+    return {value: valuesArray == value for value in set(values)}
+
+
+class YieldIndex:
+
+    def __init__(self, yieldOptions: list[YieldOption], createdDate: datetime.datetime | None = None) -> None:
+        self.yieldOptions = yieldOptions
+        self.createdDate = createdDate or datetime.datetime.now(tz=datetime.timezone.utc)
+        self._chainMasks = _build_masks(values=[yieldOption.chainId for yieldOption in yieldOptions])
+        self._assetMasks = _build_masks(values=[yieldOption.assetSymbol.upper() for yieldOption in yieldOptions])
+        self._protocolMasks = _build_masks(values=[yieldOption.protocol.lower() for yieldOption in yieldOptions])
+        self._totalDepositsUsds = np.array([yieldOption.totalDepositsUsd for yieldOption in yieldOptions], dtype=np.float64)
+        self._totalApys = np.array([yieldOption.totalApy for yieldOption in yieldOptions], dtype=np.float64)
+        sortValues: dict[str, np.ndarray] = {
+            'riskAdjustedApy': np.array([yieldOption.riskAdjustedApy for yieldOption in yieldOptions], dtype=np.float64),
+            'totalApy': self._totalApys,
+            'totalDepositsUsd': self._totalDepositsUsds,
+        }
+        self._sortOrders = {sortKey: np.argsort(-values, kind='stable') for sortKey, values in sortValues.items()}
+
+    def get_chain_ids(self) -> list[int]:
+        return sorted(self._chainMasks.keys())  # type: ignore[arg-type]
+
+    def get_asset_symbols(self) -> list[str]:
+        return sorted(self._assetMasks.keys())  # type: ignore[arg-type]
+
+    def get_protocols(self) -> list[str]:
+        return sorted(self._protocolMasks.keys())  # type: ignore[arg-type]
+
+    def query(self, query: YieldIndexQuery) -> YieldIndexResult:
+        with tracing.span('yield_index_query'):
+            mask = np.ones(len(self.yieldOptions), dtype=bool)
+            for masks, value in ((self._chainMasks, query.chainId), (self._assetMasks, query.assetSymbol.upper() if query.assetSymbol else None), (self._protocolMasks, query.protocol.lower() if query.protocol else None)):
+                if value is None:
+                    continue
+                valueMask = masks.get(value)
+                if valueMask is None:
+                    return YieldIndexResult(yieldOptions=[], matchCount=0)
+                mask &= valueMask
+            if query.minTotalDepositsUsd is not None:
+                mask &= self._totalDepositsUsds >= query.minTotalDepositsUsd
+            if query.minApy is not None:
+                mask &= self._totalApys >= query.minApy
+            sortOrder = self._sortOrders[query.sortBy]
+            matchedIndices = sortOrder[mask[sortOrder]]
+            return YieldIndexResult(
+                yieldOptions=[self.yieldOptions[index] for index in matchedIndices[:max(query.limit, 0)]],
+                matchCount=len(matchedIndices),
+            )
+
+    def get_stats(self) -> YieldIndexStats:
+        return YieldIndexStats(
+            yieldOptionCount=len(self.yieldOptions),
+            chainCount=len(self._chainMasks),
+            assetCount=len(self._assetMasks),
+            protocolCount=len(self._protocolMasks),
+            ageSeconds=(datetime.datetime.now(tz=datetime.timezone.utc) - self.createdDate).total_seconds(),
+        )
@@ -0,0 +1,104 @@
+import math
+
+from agent_hack.apy_history_store import ApyStatistics
+from agent_hack.yield_options import YieldOption
+from agent_hack.yield_options import get_network_id
+
+DEFAULT_YIELD_OPTION_LIMIT = 10
+MAX_YIELD_OPTION_LIMIT = 50
+DEFAULT_MAX_TOKENS = 1500
+TABLE_HEADER = 'rank|name|symbol|riskAdjustedApy|totalApy|baseApy|depositsUsd|rewards'
+MARKET_TABLE_HEADER = 'rank|network|asset|protocol|name|symbol|riskAdjustedApy|totalApy|baseApy|depositsUsd|rewards'
+
+
+def estimate_token_count(text: str) -> int:
+    return math.ceil(len(text) / 4)
+
+
+def _format_number(value: float) -> str:
+    return f'{value:.4f}'.rstrip('0').rstrip('.')
+
+
+def _format_usd(value: float) -> str:
+    if value >= 1_000_000:
+        return f'{value / 1_000_000:.1f}M'
+    if value >= 1_000:
+        return f'{value / 1_000:.1f}K'
+    return f'{value:.0f}'
+
+
+def format_yield_option_row(rank: int, yieldOption: YieldOption, includeMarket: bool = False) -> str:
+    rewards = ','.join(f'{reward.asset.symbol}:{_format_number(reward.apy)}' for reward in yieldOption.rewards) or '-'
+    marketColumns = [get_network_id(chainId=yieldOption.chainId), yieldOption.assetSymbol, yieldOption.protocol] if includeMarket else []
+    return '|'.join([str(rank)] + marketColumns + [
+        yieldOption.name.replace('|', '/'),
+        yieldOption.symbol.replace('|', '/'),
+        _format_number(yieldOption.riskAdjustedApy),
+        _format_number(yieldOption.totalApy),
+        _format_number(yieldOption.baseApy),
+        _format_usd(yieldOption.totalDepositsUsd),
+        rewards,
+    ])
+
+
+def format_yield_options_table(yieldOptions: list[YieldOption], limit: int = DEFAULT_YIELD_OPTION_LIMIT, maxTokens: int = DEFAULT_MAX_TOKENS, totalCount: int | None = None, includeMarket: bool = False) -> str:
+    sortedYieldOptions = sorted(yieldOptions, key=lambda yieldOption: yieldOption.riskAdjustedApy, reverse=True)
+    tableHeader = MARKET_TABLE_HEADER if includeMarket else TABLE_HEADER
+    lines = [tableHeader]
+    tokenCount = estimate_token_count(tableHeader)
+    for rank, yieldOption in enumerate(sortedYieldOptions[:limit], start=1):
+        row = format_yield_option_row(rank=rank, yieldOption=yieldOption, includeMarket=includeMarket)
+        rowTokenCount = estimate_token_count(row)
+        if tokenCount + rowTokenCount > maxTokens:
+            break
+        lines.append(row)
+        tokenCount += rowTokenCount
+    shownCount = len(lines) - 1
+    summary = f'Top {shownCount} of {totalCount if totalCount is not None else len(yieldOptions)} yield options by risk-adjusted APY (APYs are fractions, e.g. 0.05 = 5%).'
+    detailsHint = 'Use get_yield_option_details with a name or symbol for addresses and reward liquidity details.'
+    return '\n'.join([summary] + lines + [detailsHint])
+
+
+def find_yield_option(yieldOptions: list[YieldOption], identifier: str) -> YieldOption | None:
+    normalizedIdentifier = identifier.strip().lower()
+    for yieldOption in yieldOptions:
+        if normalizedIdentifier in (yieldOption.address.lower(), yieldOption.symbol.lower(), yieldOption.name.lower()):
+            return yieldOption
+    return None
+
+
+def format_yield_option_details(yieldOption: YieldOption) -> str:
+    return yieldOption.model_dump_json(exclude={'rewards': {'__all__': {'asset': {'logoURI', 'totalSupply'}}}})
+
+
+def _format_optional_number(value: float | None) -> str:
+    return _format_number(value) if value is not None else 'unknown'
+
+
+def format_yield_option_stability(yieldOption: YieldOption, apyStatistics: ApyStatistics | None) -> str:
+    lines = [
+        f'{yieldOption.name} ({yieldOption.symbol}) on {get_network_id(chainId=yieldOption.chainId)}',
+        f'currentApy={_format_number(yieldOption.totalApy)} dailyApy={_format_optional_number(yieldOption.dailyApy)} weeklyApy={_format_optional_number(yieldOption.weeklyApy)} monthlyApy={_format_optional_number(yieldOption.monthlyApy)}',
+        f'apyVolatilityUsedForScoring={_format_optional_number(yieldOption.apyVolatility)}',
+    ]
+    if apyStatistics is None or apyStatistics.sampleCount < 2:
+        lines.append('No recorded history yet, stability is estimated from the daily, weekly and monthly APYs only.')
+    else:
+        historyDays = (apyStatistics.lastSampleDate - apyStatistics.firstSampleDate).total_seconds() / (24 * 60 * 60)
+        lines.append(f'Recorded history: {apyStatistics.sampleCount} samples over {historyDays:.1f} days, meanApy={_format_number(apyStatistics.meanApy)} apyVolatility={_format_number(apyStatistics.apyVolatility)} minApy={_format_number(apyStatistics.minApy)} maxApy={_format_number(apyStatistics.maxApy)} drawdownFromMaxApy={_format_number(apyStatistics.drawdown)}')
+    return '\n'.join(lines)
+
+
+def format_yield_options_legacy(yieldOptions: list[YieldOption]) -> str:
+    yieldOptionJsons = [yieldOption.model_dump_json() for yieldOption in yieldOptions]
+    return f'Available vaults are here in a json list: {yieldOptionJsons}'
+
+
+def measure_token_counts(yieldOptions: list[YieldOption], limit: int = DEFAULT_YIELD_OPTION_LIMIT) -> dict[str, int]:
+    legacyTokenCount = estimate_token_count(format_yield_options_legacy(yieldOptions=yieldOptions))
+    compactTokenCount = estimate_token_count(format_yield_options_table(yieldOptions=yieldOptions, limit=limit))
+    return {
+        'yieldOptionCount': len(yieldOptions),
+        'legacyTokenCount': legacyTokenCount,
+        'compactTokenCount': compactTokenCount,
+    }
@@ -1,12 +1,21 @@
 import asyncio
 import datetime
 
+import numpy as np
+from core.exceptions import KibaException
 from core.requester import Requester
 from pydantic import BaseModel
 
-from agent_hack import aerodrome
 from agent_hack import morpho
-from agent_hack import uniswap
+from agent_hack import tracing
+from agent_hack import yield_scoring
+from agent_hack.apy_history_store import ApyStatistics
+from agent_hack.apy_history_store import get_apy_history_store
+from agent_hack.pooled_requester import get_shared_requester
+from agent_hack.token_registry import Asset as TokenAsset
+from agent_hack.token_registry import get_token_registry
+from agent_hack.yield_scoring import DEFAULT_SCORING_PROFILE
+from agent_hack.yield_scoring import ScoringProfile
 
 
 class Asset(BaseModel):
@@ -36,6 +45,9 @@ class YieldOptionReward(BaseModel):
 
 
 class YieldOption(BaseModel):
+    chainId: int
+    assetSymbol: str
+    protocol: str
     name: str
     symbol: str
     address: str
@@ -45,88 +57,153 @@ class YieldOption(BaseModel):
     totalApy: float
     baseApy: float
     riskAdjustedApy: float
+    dailyApy: float | None = None
+    weeklyApy: float | None = None
+    monthlyApy: float | None = None
+    apyVolatility: float | None = None
     rewards: list[YieldOptionReward]
 
 
+ETHEREUM_CHAIN_ID = 1
 BASE_CHAIN_ID = 8453
-MIN_TVL_USD = 100_000
-GOOD_TVL_USD = 1_000_000
-MIN_VOLUME_USD = 50_000
-GOOD_VOLUME_USD = 500_000
-MIN_TX_COUNT = 100
-GOOD_TX_COUNT = 1000
-
-
-def _calculate_token_quality_factor(token: uniswap.TokenWithPools | None) -> float:
-    if token is None or isinstance(token, Exception):
-        return 0.0
-    tvlFactor = min(1.0, max(0.0, (token.totalValueLockedUSD - MIN_TVL_USD) / (GOOD_TVL_USD - MIN_TVL_USD)))
-    volumeFactor = min(1.0, max(0.0, (token.volumeUSD - MIN_VOLUME_USD) / (GOOD_VOLUME_USD - MIN_VOLUME_USD)))
-    txFactor = min(1.0, max(0.0, (token.txCount - MIN_TX_COUNT) / (GOOD_TX_COUNT - MIN_TX_COUNT)))
-    weightedFactor = (tvlFactor * 0.5) + (volumeFactor * 0.3) + (txFactor * 0.2)
-    print(token.address, 'weightedFactor', weightedFactor)
-    return weightedFactor
-
-
-async def list_morpho_yield_options(chainId: int) -> list[YieldOption]:
-    requester = Requester()
-    usdcAsset = await morpho.get_asset_by_symbol(requester=requester, chainId=chainId, assetSymbol="USDC")
-    print(f'Loaded USDC asset: {usdcAsset}')
-    vaults = await morpho.list_vaults(requester=requester, chainId=chainId, assetAddress=usdcAsset.address)
+DEFAULT_ASSET_SYMBOL = 'USDC'
+NETWORK_CHAIN_IDS = {
+    'ethereum-mainnet': ETHEREUM_CHAIN_ID,
+    'base-mainnet': BASE_CHAIN_ID,
+}
+
+
+def get_chain_id(networkId: str) -> int:
+    chainId = NETWORK_CHAIN_IDS.get(networkId)
+    if chainId is None:
+        raise KibaException(f'Unsupported network {networkId}, supported networks are {", ".join(NETWORK_CHAIN_IDS.keys())}')
+    return chainId
+
+
+def get_network_id(chainId: int) -> str:
+    return next((networkId for networkId, networkChainId in NETWORK_CHAIN_IDS.items() if networkChainId == chainId), str(chainId))
+
+
+async def _refresh_reward_liquidity(requester: Requester, chainId: int, tokenAddresses: list[str]) -> None:
+    with tracing.span('reward_liquidity'):
+        await get_token_registry().refresh_liquidity(requester=requester, chainId=chainId, tokenAddresses=tokenAddresses)
+
+
+async def _get_apy_statistics(chainId: int) -> dict[str, ApyStatistics]:
+    apyHistoryStore = get_apy_history_store()
+    if apyHistoryStore is None:
+        return {}
+    with tracing.span('apy_history'):
+        return await apyHistoryStore.get_statistics(chainId=chainId)
+
+
+async def _get_deposit_asset_address(requester: Requester, chainId: int, assetSymbol: str) -> str:
+    depositAssetAddress = get_token_registry().get_symbol_address(chainId=chainId, symbol=assetSymbol)
+    if depositAssetAddress is not None:
+        return depositAssetAddress
+    with tracing.span('deposit_asset'):
+        depositAsset = await morpho.get_asset_by_symbol(requester=requester, chainId=chainId, assetSymbol=assetSymbol)
+    return depositAsset.address
+
+
+async def list_morpho_yield_options(chainId: int, requester: Requester | None = None, scoringProfile: ScoringProfile = DEFAULT_SCORING_PROFILE, limit: int | None = None, assetSymbol: str = DEFAULT_ASSET_SYMBOL) -> list[YieldOption]:
+    with tracing.trace(name='morpho_yield_options'):
+        return await _list_morpho_yield_options(chainId=chainId, requester=requester or get_shared_requester(), scoringProfile=scoringProfile, limit=limit, assetSymbol=assetSymbol)
+
+
+async def _list_morpho_yield_options(chainId: int, requester: Requester, scoringProfile: ScoringProfile, limit: int | None, assetSymbol: str) -> list[YieldOption]:
+    apyStatisticsTask = asyncio.create_task(_get_apy_statistics(chainId=chainId))
+    liquidityTasks: list[asyncio.Task[None]] = []
+    requestedTokenAddresses: set[str] = set()
+
+    def on_reward_asset_addresses(tokenAddresses: list[str]) -> None:
+        newTokenAddresses = list(dict.fromkeys(tokenAddress.lower() for tokenAddress in tokenAddresses if tokenAddress.lower() not in requestedTokenAddresses))
+        if len(newTokenAddresses) == 0:
+            return
+        requestedTokenAddresses.update(newTokenAddresses)
+        liquidityTasks.append(asyncio.create_task(_refresh_reward_liquidity(requester=requester, chainId=chainId, tokenAddresses=newTokenAddresses)))
+
+    try:
+        depositAssetAddress = await _get_deposit_asset_address(requester=requester, chainId=chainId, assetSymbol=assetSymbol)
+        vaults = await morpho.list_vaults(requester=requester, chainId=chainId, assetAddress=depositAssetAddress, onRewardAssetAddresses=on_reward_asset_addresses)
+    except BaseException:
+        # Liquidity loads are left to finish as other callers may be sharing them
+        apyStatisticsTask.cancel()
+        raise
     print(f'Loaded {len(vaults)} vaults')
-    allRewardAssets: dict[str, morpho.Asset] = {}
+    allRewardAssets: dict[str, TokenAsset] = {}
     for vault in vaults:
-        allRewardAssets.update({reward.asset.address: reward.asset for reward in vault.rewardApys})
-    print('allRewardAssets', allRewardAssets)
-    uniswapRewardTokenPromises = [uniswap.get_token_by_address(requester=requester, chainId=chainId, tokenAddress=rewardAsset.address) for rewardAsset in allRewardAssets.values()]
-    uniswapRewardTokens = await asyncio.gather(*uniswapRewardTokenPromises, return_exceptions=True)
-    uniswapRewardTokens = [(token if isinstance(token, uniswap.Token) else None) for token in uniswapRewardTokens]
-    uniswapRewardTokensMap = dict(zip(allRewardAssets.keys(), uniswapRewardTokens))
-    print('uniswapRewardTokensMap', uniswapRewardTokensMap)
-    aerodromeRewardTokenPromises = [aerodrome.get_token_by_address(requester=requester, chainId=chainId, tokenAddress=rewardAsset.address) for rewardAsset in allRewardAssets.values()]
-    aerodromeRewardTokens = await asyncio.gather(*aerodromeRewardTokenPromises, return_exceptions=True)
-    aerodromeRewardTokens = [(token if isinstance(token, uniswap.Token) else None) for token in aerodromeRewardTokens]
-    aerodromeRewardTokensMap = dict(zip(allRewardAssets.keys(), aerodromeRewardTokens))
-    print('aerodromeRewardTokensMap', aerodromeRewardTokensMap)
+        allRewardAssets.update({reward.asset.address.lower(): reward.asset for reward in vault.rewardApys})
+    tokenAddresses = list(allRewardAssets.keys())
+    on_reward_asset_addresses(tokenAddresses)
+    with tracing.span('dependency_wait'):
+        apyStatistics = await apyStatisticsTask
+        await asyncio.gather(*liquidityTasks)
+    tokenRegistry = get_token_registry()
+    tokenIndices = {tokenAddress: index for index, tokenAddress in enumerate(tokenAddresses)}
+    tokenRecords = [tokenRegistry.get_token(chainId=chainId, address=tokenAddress) for tokenAddress in tokenAddresses]
+    rewardVaultIndices = np.array([vaultIndex for vaultIndex, vault in enumerate(vaults) for _ in vault.rewardApys], dtype=np.int64)
+    rewardTokenIndices = np.array([tokenIndices[reward.asset.address.lower()] for vault in vaults for reward in vault.rewardApys], dtype=np.int64)
+    rewardOffsets = np.concatenate(([0], np.cumsum([len(vault.rewardApys) for vault in vaults], dtype=np.int64)))
+    vaultApyStatistics = [apyStatistics.get(vault.address.lower()) for vault in vaults]
+    apyVolatilities = yield_scoring.calculate_apy_volatilities(
+        historyVolatilities=np.array([statistics.apyVolatility if statistics else 0.0 for statistics in vaultApyStatistics], dtype=np.float64),
+        historySampleCounts=np.array([statistics.sampleCount if statistics else 0 for statistics in vaultApyStatistics], dtype=np.int64),
+        periodApys=np.array([[vault.totalApy, vault.dailyApy, vault.weeklyApy, vault.monthlyApy] for vault in vaults], dtype=np.float64).reshape(len(vaults), 4),
+    )
+    with tracing.span('yield_scoring'):
+        vaultScores = yield_scoring.score_vaults(
+            baseApys=np.array([vault.baseApy for vault in vaults], dtype=np.float64),
+            rewardVaultIndices=rewardVaultIndices,
+            rewardTokenIndices=rewardTokenIndices,
+            rewardApys=np.array([reward.apy for vault in vaults for reward in vault.rewardApys], dtype=np.float64),
+            uniswapTokenMetrics=yield_scoring.build_token_metrics(tokens=[tokenRecord.uniswapToken if tokenRecord else None for tokenRecord in tokenRecords]),
+            aerodromeTokenMetrics=yield_scoring.build_token_metrics(tokens=[tokenRecord.aerodromeToken if tokenRecord else None for tokenRecord in tokenRecords]),
+            profile=scoringProfile,
+            apyVolatilities=apyVolatilities,
+        )
+    rewardOutputAssets = {
+        tokenAddress: Asset(
+            address=rewardAsset.address,
+            decimals=rewardAsset.decimals,
+            name=rewardAsset.name,
+            symbol=rewardAsset.symbol,
+            logoURI=rewardAsset.logoURI,
+            totalSupply=rewardAsset.totalSupply,
+            priceUsd=rewardAsset.priceUsd,
+            oraclePriceUsd=rewardAsset.oraclePriceUsd,
+            spotPriceEth=rewardAsset.spotPriceEth,
+        ) for tokenAddress, rewardAsset in zip(tokenAddresses, allRewardAssets.values())
+    }
     yieldOptions: list[YieldOption] = []
-    for vault in vaults:
-        overallRiskAdjustedApy = vault.baseApy
+    for vaultIndex in vaultScores.get_top_vault_indices(limit=limit):
+        vault = vaults[vaultIndex]
         rewards: list[YieldOptionReward] = []
-        for reward in vault.rewardApys:
-            uniswapToken = uniswapRewardTokensMap.get(reward.asset.address)
-            aerodromeToken = aerodromeRewardTokensMap.get(reward.asset.address)
-            uniswapFactor = _calculate_token_quality_factor(uniswapToken)
-            aerodromeFactor = _calculate_token_quality_factor(aerodromeToken)
-            qualityFactor = max(uniswapFactor, aerodromeFactor)
-            adjustedRewardApy = reward.apy * qualityFactor
-            overallRiskAdjustedApy += adjustedRewardApy
+        for rewardIndex, reward in enumerate(vault.rewardApys, start=int(rewardOffsets[vaultIndex])):
+            tokenIndex = int(rewardTokenIndices[rewardIndex])
+            tokenRecord = tokenRecords[tokenIndex]
+            uniswapToken = tokenRecord.uniswapToken if tokenRecord else None
+            aerodromeToken = tokenRecord.aerodromeToken if tokenRecord else None
             rewards.append(
                 YieldOptionReward(
-                    asset=Asset(
-                        address=reward.asset.address,
-                        decimals=reward.asset.decimals,
-                        name=reward.asset.name,
-                        symbol=reward.asset.symbol,
-                        logoURI=reward.asset.logoURI,
-                        totalSupply=reward.asset.totalSupply,
-                        priceUsd=reward.asset.priceUsd,
-                        oraclePriceUsd=reward.asset.oraclePriceUsd,
-                        spotPriceEth=reward.asset.spotPriceEth,
-                    ),
+                    asset=rewardOutputAssets[tokenAddresses[tokenIndex]],
                     apy=reward.apy,
-                    riskAdjustedApy=adjustedRewardApy,
+                    riskAdjustedApy=float(vaultScores.rewardRiskAdjustedApys[rewardIndex]),
                     uniswapTotalValueLockedUSD=uniswapToken.totalValueLockedUSD if uniswapToken else None,
                     uniswapVolumeUSD=uniswapToken.volumeUSD if uniswapToken else None,
                     uniswapTxCount=uniswapToken.txCount if uniswapToken else None,
-                    uniswapRiskFactor=uniswapFactor,
+                    uniswapRiskFactor=float(vaultScores.rewardUniswapFactors[rewardIndex]),
                     aerodromeTotalValueLockedUSD=aerodromeToken.totalValueLockedUSD if aerodromeToken else None,
                     aerodromeVolumeUSD=aerodromeToken.volumeUSD if aerodromeToken else None,
                     aerodromeTxCount=aerodromeToken.txCount if aerodromeToken else None,
-                    aerodromeRiskFactor=aerodromeFactor,
+                    aerodromeRiskFactor=float(vaultScores.rewardAerodromeFactors[rewardIndex]),
                 )
             )
         yieldOptions.append(
             YieldOption(
+                chainId=chainId,
+                assetSymbol=assetSymbol,
+                protocol='morpho',
                 name=vault.name,
                 symbol=vault.symbol,
                 address=vault.address,
@@ -135,17 +212,25 @@ async def list_morpho_yield_options(chainId: int) -> list[YieldOption]:
                 creationDate=datetime.datetime.fromtimestamp(vault.creationTimestamp),
                 totalApy=vault.totalApy,
                 baseApy=vault.baseApy,
-                riskAdjustedApy=overallRiskAdjustedApy,
+                riskAdjustedApy=float(vaultScores.vaultRiskAdjustedApys[vaultIndex]),
+                dailyApy=vault.dailyApy,
+                weeklyApy=vault.weeklyApy,
+                monthlyApy=vault.monthlyApy,
+                apyVolatility=float(apyVolatilities[vaultIndex]),
                 rewards=rewards,
             )
         )
-    yieldOptions.sort(key=lambda x: x.riskAdjustedApy, reverse=True)
     return yieldOptions
 
 
-async def list_spark_yield_options(chainId: int) -> list[YieldOption]:  # pylint: disable=unused-argument
+async def list_spark_yield_options(chainId: int) -> list[YieldOption]:
     # TODO(krishan711): where do i get this via api??
+    if chainId != BASE_CHAIN_ID:
+        return []
     return [YieldOption(
+        chainId=chainId,
+        assetSymbol=DEFAULT_ASSET_SYMBOL,
+        protocol='spark',
         name="Spark.fi",
         symbol="SPARK",
         address="0x0000000000000000000000000000000000000000",
@@ -159,9 +244,9 @@ async def list_spark_yield_options(chainId: int) -> list[YieldOption]:  # pylint
     )]
 
 
-async def list_all_yield_options(chainId: int) -> list[YieldOption]:
+async def list_all_yield_options(chainId: int, requester: Requester | None = None) -> list[YieldOption]:
     allPromises = [
-        list_morpho_yield_options(chainId=chainId),
+        list_morpho_yield_options(chainId=chainId, requester=requester),
         list_spark_yield_options(chainId=chainId),
     ]
     yieldOptionLists = await asyncio.gather(*allPromises, return_exceptions=True)
@@ -0,0 +1,115 @@
+import numpy as np
+from pydantic import BaseModel
+
+from agent_hack.uniswap import Token
+
+TVL_COLUMN = 0
+VOLUME_COLUMN = 1
+TX_COUNT_COLUMN = 2
+# With fewer local samples than this the spread of morpho's own daily/weekly/monthly APYs is used as the volatility
+MIN_HISTORY_SAMPLE_COUNT = 24
+
+
+class ScoringProfile(BaseModel):
+    name: str
+    minTvlUsd: float
+    goodTvlUsd: float
+    minVolumeUsd: float
+    goodVolumeUsd: float
+    minTxCount: float
+    goodTxCount: float
+    tvlWeight: float = 0.5
+    volumeWeight: float = 0.3
+    txCountWeight: float = 0.2
+    apyVolatilityWeight: float = 1.0
+
+
+DEFAULT_SCORING_PROFILE = ScoringProfile(
+    name='default',
+    minTvlUsd=100_000,
+    goodTvlUsd=1_000_000,
+    minVolumeUsd=50_000,
+    goodVolumeUsd=500_000,
+    minTxCount=100,
+    goodTxCount=1000,
+)
+
+CONSERVATIVE_SCORING_PROFILE = ScoringProfile(
+    name='conservative',
+    minTvlUsd=1_000_000,
+    goodTvlUsd=10_000_000,
+    minVolumeUsd=500_000,
+    goodVolumeUsd=5_000_000,
+    minTxCount=1000,
+    goodTxCount=10_000,
+    tvlWeight=0.6,
+    volumeWeight=0.3,
+    txCountWeight=0.1,
+    apyVolatilityWeight=2.0,
+)
+
+SCORING_PROFILES = {profile.name: profile for profile in [DEFAULT_SCORING_PROFILE, CONSERVATIVE_SCORING_PROFILE]}
+
+
+class VaultScores:
+
+    def __init__(self, vaultRiskAdjustedApys: np.ndarray, rewardRiskAdjustedApys: np.ndarray, rewardUniswapFactors: np.ndarray, rewardAerodromeFactors: np.ndarray) -> None:
+        self.vaultRiskAdjustedApys = vaultRiskAdjustedApys
+        self.rewardRiskAdjustedApys = rewardRiskAdjustedApys
+        self.rewardUniswapFactors = rewardUniswapFactors
+        self.rewardAerodromeFactors = rewardAerodromeFactors
+
+    def get_top_vault_indices(self, limit: int | None = None) -> np.ndarray:
+        orderedIndices = np.argsort(-self.vaultRiskAdjustedApys, kind='stable')
+        return orderedIndices if limit is None else orderedIndices[:limit]
+
+
+def build_token_metrics(tokens: list[Token | None]) -> np.ndarray:
+    tokenMetrics = np.full((len(tokens), 3), np.nan, dtype=np.float64)
+    for index, token in enumerate(tokens):
+        if token is not None:
+            tokenMetrics[index] = (token.totalValueLockedUSD, token.volumeUSD, token.txCount)
+    return tokenMetrics
+
+
+def _scale(values: np.ndarray, minValue: float, goodValue: float) -> np.ndarray:
+    return np.clip((values - minValue) / (goodValue - minValue), 0.0, 1.0)
+
+
+def calculate_quality_factors(tokenMetrics: np.ndarray, profile: ScoringProfile) -> np.ndarray:
+    tvlFactors = _scale(values=tokenMetrics[:, TVL_COLUMN], minValue=profile.minTvlUsd, goodValue=profile.goodTvlUsd)
+    volumeFactors = _scale(values=tokenMetrics[:, VOLUME_COLUMN], minValue=profile.minVolumeUsd, goodValue=profile.goodVolumeUsd)
+    txCountFactors = _scale(values=tokenMetrics[:, TX_COUNT_COLUMN], minValue=profile.minTxCount, goodValue=profile.goodTxCount)
+    weightedFactors = (tvlFactors * profile.tvlWeight) + (volumeFactors * profile.volumeWeight) + (txCountFactors * profile.txCountWeight)
+    return np.nan_to_num(weightedFactors, nan=0.0)
+
+
+def calculate_apy_volatilities(historyVolatilities: np.ndarray, historySampleCounts: np.ndarray, periodApys: np.ndarray) -> np.ndarray:
+    with np.errstate(invalid='ignore'):
+        periodVolatilities = np.nan_to_num(np.nanstd(periodApys, axis=1), nan=0.0) if periodApys.shape[0] > 0 else np.zeros(0, dtype=np.float64)
+    return np.where(historySampleCounts >= MIN_HISTORY_SAMPLE_COUNT, historyVolatilities, periodVolatilities)
+
+
+def score_vaults(
+    baseApys: np.ndarray,
+    rewardVaultIndices: np.ndarray,
+    rewardTokenIndices: np.ndarray,
+    rewardApys: np.ndarray,
+    uniswapTokenMetrics: np.ndarray,
+    aerodromeTokenMetrics: np.ndarray,
+    profile: ScoringProfile = DEFAULT_SCORING_PROFILE,
+    apyVolatilities: np.ndarray | None = None,
+) -> VaultScores:
+    uniswapFactors = calculate_quality_factors(tokenMetrics=uniswapTokenMetrics, profile=profile)
+    aerodromeFactors = calculate_quality_factors(tokenMetrics=aerodromeTokenMetrics, profile=profile)
+    qualityFactors = np.maximum(uniswapFactors, aerodromeFactors)
+    rewardRiskAdjustedApys = rewardApys * qualityFactors[rewardTokenIndices]
+    vaultRiskAdjustedApys = baseApys + np.bincount(rewardVaultIndices, weights=rewardRiskAdjustedApys, minlength=len(baseApys))
+    if apyVolatilities is not None:
+        vaultRiskAdjustedApys = vaultRiskAdjustedApys - (apyVolatilities * profile.apyVolatilityWeight)
+    return VaultScores(
+        vaultRiskAdjustedApys=vaultRiskAdjustedApys,
+        rewardRiskAdjustedApys=rewardRiskAdjustedApys,
+        rewardUniswapFactors=uniswapFactors[rewardTokenIndices],
+        rewardAerodromeFactors=aerodromeFactors[rewardTokenIndices],
+    )
@@ -0,0 +1,183 @@
+import asyncio
+import datetime
+
+from core import logging
+from pydantic import BaseModel
+
+from agent_hack import yield_options
+from agent_hack.apy_history_store import ApySample
+from agent_hack.apy_history_store import get_apy_history_store
+from agent_hack.yield_index import YieldIndex
+from agent_hack.yield_index import YieldIndexStats
+from agent_hack.yield_options import YieldOption
+
+
+class YieldSnapshot(BaseModel):
+    chainId: int
+    createdDate: datetime.datetime
+    morphoYieldOptions: list[YieldOption]
+    allYieldOptions: list[YieldOption]
+    indexedYieldOptions: list[YieldOption]
+
+
+class YieldSnapshotStatus(BaseModel):
+    chainId: int
+    createdDate: datetime.datetime | None
+    ageSeconds: float | None
+    yieldOptionCount: int
+    indexedYieldOptionCount: int
+    lastRefreshDurationSeconds: float | None
+    lastRefreshError: str | None
+
+
+class YieldSnapshotRefresher:
+
+    def __init__(self, chainIds: list[int], refreshIntervalSeconds: float = 300, assetSymbols: dict[int, list[str]] | None = None) -> None:
+        self.chainIds = chainIds
+        self.refreshIntervalSeconds = refreshIntervalSeconds
+        self.assetSymbols = assetSymbols or {}
+        self._snapshots: dict[int, YieldSnapshot] = {}
+        self._yieldIndex: YieldIndex | None = None
+        self._lastRefreshDurationSeconds: dict[int, float] = {}
+        self._lastRefreshErrors: dict[int, str] = {}
+        self._tasks: list[asyncio.Task[None]] = []
+
+    async def refresh(self, chainId: int) -> YieldSnapshot:
+        startTime = datetime.datetime.now(tz=datetime.timezone.utc)
+        assetSymbols = self.get_asset_symbols(chainId=chainId)
+        morphoYieldOptionLists = await asyncio.gather(*[
+            yield_options.list_morpho_yield_options(chainId=chainId, assetSymbol=assetSymbol) for assetSymbol in assetSymbols
+        ], return_exceptions=True)
+        sparkYieldOptions = await yield_options.list_spark_yield_options(chainId=chainId)
+        if isinstance(morphoYieldOptionLists[0], BaseException):
+            raise morphoYieldOptionLists[0]
+        indexedYieldOptions = list(sparkYieldOptions)
+        for assetSymbol, morphoYieldOptionList in zip(assetSymbols, morphoYieldOptionLists):
+            if isinstance(morphoYieldOptionList, BaseException):
+                logging.error(f'Failed to load {assetSymbol} yield options for chain {chainId}: {morphoYieldOptionList}')
+                continue
+            indexedYieldOptions += morphoYieldOptionList
+        snapshot = YieldSnapshot(
+            chainId=chainId,
+            createdDate=datetime.datetime.now(tz=datetime.timezone.utc),
+            morphoYieldOptions=morphoYieldOptionLists[0],
+            allYieldOptions=morphoYieldOptionLists[0] + sparkYieldOptions,
+            indexedYieldOptions=indexedYieldOptions,
+        )
+        self._snapshots[chainId] = snapshot
+        self._yieldIndex = YieldIndex(yieldOptions=[yieldOption for chainSnapshot in self._snapshots.values() for yieldOption in chainSnapshot.indexedYieldOptions], createdDate=snapshot.createdDate)
+        self._lastRefreshDurationSeconds[chainId] = (snapshot.createdDate - startTime).total_seconds()
+        self._lastRefreshErrors.pop(chainId, None)
+        await self._record_apy_history(snapshot=snapshot)
+        logging.info(f'Refreshed yield snapshot for chain {chainId} with {len(snapshot.allYieldOptions)} options in {self._lastRefreshDurationSeconds[chainId]:.2f}s')
+        return snapshot
+
+    @staticmethod
+    async def _record_apy_history(snapshot: YieldSnapshot) -> None:
+        apyHistoryStore = get_apy_history_store()
+        if apyHistoryStore is None:
+            return
+        samples = [
+            ApySample(vaultAddress=yieldOption.address, sampleDate=snapshot.createdDate, totalApy=yieldOption.totalApy, baseApy=yieldOption.baseApy, totalDepositsUsd=yieldOption.totalDepositsUsd)
+            for yieldOption in snapshot.indexedYieldOptions if yieldOption.protocol == 'morpho'
+        ]
+        try:
+            await apyHistoryStore.add_samples(chainId=snapshot.chainId, samples=samples)
+        except Exception as exception:  # pylint: disable=broad-exception-caught
+            logging.error(f'Failed to record apy history for chain {snapshot.chainId}: {exception}')
+
+    async def _run_refresh_loop(self, chainId: int) -> None:
+        while True:
+            try:
+                await self.refresh(chainId=chainId)
+            except Exception as exception:  # pylint: disable=broad-exception-caught
+                self._lastRefreshErrors[chainId] = str(exception)
+                logging.error(f'Failed to refresh yield snapshot for chain {chainId}: {exception}')
+            await asyncio.sleep(self.refreshIntervalSeconds)
+
+    async def start(self) -> None:
+        if len(self._tasks) > 0:
+            return
+        self._tasks = [asyncio.create_task(self._run_refresh_loop(chainId=chainId)) for chainId in self.chainIds]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def get_asset_symbols(self, chainId: int) -> list[str]:
+        return self.assetSymbols.get(chainId) or [yield_options.DEFAULT_ASSET_SYMBOL]
+
+    def get_snapshot(self, chainId: int) -> YieldSnapshot | None:
+        return self._snapshots.get(chainId)
+
+    def get_yield_index(self) -> YieldIndex | None:
+        return self._yieldIndex
+
+    def get_yield_index_stats(self) -> list[YieldIndexStats]:
+        return [self._yieldIndex.get_stats()] if self._yieldIndex else []
+
+    def get_statuses(self) -> list[YieldSnapshotStatus]:
+        now = datetime.datetime.now(tz=datetime.timezone.utc)
+        statuses: list[YieldSnapshotStatus] = []
+        for chainId in self.chainIds:
+            snapshot = self._snapshots.get(chainId)
+            statuses.append(YieldSnapshotStatus(
+                chainId=chainId,
+                createdDate=snapshot.createdDate if snapshot else None,
+                ageSeconds=(now - snapshot.createdDate).total_seconds() if snapshot else None,
+                yieldOptionCount=len(snapshot.allYieldOptions) if snapshot else 0,
+                indexedYieldOptionCount=len(snapshot.indexedYieldOptions) if snapshot else 0,
+                lastRefreshDurationSeconds=self._lastRefreshDurationSeconds.get(chainId),
+                lastRefreshError=self._lastRefreshErrors.get(chainId),
+            ))
+        return statuses
+
+
+_yieldSnapshotRefresher: YieldSnapshotRefresher | None = None
+
+
+def set_yield_snapshot_refresher(refresher: YieldSnapshotRefresher | None) -> None:
+    global _yieldSnapshotRefresher  # pylint: disable=global-statement
+    _yieldSnapshotRefresher = refresher
+
+
+def get_yield_snapshot_refresher() -> YieldSnapshotRefresher | None:
+    return _yieldSnapshotRefresher
+
+
+def parse_asset_symbols(value: str) -> dict[int, list[str]]:
+    assetSymbols: dict[int, list[str]] = {}
+    for pair in value.split(','):
+        if len(pair.strip()) == 0:
+            continue
+        chainId, _, assetSymbol = pair.strip().partition(':')
+        assetSymbols.setdefault(int(chainId), []).append(assetSymbol.strip())
+    return assetSymbols
+
+
+def get_yield_index_version() -> str | None:
+    yieldIndex = _yieldSnapshotRefresher.get_yield_index() if _yieldSnapshotRefresher else None
+    return yieldIndex.createdDate.isoformat() if yieldIndex else None
+
+
+async def get_yield_index() -> YieldIndex:
+    yieldIndex = _yieldSnapshotRefresher.get_yield_index() if _yieldSnapshotRefresher else None
+    if yieldIndex is not None:
+        return yieldIndex
+    return YieldIndex(yieldOptions=await yield_options.list_all_yield_options(chainId=yield_options.BASE_CHAIN_ID))
+
+
+async def get_all_yield_options(chainId: int) -> list[YieldOption]:
+    snapshot = _yieldSnapshotRefresher.get_snapshot(chainId=chainId) if _yieldSnapshotRefresher else None
+    if snapshot is not None:
+        return snapshot.allYieldOptions
+    return await yield_options.list_all_yield_options(chainId=chainId)
+
+
+async def get_morpho_yield_options(chainId: int) -> list[YieldOption]:
+    snapshot = _yieldSnapshotRefresher.get_snapshot(chainId=chainId) if _yieldSnapshotRefresher else None
+    if snapshot is not None:
+        return snapshot.morphoYieldOptions
+    return await yield_options.list_morpho_yield_options(chainId=chainId)
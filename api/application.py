@@ -1,17 +1,52 @@
-import base64
 import os
 from typing import Annotated
+from typing import AsyncIterator
 
 from core import logging
-from core.exceptions import UnauthorizedException
-from eth_account.messages import encode_defunct
+from core.exceptions import NotFoundException
 from fastapi import FastAPI
 from fastapi import Header
+from fastapi import Query
+from fastapi import Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from web3 import Web3
 
+from agent_hack import tracing
+from agent_hack.action_executor import ActionExecutor
 from agent_hack.agent_manager import AgentManager
+from agent_hack.agent_manager import AgentStreamEvent
+from agent_hack.apy_history_store import create_apy_history_store
+from agent_hack.apy_history_store import set_apy_history_store
+from agent_hack.auth_token_verifier import AuthTokenVerifier
+from agent_hack.cache_serializer import create_cache_serializer
+from agent_hack.chat_message_index import create_chat_message_index
+from agent_hack.checkpoint_store import CheckpointPruner
+from agent_hack.checkpoint_store import create_checkpoint_store
+from agent_hack.conversation_compactor import CompactionConfig
+from agent_hack.memory_cache import MemoryCache
+from agent_hack.pooled_requester import PooledRequester
+from agent_hack.pooled_requester import set_shared_requester
+from agent_hack.response_cache import ResponseCache
+from agent_hack.shared_state import create_shared_state
+from agent_hack.shared_state import set_shared_state
+from agent_hack.token_registry import get_token_registry
+from agent_hack.transaction_jobs import TransactionJob
+from agent_hack.transaction_jobs import TransactionJobManager
+from agent_hack.transaction_jobs import set_transaction_job_manager
+from agent_hack.util import get_memory_cache
+from agent_hack.util import remove_legacy_cache_files
+from agent_hack.util import set_cache_serializer
+from agent_hack.util import set_memory_cache
+from agent_hack.wallet_registry import WalletRegistry
+from agent_hack.wallet_registry import create_wallet_store
+from agent_hack.yield_options import BASE_CHAIN_ID
+from agent_hack.yield_snapshot_refresher import YieldSnapshotRefresher
+from agent_hack.yield_snapshot_refresher import YieldSnapshotStatus
+from agent_hack.yield_snapshot_refresher import get_yield_index_version
+from agent_hack.yield_snapshot_refresher import parse_asset_symbols
+from agent_hack.yield_snapshot_refresher import set_yield_snapshot_refresher
 
 GEMINI_API_KEY = os.environ["GEMINI_API_KEY"]
 CDP_API_KEY_NAME = os.environ["CDP_API_KEY_NAME"]
@@ -26,21 +61,147 @@ app.add_middleware(CORSMiddleware, allow_credentials=True, allow_methods=['*'],
     'https://app.yieldseeker.xyz',
 ], allow_origin_regex='https://.*\\.?(yieldseeker.xyz)')
 
-agentManager = AgentManager(
-    geminiApiKey=GEMINI_API_KEY,
+set_memory_cache(MemoryCache(
+    maxSize=int(os.environ.get("MEMORY_CACHE_SIZE", 512)),
+    maxStaleSeconds=float(os.environ.get("MEMORY_CACHE_MAX_STALE_SECONDS", 3600)),
+))
+if os.environ.get("CACHE_SERIALIZER"):
+    set_cache_serializer(create_cache_serializer(name=os.environ["CACHE_SERIALIZER"]))
+
+sharedState = create_shared_state(connectionString=os.environ.get("SHARED_STATE_URL", "file://./data"))
+set_shared_state(sharedState)
+
+requester = PooledRequester(
+    maxConcurrentRequestsPerHost=int(os.environ.get("REQUESTER_MAX_CONCURRENT_REQUESTS_PER_HOST", 8)),
+    maxRetries=int(os.environ.get("REQUESTER_MAX_RETRIES", 3)),
+)
+set_shared_requester(requester)
+
+checkpointStore = create_checkpoint_store(
+    connectionString=os.environ.get("CHECKPOINT_STORE_URL", "sqlite:///./data/checkpoints.sqlite"),
+    poolSize=int(os.environ["CHECKPOINT_STORE_POOL_SIZE"]) if os.environ.get("CHECKPOINT_STORE_POOL_SIZE") else None,
+)
+checkpointPruner = CheckpointPruner(
+    checkpointStore=checkpointStore,
+    keepCheckpointsPerThread=int(os.environ.get("CHECKPOINT_PRUNE_KEEP_PER_THREAD", 5)),
+    intervalSeconds=float(os.environ.get("CHECKPOINT_PRUNE_INTERVAL_SECONDS", 3600)),
+)
+chatMessageIndex = create_chat_message_index(
+    connectionString=os.environ.get("CHAT_MESSAGE_INDEX_URL", "sqlite:///./data/chatMessages.sqlite"),
+)
+walletStore = create_wallet_store(
+    connectionString=os.environ.get("WALLET_STORE_URL", "file://./data"),
+    encryptionKey=os.environ.get("WALLET_ENCRYPTION_KEY"),
+)
+walletRegistry = WalletRegistry(
     cdpApiKeyName=CDP_API_KEY_NAME,
     cdpApiKeyPrivateKey=CDP_API_KEY_PRIVATE_KEY,
+    walletStore=walletStore,
+    maxWorkers=int(os.environ.get("WALLET_REGISTRY_MAX_WORKERS", 4)),
+    sharedState=sharedState,
+)
+actionExecutor = ActionExecutor(
+    maxWorkers=int(os.environ.get("ACTION_EXECUTOR_MAX_WORKERS", 8)),
+    maxConcurrentActionsPerUser=int(os.environ.get("ACTION_EXECUTOR_MAX_CONCURRENT_ACTIONS_PER_USER", 2)),
+    timeoutSeconds=float(os.environ.get("ACTION_EXECUTOR_TIMEOUT_SECONDS", 180)),
+)
+transactionJobManager = TransactionJobManager(
+    actionExecutor=actionExecutor,
+    sharedState=sharedState,
+    timeoutSeconds=float(os.environ.get("TRANSACTION_JOB_TIMEOUT_SECONDS", 900)),
+)
+set_transaction_job_manager(transactionJobManager)
+responseCache = ResponseCache(
+    versionProvider=get_yield_index_version,
+    ttlSeconds=float(os.environ.get("RESPONSE_CACHE_TTL_SECONDS", 600)),
+    similarityThreshold=float(os.environ.get("RESPONSE_CACHE_SIMILARITY_THRESHOLD", 0.8)),
+) if os.environ.get("RESPONSE_CACHE_ENABLED", "false").lower() == "true" else None
+agentManager = AgentManager(
+    geminiApiKey=GEMINI_API_KEY,
     networkId=NETWORK_ID,
-    sqliteDbPath="./data/checkpoints.sqlite",
+    checkpointStore=checkpointStore,
+    walletRegistry=walletRegistry,
+    actionExecutor=actionExecutor,
+    chatMessageIndex=chatMessageIndex,
+    executorPoolSize=int(os.environ.get("AGENT_EXECUTOR_POOL_SIZE", 100)),
+    executorIdleSeconds=float(os.environ.get("AGENT_EXECUTOR_IDLE_SECONDS", 1800)),
+    compactionConfig=CompactionConfig(
+        maxContextTokens=int(os.environ.get("AGENT_MAX_CONTEXT_TOKENS", 12000)),
+        maxTurns=int(os.environ.get("AGENT_MAX_CONTEXT_TURNS", 20)),
+    ),
+    responseCache=responseCache,
+    sharedState=sharedState,
+    conversationLockTimeoutSeconds=float(os.environ.get("CONVERSATION_LOCK_TIMEOUT_SECONDS", 300)),
+)
+
+apyHistoryStore = create_apy_history_store(
+    connectionString=os.environ.get("APY_HISTORY_URL", "sqlite:///./data/apyHistory.sqlite"),
+    sampleIntervalSeconds=int(os.environ.get("APY_HISTORY_SAMPLE_INTERVAL_SECONDS", 3600)),
+    windowSeconds=int(os.environ.get("APY_HISTORY_WINDOW_SECONDS", 30 * 24 * 60 * 60)),
+)
+set_apy_history_store(apyHistoryStore)
+yieldSnapshotAssetSymbols = parse_asset_symbols(value=os.environ.get("YIELD_SNAPSHOT_ASSET_SYMBOLS", f"{BASE_CHAIN_ID}:USDC"))
+yieldSnapshotRefresher = YieldSnapshotRefresher(
+    chainIds=list(dict.fromkeys([int(chainId) for chainId in os.environ.get("YIELD_SNAPSHOT_CHAIN_IDS", str(BASE_CHAIN_ID)).split(",")] + list(yieldSnapshotAssetSymbols.keys()))),
+    assetSymbols=yieldSnapshotAssetSymbols,
+    refreshIntervalSeconds=float(os.environ.get("YIELD_SNAPSHOT_REFRESH_SECONDS", 300)),
+)
+set_yield_snapshot_refresher(yieldSnapshotRefresher)
+
+authTokenVerifier = AuthTokenVerifier(
+    maxSize=int(os.environ.get("AUTH_TOKEN_CACHE_SIZE", 10000)),
+    ttlSeconds=float(os.environ.get("AUTH_TOKEN_CACHE_TTL_SECONDS", 3600)),
+    maxTokenAgeSeconds=float(os.environ["AUTH_TOKEN_MAX_AGE_SECONDS"]) if os.environ.get("AUTH_TOKEN_MAX_AGE_SECONDS") else None,
 )
 
+metricsRegistry = tracing.get_metrics_registry()
+metricsRegistry.register_stats_collector(name='requester', collector=requester.get_stats)
+metricsRegistry.register_stats_collector(name='memoryCache', collector=get_memory_cache().get_stats)
+metricsRegistry.register_stats_collector(name='agentExecutorPool', collector=agentManager.executorPool.get_stats)
+metricsRegistry.register_stats_collector(name='conversationCompactor', collector=agentManager.conversationCompactor.get_stats)
+metricsRegistry.register_stats_collector(name='actionExecutor', collector=actionExecutor.get_stats)
+metricsRegistry.register_stats_collector(name='authTokenVerifier', collector=authTokenVerifier.get_stats)
+metricsRegistry.register_stats_collector(name='yieldIndex', collector=yieldSnapshotRefresher.get_yield_index_stats)
+metricsRegistry.register_stats_collector(name='tokenRegistry', collector=get_token_registry().get_stats)
+if responseCache is not None:
+    metricsRegistry.register_stats_collector(name='responseCache', collector=responseCache.get_stats)
+
+@app.on_event('startup')
+async def startup():
+    await sharedState.connect()
+    await remove_legacy_cache_files()
+    await checkpointStore.connect()
+    await chatMessageIndex.connect()
+    await walletStore.connect()
+    await apyHistoryStore.connect()
+    await yieldSnapshotRefresher.start()
+    await checkpointPruner.start()
+
+@app.on_event('shutdown')
+async def shutdown():
+    await yieldSnapshotRefresher.stop()
+    await checkpointPruner.stop()
+    await agentManager.close()
+    await actionExecutor.close()
+    await transactionJobManager.close()
+    await walletRegistry.close()
+    await walletStore.disconnect()
+    await apyHistoryStore.disconnect()
+    await chatMessageIndex.disconnect()
+    await checkpointStore.disconnect()
+    await sharedState.disconnect()
+    await requester.close_connections()
+
 class Message(BaseModel):
+    messageId: int | None = None
     content: str
     isUser: bool
 
 class ChatHistory(BaseModel):
     messages: list[Message]
     userId: str
+    hasMore: bool = False
+    latestMessageId: int | None = None
 
 class ChatRequest(BaseModel):
     content: str
@@ -48,41 +209,75 @@ class ChatRequest(BaseModel):
 class ChatResponse(BaseModel):
     message: Message
 
-class AuthToken(BaseModel):
-    message: str
-    signature: str
-
-w3 = Web3()
-
-def verify_auth_token(authorizationHeader: str | None, userId: str) -> None:
-    if authorizationHeader is None:
-        raise UnauthorizedException()
-    try:
-        authTokenJson = base64.b64decode(authorizationHeader).decode('utf-8')
-        authToken = AuthToken.model_validate_json(authTokenJson)
-        messageHash = encode_defunct(text=authToken.message)
-        signerId = w3.eth.account.recover_message(messageHash, signature=authToken.signature)
-    except Exception as exception:
-        print(f"Signature verification failed: {exception}")
-        raise UnauthorizedException()
-    if signerId.lower() != userId.lower():
-        raise UnauthorizedException()
-
-
 @app.post("/chats/{userId}/messages", response_model=ChatResponse)
 async def create_chat_message(userId: str, request: ChatRequest, authorization: Annotated[str | None, Header()] = None):
-    verify_auth_token(authorizationHeader=authorization, userId=userId)
+    await authTokenVerifier.verify(authorizationHeader=authorization, userId=userId)
     userMessage = Message(content=request.content, isUser=True)
-    agentResponse = await agentManager.get_agent_response(userId=userId, message=userMessage.content)
+    with tracing.trace(name='chat_turn'):
+        agentResponse = await agentManager.get_agent_response(userId=userId, message=userMessage.content)
     agentMessage = Message(content=agentResponse, isUser=False)
     return ChatResponse(message=agentMessage)
 
 
+@app.post("/chats/{userId}/messages/stream")
+async def stream_chat_message(userId: str, request: ChatRequest, authorization: Annotated[str | None, Header()] = None):
+    await authTokenVerifier.verify(authorizationHeader=authorization, userId=userId)
+    userMessage = Message(content=request.content, isUser=True)
+
+    async def generate_events() -> AsyncIterator[str]:
+        try:
+            with tracing.trace(name='chat_turn_stream'):
+                async for event in agentManager.stream_agent_response(userId=userId, message=userMessage.content):
+                    yield f'event: {event.eventType}\ndata: {event.model_dump_json()}\n\n'
+        except Exception as exception:  # pylint: disable=broad-exception-caught
+            logging.exception(exception)
+            yield f'event: error\ndata: {AgentStreamEvent(eventType="error").model_dump_json()}\n\n'
+
+    return StreamingResponse(content=generate_events(), media_type='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
 @app.get("/chats/{userId}/history", response_model=ChatHistory)
-async def get_chat_history(userId: str, authorization: Annotated[str | None, Header()] = None):
-    verify_auth_token(authorizationHeader=authorization, userId=userId)
-    messages = await agentManager.get_chat_history(userId=userId)
+async def get_chat_history(
+    userId: str,
+    response: Response,
+    limit: Annotated[int, Query(ge=1, le=500)] = 100,
+    before: int | None = None,
+    since: int | None = None,
+    authorization: Annotated[str | None, Header()] = None,
+    ifNoneMatch: Annotated[str | None, Header(alias='If-None-Match')] = None,
+):
+    await authTokenVerifier.verify(authorizationHeader=authorization, userId=userId)
+    # The etag changes when a message is added, and differs per page, so pollers can skip reading a page they already have
+    etag = f'"{await agentManager.get_latest_message_id(userId=userId) or 0}-{limit}-{before or ""}-{since or ""}"'
+    if ifNoneMatch == etag:
+        return Response(status_code=304, headers={'ETag': etag})
+    chatHistoryPage = await agentManager.get_chat_history(userId=userId, limit=limit, beforeMessageId=before, sinceMessageId=since)
+    response.headers['ETag'] = etag
     return ChatHistory(
         userId=userId,
-        messages=[Message.model_validate(message) for message in messages],
+        messages=[Message.model_validate(message.model_dump()) for message in chatHistoryPage.messages],
+        hasMore=chatHistoryPage.hasMore,
+        latestMessageId=chatHistoryPage.latestMessageId,
     )
+
+
+@app.get("/chats/{userId}/transactions/{jobId}", response_model=TransactionJob)
+async def get_transaction_job(userId: str, jobId: str, authorization: Annotated[str | None, Header()] = None):
+    await authTokenVerifier.verify(authorizationHeader=authorization, userId=userId)
+    job = await transactionJobManager.get_job(jobId=jobId)
+    if job is None:
+        raise NotFoundException()
+    agentkit = await walletRegistry.get_agentkit(networkId=NETWORK_ID, userId=userId)
+    if job.walletId != agentkit.wallet.id:
+        raise NotFoundException()
+    return job
+
+
+@app.get("/yield-snapshots", response_model=list[YieldSnapshotStatus])
+async def list_yield_snapshot_statuses():
+    return yieldSnapshotRefresher.get_statuses()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse(content=metricsRegistry.render(), media_type='text/plain; version=0.0.4')
@@ -0,0 +1,462 @@
+import argparse
+import asyncio
+import base64
+import datetime
+import glob
+import hashlib
+import json
+import os
+import random
+import re
+import statistics
+import tempfile
+import time
+import urllib.parse
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+
+import httpx
+import uvicorn
+from core.exceptions import KibaException
+from core.util import file_util
+from eth_account.messages import encode_defunct
+from fastapi import FastAPI
+from fastapi import Request
+from fastapi.responses import JSONResponse
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.messages import BaseMessage
+from langchain_core.messages import HumanMessage
+from langchain_core.messages import ToolMessage
+from langchain_core.outputs import ChatGeneration
+from langchain_core.outputs import ChatResult
+from pydantic import BaseModel
+from web3 import Web3
+
+from agent_hack import list_all_yield_options
+from agent_hack import tracing
+from agent_hack import yield_options
+from agent_hack.action_executor import ActionExecutor
+from agent_hack.agent_manager import AgentManager
+from agent_hack.chat_message_index import create_chat_message_index
+from agent_hack.checkpoint_store import create_checkpoint_store
+from agent_hack.kiba_cdp_agentkit_wrapper import KibaCdpAgentkitWrapper
+from agent_hack.pooled_requester import PooledRequester
+from agent_hack.pooled_requester import set_shared_requester
+from agent_hack.token_registry import get_token_registry
+from agent_hack.util import get_memory_cache
+from agent_hack.yield_snapshot_refresher import set_yield_snapshot_refresher
+
+DEFAULT_FIXTURES_DIRECTORY = './benchmark_fixtures'
+DEFAULT_OUTPUT_FILE_PATH = './benchmark-results.json'
+SYNTHETIC_VAULT_COUNT = 1500
+SYNTHETIC_REWARD_TOKEN_COUNT = 60
+SYNTHETIC_PAGE_LIMIT = 1000
+YIELD_PIPELINE_STAGE_NAMES = ('deposit_asset', 'morpho_vaults', 'morpho_reward_asset', 'apy_history', 'reward_liquidity', 'yield_scoring')
+
+w3 = Web3()
+
+
+def get_fixture_key(url: str, dataDict: dict[str, Any]) -> str:
+    parsedUrl = urllib.parse.urlparse(url)
+    path = re.sub(r'/api/[^/]+/', '/api/_/', parsedUrl.path)
+    return hashlib.sha256(json.dumps({'host': parsedUrl.netloc, 'path': path, 'body': dataDict}, sort_keys=True).encode()).hexdigest()
+
+
+class BenchmarkResult(BaseModel):
+    name: str
+    iterations: int
+    meanSeconds: float
+    p50Seconds: float
+    p95Seconds: float
+    maxSeconds: float
+    details: dict[str, float] = {}
+
+
+def build_result(name: str, durations: list[float], details: dict[str, float] | None = None) -> BenchmarkResult:
+    sortedDurations = sorted(durations)
+    result = BenchmarkResult(
+        name=name,
+        iterations=len(sortedDurations),
+        meanSeconds=statistics.fmean(sortedDurations),
+        p50Seconds=sortedDurations[len(sortedDurations) // 2],
+        p95Seconds=sortedDurations[min(len(sortedDurations) - 1, int(len(sortedDurations) * 0.95))],
+        maxSeconds=sortedDurations[-1],
+        details=details or {},
+    )
+    print(f'{name}: mean={result.meanSeconds * 1000:.2f}ms p50={result.p50Seconds * 1000:.2f}ms p95={result.p95Seconds * 1000:.2f}ms max={result.maxSeconds * 1000:.2f}ms {result.details or ""}')
+    return result
+
+
+async def measure(name: str, iterations: int, func: Callable[[], Awaitable[Any]], setup: Callable[[], Awaitable[None]] | None = None) -> BenchmarkResult:
+    durations = []
+    for _ in range(iterations):
+        if setup is not None:
+            await setup()
+        startTime = time.perf_counter()
+        await func()
+        durations.append(time.perf_counter() - startTime)
+    return build_result(name=name, durations=durations)
+
+
+class RecordingRequester(PooledRequester):
+
+    def __init__(self, fixturesDirectory: str, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.fixturesDirectory = fixturesDirectory
+
+    async def make_request(self, method: str, url: str, **kwargs: Any) -> httpx.Response:  # type: ignore[override]  # pylint: disable=arguments-differ
+        response = await super().make_request(method=method, url=url, **kwargs)
+        dataDict = kwargs.get('dataDict') or {}
+        fixture = {'url': re.sub(r'/api/[^/]+/', '/api/_/', url), 'request': dataDict, 'response': response.json()}
+        await file_util.write_file(filePath=os.path.join(self.fixturesDirectory, f'{get_fixture_key(url=url, dataDict=dataDict)}.json'), content=json.dumps(fixture))
+        return response
+
+
+class StubServerRequester(PooledRequester):
+
+    def __init__(self, stubServerUrl: str, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.stubServerUrl = stubServerUrl
+
+    async def make_request(self, method: str, url: str, **kwargs: Any) -> httpx.Response:  # type: ignore[override]  # pylint: disable=arguments-differ
+        parsedUrl = urllib.parse.urlparse(url)
+        return await super().make_request(method=method, url=f'{self.stubServerUrl}/{parsedUrl.netloc}{parsedUrl.path}', **kwargs)
+
+
+def _build_synthetic_asset(address: str, symbol: str) -> dict[str, Any]:
+    return {'id': address, 'address': address, 'decimals': 18, 'name': symbol, 'symbol': symbol, 'tags': None, 'logoURI': None, 'totalSupply': 10 ** 24, 'priceUsd': 1.0, 'oraclePriceUsd': None, 'spotPriceEth': None}
+
+
+def build_synthetic_response(dataDict: dict[str, Any]) -> dict[str, Any]:
+    variables = dataDict.get('variables', {})
+    if 'tokenAddresses' in variables:
+        tokens = []
+        for tokenAddress in variables['tokenAddresses']:
+            tokenRandom = random.Random(f'{dataDict["query"]}-{tokenAddress}')  # nosec B311
+            if tokenRandom.random() < 0.2:
+                continue
+            tokens.append({
+                'id': tokenAddress, 'name': 'Reward', 'symbol': 'RWD', 'decimals': 18, 'totalSupply': 10 ** 24, 'volume': 1000, 'volumeUSD': tokenRandom.uniform(1e4, 5e6),
+                'untrackedVolumeUSD': 0, 'feesUSD': 0, 'txCount': tokenRandom.randint(10, 20000), 'poolCount': tokenRandom.randint(1, 50), 'totalValueLocked': 1000,
+                'totalValueLockedUSD': tokenRandom.uniform(1e4, 5e6), 'totalValueLockedUSDUntracked': 0, 'derivedETH': 0.0001,
+            })
+        return {'data': {'tokens': tokens}}
+    if 'assetSymbol' in variables:
+        return {'data': {'assets': {'items': [_build_synthetic_asset(address='0x833589fcd6edb6e08f4c7c32d4f71b54bda02913', symbol=variables['assetSymbol'])]}}}
+    if 'assetAddress' in variables and 'vaults' not in dataDict['query']:
+        return {'data': {'assets': {'items': [_build_synthetic_asset(address=variables['assetAddress'], symbol='ASSET')]}}}
+    skip = variables.get('skip', 0)
+    vaults = []
+    for vaultIndex in range(skip, min(skip + SYNTHETIC_PAGE_LIMIT, SYNTHETIC_VAULT_COUNT)):
+        vaultRandom = random.Random(vaultIndex)  # nosec B311
+        rewardCount = vaultRandom.randint(0, 2)
+        rewards = [{'supplyApr': vaultRandom.uniform(0, 0.1), 'asset': _build_synthetic_asset(address=f'0x{vaultRandom.randrange(SYNTHETIC_REWARD_TOKEN_COUNT):040x}', symbol='RWD')} for _ in range(rewardCount)]
+        baseApy = vaultRandom.uniform(0, 0.12)
+        vaults.append({
+            'name': f'Synthetic Vault {vaultIndex}', 'symbol': f'sv{vaultIndex}', 'address': f'0x{vaultIndex + 10 ** 6:040x}', 'creationTimestamp': 1700000000 + vaultIndex, 'warnings': [],
+            'state': {'totalAssets': vaultRandom.uniform(1e3, 1e8), 'totalAssetsUsd': vaultRandom.uniform(1e3, 1e8), 'netApyWithoutRewards': baseApy, 'netApy': baseApy + sum(reward['supplyApr'] for reward in rewards), 'rewards': rewards},
+        })
+    return {'data': {'vaults': {'items': vaults, 'pageInfo': {'count': len(vaults), 'limit': SYNTHETIC_PAGE_LIMIT, 'countTotal': SYNTHETIC_VAULT_COUNT, 'skip': skip}}}}
+
+
+class StubServer:
+
+    def __init__(self, fixturesDirectory: str, allowSynthetic: bool) -> None:
+        self.allowSynthetic = allowSynthetic
+        self.fixtures: dict[str, dict[str, Any]] = {}
+        for fixtureFilePath in glob.glob(os.path.join(fixturesDirectory, '*.json')):
+            with open(fixtureFilePath, 'r', encoding='utf-8') as fixtureFile:
+                self.fixtures[os.path.basename(fixtureFilePath).removesuffix('.json')] = json.load(fixtureFile)
+        self.replayedCount = 0
+        self.syntheticCount = 0
+        self.missingCount = 0
+        self.app = FastAPI()
+        self.app.add_api_route('/{fullPath:path}', self.handle_request, methods=['POST'])
+        self._server: uvicorn.Server | None = None
+        self._serverTask: asyncio.Task[None] | None = None
+        self.url = ''
+
+    async def handle_request(self, fullPath: str, request: Request) -> JSONResponse:
+        dataDict = await request.json()
+        host, _, path = fullPath.partition('/')
+        fixture = self.fixtures.get(get_fixture_key(url=f'https://{host}/{path}', dataDict=dataDict))
+        if fixture is not None:
+            self.replayedCount += 1
+            return JSONResponse(content=fixture['response'])
+        if not self.allowSynthetic:
+            self.missingCount += 1
+            return JSONResponse(status_code=404, content={'errors': [{'message': f'No fixture recorded for {host}/{path}'}]})
+        self.syntheticCount += 1
+        return JSONResponse(content=build_synthetic_response(dataDict=dataDict))
+
+    async def start(self) -> None:
+        self._server = uvicorn.Server(config=uvicorn.Config(app=self.app, host='127.0.0.1', port=0, log_level='warning', access_log=False))
+        self._serverTask = asyncio.create_task(self._server.serve())
+        while not self._server.started:
+            await asyncio.sleep(0.01)
+        port = self._server.servers[0].sockets[0].getsockname()[1]
+        self.url = f'http://127.0.0.1:{port}'
+
+    async def stop(self) -> None:
+        if self._server is not None and self._serverTask is not None:
+            self._server.should_exit = True
+            await self._serverTask
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Calls list_all_yield_options for every user message then answers, without any network calls."""
+
+    latencySeconds: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return 'scripted'
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> 'ScriptedChatModel':  # type: ignore[override]
+        return self
+
+    @staticmethod
+    def _get_next_message(messages: list[BaseMessage]) -> AIMessage:
+        lastMessage = messages[-1]
+        if isinstance(lastMessage, HumanMessage):
+            return AIMessage(content='', tool_calls=[{'name': 'list_all_yield_options', 'args': {'limit': 10}, 'id': f'call-{len(messages)}'}])
+        if isinstance(lastMessage, ToolMessage):
+            return AIMessage(content=f'Here are the best yield options right now:\n{lastMessage.content}')
+        return AIMessage(content='How else can I help?')
+
+    def _generate(self, messages: list[BaseMessage], stop: list[str] | None = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.latencySeconds)
+        return ChatResult(generations=[ChatGeneration(message=self._get_next_message(messages=messages))])
+
+    async def _agenerate(self, messages: list[BaseMessage], stop: list[str] | None = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.latencySeconds)
+        return ChatResult(generations=[ChatGeneration(message=self._get_next_message(messages=messages))])
+
+
+class BenchmarkWallet:
+
+    def __init__(self, userId: str) -> None:
+        self.id = f'benchmark-{userId}'
+        self.network_id = 'base-mainnet'  # pylint: disable=invalid-name
+
+
+class BenchmarkWalletRegistry:
+
+    async def get_agentkit(self, networkId: str, userId: str) -> KibaCdpAgentkitWrapper:
+        return KibaCdpAgentkitWrapper.model_construct(wallet=BenchmarkWallet(userId=userId), network_id=networkId)
+
+    async def close(self) -> None:
+        pass
+
+
+async def _clear_yield_caches() -> None:
+    get_memory_cache().clear()
+    get_token_registry().clear()
+    for cacheFilePath in glob.glob('./data/*.cache'):
+        os.remove(cacheFilePath)
+
+
+async def benchmark_list_all_yield_options(iterations: int) -> list[BenchmarkResult]:
+    wallet = BenchmarkWallet(userId='yield')
+
+    async def run_tool() -> str:
+        return await list_all_yield_options.list_all_yield_options(wallet=wallet, limit=10)
+
+    results = [await measure(name='list_all_yield_options_cold', iterations=max(1, iterations // 4), func=run_tool, setup=_clear_yield_caches)]
+    results.append(await measure(name='list_all_yield_options_warm', iterations=iterations, func=run_tool))
+    results.append(await measure(name='list_morpho_yield_options_compute', iterations=iterations, func=lambda: yield_options.list_morpho_yield_options(chainId=yield_options.BASE_CHAIN_ID)))
+    return results
+
+
+async def benchmark_yield_pipeline_stages(iterations: int) -> list[BenchmarkResult]:
+    totalDurations: list[float] = []
+    serialDurations: list[float] = []
+    stageDurations: dict[str, list[float]] = {stageName: [] for stageName in YIELD_PIPELINE_STAGE_NAMES}
+    stageStartOffsets: dict[str, list[float]] = {stageName: [] for stageName in YIELD_PIPELINE_STAGE_NAMES}
+    for _ in range(iterations):
+        await _clear_yield_caches()
+        startTime = time.perf_counter()
+        with tracing.trace(name='benchmark_yield_pipeline') as pipelineTrace:
+            await yield_options.list_morpho_yield_options(chainId=yield_options.BASE_CHAIN_ID)
+        totalDurations.append(time.perf_counter() - startTime)
+        stageTimings = [stageTiming for stageTiming in pipelineTrace.get_stage_timings() if stageTiming.name in stageDurations]
+        serialDurations.append(sum(stageTiming.endOffsetSeconds - stageTiming.startOffsetSeconds for stageTiming in stageTimings))
+        for stageTiming in stageTimings:
+            stageDurations[stageTiming.name].append(stageTiming.endOffsetSeconds - stageTiming.startOffsetSeconds)
+            stageStartOffsets[stageTiming.name].append(stageTiming.startOffsetSeconds)
+    results = [
+        build_result(name=f'yield_pipeline_stage_{stageName}', durations=stageDurations[stageName], details={'startOffsetSeconds': statistics.fmean(stageStartOffsets[stageName])})
+        for stageName in YIELD_PIPELINE_STAGE_NAMES if len(stageDurations[stageName]) > 0
+    ]
+    results.append(build_result(name='yield_pipeline_critical_path', durations=totalDurations, details={'serialSeconds': statistics.fmean(serialDurations)}))
+    return results
+
+
+async def _build_agent_manager(latencySeconds: float) -> AgentManager:
+    checkpointStore = create_checkpoint_store(connectionString='sqlite:///./data/benchmark-checkpoints.sqlite')
+    await checkpointStore.connect()
+    chatMessageIndex = create_chat_message_index(connectionString='sqlite:///./data/benchmark-chatMessages.sqlite')
+    await chatMessageIndex.connect()
+    agentManager = AgentManager(
+        geminiApiKey='benchmark',
+        networkId='base-mainnet',
+        checkpointStore=checkpointStore,
+        walletRegistry=BenchmarkWalletRegistry(),  # type: ignore[arg-type]
+        actionExecutor=ActionExecutor(),
+        chatMessageIndex=chatMessageIndex,
+    )
+    agentManager.llm = ScriptedChatModel(latencySeconds=latencySeconds)
+    return agentManager
+
+
+async def benchmark_agent_manager(iterations: int, historyTurns: int, latencySeconds: float) -> list[BenchmarkResult]:
+    agentManager = await _build_agent_manager(latencySeconds=latencySeconds)
+    results = []
+
+    async def get_agent_executor() -> None:
+        async with agentManager.get_agent_executor(userId='executor-user'):
+            pass
+
+    async def clear_executor_pool() -> None:
+        agentManager.executorPool.clear()
+
+    results.append(await measure(name='get_agent_executor_cold', iterations=iterations, func=get_agent_executor, setup=clear_executor_pool))
+    results.append(await measure(name='get_agent_executor_warm', iterations=iterations, func=get_agent_executor))
+    results.append(await measure(name='agent_turn', iterations=iterations, func=lambda: agentManager.get_agent_response(userId='turn-user', message='What is the best yield?')))
+    historyUserId = 'history-user'
+    for turnIndex in range(historyTurns):
+        await agentManager.get_agent_response(userId=historyUserId, message=f'Question {turnIndex}')
+    historyDetails = {'historyTurns': historyTurns}
+    result = await measure(name='get_chat_history_latest_page', iterations=iterations, func=lambda: agentManager.get_chat_history(userId=historyUserId, limit=50))
+    result.details = historyDetails
+    results.append(result)
+    latestPage = await agentManager.get_chat_history(userId=historyUserId, limit=50)
+    results.append(await measure(name='get_chat_history_since_latest', iterations=iterations, func=lambda: agentManager.get_chat_history(userId=historyUserId, sinceMessageId=latestPage.latestMessageId)))
+
+    async def read_full_checkpoint() -> None:
+        async with agentManager.checkpointStore.reader() as checkpointer:
+            await checkpointer.aget(config={'configurable': {'thread_id': f'{historyUserId}-None'}})
+
+    result = await measure(name='checkpoint_full_read', iterations=iterations, func=read_full_checkpoint)
+    result.details = historyDetails
+    results.append(result)
+    await agentManager.close()
+    await agentManager.actionExecutor.close()
+    await agentManager.chatMessageIndex.disconnect()
+    await agentManager.checkpointStore.disconnect()
+    return results
+
+
+def _build_auth_header(account: Any) -> str:
+    message = f'Sign in to Yield Seeker\nIssued At: {datetime.datetime.now(tz=datetime.timezone.utc).isoformat()}'
+    signature = account.sign_message(encode_defunct(text=message)).signature.hex()
+    return base64.b64encode(json.dumps({'message': message, 'signature': signature}).encode()).decode()
+
+
+async def benchmark_http_endpoints(userCount: int, messagesPerUser: int, latencySeconds: float, stubServerUrl: str) -> list[BenchmarkResult]:
+    os.environ.setdefault('GEMINI_API_KEY', 'benchmark')
+    os.environ.setdefault('CDP_API_KEY_NAME', 'benchmark')
+    os.environ.setdefault('CDP_API_KEY_PRIVATE_KEY', 'benchmark')
+    os.environ.setdefault('NETWORK_ID', 'base-mainnet')
+    import application  # pylint: disable=import-outside-toplevel
+    set_shared_requester(StubServerRequester(stubServerUrl=stubServerUrl))
+    application.agentManager.llm = ScriptedChatModel(latencySeconds=latencySeconds)
+    application.agentManager.walletRegistry = BenchmarkWalletRegistry()  # type: ignore[assignment]
+    await application.startup()
+    durations: dict[str, list[float]] = {'post_message': [], 'get_history': [], 'get_history_not_modified': []}
+
+    async def run_user(client: httpx.AsyncClient) -> None:
+        account = w3.eth.account.create()
+        headers = {'Authorization': _build_auth_header(account=account)}
+        for messageIndex in range(messagesPerUser):
+            startTime = time.perf_counter()
+            response = await client.post(f'/chats/{account.address}/messages', json={'content': f'Question {messageIndex}'}, headers=headers)
+            response.raise_for_status()
+            durations['post_message'].append(time.perf_counter() - startTime)
+            startTime = time.perf_counter()
+            response = await client.get(f'/chats/{account.address}/history', headers=headers)
+            response.raise_for_status()
+            durations['get_history'].append(time.perf_counter() - startTime)
+            startTime = time.perf_counter()
+            response = await client.get(f'/chats/{account.address}/history', headers={**headers, 'If-None-Match': response.headers['ETag']})
+            if response.status_code != 304:
+                raise KibaException(f'Expected 304 from history polling but got {response.status_code}')
+            durations['get_history_not_modified'].append(time.perf_counter() - startTime)
+
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=application.app), base_url='http://benchmark', timeout=300) as client:
+            startTime = time.perf_counter()
+            await asyncio.gather(*[run_user(client=client) for _ in range(userCount)])
+            totalSeconds = time.perf_counter() - startTime
+    finally:
+        await application.shutdown()
+    requestCount = sum(len(endpointDurations) for endpointDurations in durations.values())
+    throughputDetails = {'userCount': userCount, 'requestCount': requestCount, 'totalSeconds': totalSeconds, 'requestsPerSecond': requestCount / totalSeconds}
+    return [build_result(name=f'http_{name}', durations=endpointDurations, details=throughputDetails) for name, endpointDurations in durations.items()]
+
+
+async def run(args: argparse.Namespace) -> None:
+    fixturesDirectory = os.path.abspath(args.fixtures_dir)
+    outputFilePath = os.path.abspath(args.output)
+    workingDirectory = tempfile.mkdtemp(prefix='agent-hack-benchmark-')
+    os.chdir(workingDirectory)
+    os.makedirs('./data', exist_ok=True)
+    os.environ.setdefault('GRAPH_API_KEY', 'benchmark')
+    stubServer = StubServer(fixturesDirectory=fixturesDirectory, allowSynthetic=not args.no_synthetic)
+    await stubServer.start()
+    requester = StubServerRequester(stubServerUrl=stubServer.url)
+    set_shared_requester(requester)
+    set_yield_snapshot_refresher(None)
+    results: list[BenchmarkResult] = []
+    try:
+        results += await benchmark_list_all_yield_options(iterations=args.iterations)
+        results += await benchmark_yield_pipeline_stages(iterations=max(1, args.iterations // 4))
+        results += await benchmark_agent_manager(iterations=args.iterations, historyTurns=args.history_turns, latencySeconds=args.llm_latency)
+        results += await benchmark_http_endpoints(userCount=args.users, messagesPerUser=args.messages_per_user, latencySeconds=args.llm_latency, stubServerUrl=stubServer.url)
+    finally:
+        await requester.close_connections()
+        await stubServer.stop()
+    output = {
+        'createdDate': datetime.datetime.now(tz=datetime.timezone.utc).isoformat(),
+        'settings': {'iterations': args.iterations, 'users': args.users, 'messagesPerUser': args.messages_per_user, 'historyTurns': args.history_turns, 'llmLatencySeconds': args.llm_latency},
+        'fixtures': {'recordedCount': len(stubServer.fixtures), 'replayedCount': stubServer.replayedCount, 'syntheticCount': stubServer.syntheticCount, 'missingCount': stubServer.missingCount},
+        'results': [result.model_dump() for result in results],
+    }
+    await file_util.write_file(filePath=outputFilePath, content=json.dumps(output, indent=2))
+    print(f'Wrote {len(results)} results to {outputFilePath}')
+
+
+async def record(args: argparse.Namespace) -> None:
+    fixturesDirectory = os.path.abspath(args.fixtures_dir)
+    await file_util.create_directory(directory=fixturesDirectory)
+    os.chdir(tempfile.mkdtemp(prefix='agent-hack-benchmark-record-'))
+    requester = RecordingRequester(fixturesDirectory=fixturesDirectory)
+    try:
+        yieldOptions = await yield_options.list_all_yield_options(chainId=yield_options.BASE_CHAIN_ID, requester=requester)
+    finally:
+        await requester.close_connections()
+    print(f'Recorded fixtures for {len(yieldOptions)} yield options into {fixturesDirectory}')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Offline benchmarks for the yield seeker api')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    runParser = subparsers.add_parser('run', help='Run the benchmarks against recorded (or synthetic) fixtures')
+    runParser.add_argument('--fixtures-dir', default=DEFAULT_FIXTURES_DIRECTORY)
+    runParser.add_argument('--output', default=DEFAULT_OUTPUT_FILE_PATH)
+    runParser.add_argument('--iterations', type=int, default=20)
+    runParser.add_argument('--users', type=int, default=10)
+    runParser.add_argument('--messages-per-user', type=int, default=3)
+    runParser.add_argument('--history-turns', type=int, default=200)
+    runParser.add_argument('--llm-latency', type=float, default=0.0, help='Seconds the fake chat model waits before each response')
+    runParser.add_argument('--no-synthetic', action='store_true', help='Fail requests that have no recorded fixture instead of synthesizing a response')
+    recordParser = subparsers.add_parser('record', help='Record live Morpho, Uniswap and Aerodrome responses as fixtures (needs GRAPH_API_KEY)')
+    recordParser.add_argument('--fixtures-dir', default=DEFAULT_FIXTURES_DIRECTORY)
+    args = parser.parse_args()
+    asyncio.run(run(args=args) if args.command == 'run' else record(args=args))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,12 @@
 import asyncio
 import os
 
+from agent_hack.action_executor import ActionExecutor
 from agent_hack.agent_manager import AgentManager
+from agent_hack.chat_message_index import create_chat_message_index
+from agent_hack.checkpoint_store import create_checkpoint_store
+from agent_hack.wallet_registry import WalletRegistry
+from agent_hack.wallet_registry import create_wallet_store
 
 GEMINI_API_KEY = os.environ["GEMINI_API_KEY"]
 CDP_API_KEY_NAME = os.environ["CDP_API_KEY_NAME"]
@@ -11,12 +16,20 @@ NETWORK_ID = os.environ["NETWORK_ID"]
 
 async def main():
     print("Starting Agent... (type 'exit' to end)")
+    checkpointStore = create_checkpoint_store(connectionString="sqlite:///./data/checkpoints.sqlite")
+    await checkpointStore.connect()
+    chatMessageIndex = create_chat_message_index(connectionString="sqlite:///./data/chatMessages.sqlite")
+    await chatMessageIndex.connect()
+    walletStore = create_wallet_store(connectionString="file://./data")
+    walletRegistry = WalletRegistry(cdpApiKeyName=CDP_API_KEY_NAME, cdpApiKeyPrivateKey=CDP_API_KEY_PRIVATE_KEY, walletStore=walletStore)
+    actionExecutor = ActionExecutor()
     agentManager = AgentManager(
         geminiApiKey=GEMINI_API_KEY,
-        cdpApiKeyName=CDP_API_KEY_NAME,
-        cdpApiKeyPrivateKey=CDP_API_KEY_PRIVATE_KEY,
         networkId=NETWORK_ID,
-        sqliteDbPath="./data/checkpoints.sqlite",
+        checkpointStore=checkpointStore,
+        walletRegistry=walletRegistry,
+        actionExecutor=actionExecutor,
+        chatMessageIndex=chatMessageIndex,
     )
     while True:
         try:
@@ -28,6 +41,11 @@ async def main():
         except KeyboardInterrupt:
             print("Goodbye Agent!")
             break
+    await agentManager.close()
+    await walletRegistry.close()
+    await actionExecutor.close()
+    await chatMessageIndex.disconnect()
+    await checkpointStore.disconnect()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,16 @@
+import asyncio
+import json
+
+from agent_hack import yield_option_formatter
+from agent_hack import yield_options
+
+
+async def main():
+    yieldOptions = await yield_options.list_all_yield_options(chainId=yield_options.BASE_CHAIN_ID)
+    tokenCounts = yield_option_formatter.measure_token_counts(yieldOptions=yieldOptions)
+    print(json.dumps(tokenCounts, indent=2))
+    print(f"Compact output uses {tokenCounts['compactTokenCount'] / tokenCounts['legacyTokenCount']:.1%} of the legacy tokens")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
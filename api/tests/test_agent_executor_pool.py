@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+from agent_hack.agent_executor_pool import AgentExecutorPool
+
+
+class SlowFactory:
+
+    def __init__(self) -> None:
+        self.callCount = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self) -> str:
+        self.callCount += 1
+        await self.release.wait()
+        return f'executor-{self.callCount}'
+
+
+@pytest.mark.asyncio
+async def test_concurrent_gets_share_one_build() -> None:
+    pool: AgentExecutorPool[str] = AgentExecutorPool()
+    factory = SlowFactory()
+    tasks = [asyncio.create_task(pool.get(key='user', factory=factory)) for _ in range(5)]
+    await asyncio.sleep(0)
+    factory.release.set()
+    assert await asyncio.gather(*tasks) == ['executor-1'] * 5
+    assert factory.callCount == 1
+    assert await pool.get(key='user', factory=factory) == 'executor-1'
+    stats = pool.get_stats()
+    assert (stats.missCount, stats.hitCount, stats.size) == (1, 5, 1)
+
+
+@pytest.mark.asyncio
+async def test_cancelling_the_building_caller_does_not_fail_waiters() -> None:
+    pool: AgentExecutorPool[str] = AgentExecutorPool()
+    factory = SlowFactory()
+    buildingTask = asyncio.create_task(pool.get(key='user', factory=factory))
+    await asyncio.sleep(0)
+    waitingTask = asyncio.create_task(pool.get(key='user', factory=factory))
+    await asyncio.sleep(0)
+    buildingTask.cancel()
+    await asyncio.sleep(0)
+    factory.release.set()
+    assert await waitingTask == 'executor-1'
+    with pytest.raises(asyncio.CancelledError):
+        await buildingTask
+    assert factory.callCount == 1
+    assert pool.get_stats().size == 1
+
+
+@pytest.mark.asyncio
+async def test_cancelled_build_is_retried_by_waiters() -> None:
+    pool: AgentExecutorPool[str] = AgentExecutorPool()
+    factory = SlowFactory()
+    waitingTask = asyncio.create_task(pool.get(key='user', factory=factory))
+    while factory.callCount == 0:
+        await asyncio.sleep(0)
+    pendingBuild = pool._pendingBuilds['user']  # pylint: disable=protected-access
+    pendingBuild.cancel()
+    await asyncio.sleep(0)
+    factory.release.set()
+    assert await waitingTask == 'executor-2'
+    assert factory.callCount == 2
+
+
+@pytest.mark.asyncio
+async def test_failed_build_is_raised_to_every_waiter_and_not_cached() -> None:
+    pool: AgentExecutorPool[str] = AgentExecutorPool()
+    callCount = 0
+    release = asyncio.Event()
+
+    async def failing_factory() -> str:
+        nonlocal callCount
+        callCount += 1
+        await release.wait()
+        raise ValueError('wallet unavailable')
+
+    tasks = [asyncio.create_task(pool.get(key='user', factory=failing_factory)) for _ in range(3)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    assert all(isinstance(result, ValueError) for result in results)
+    assert callCount == 1
+    assert pool.get_stats().size == 0
+    with pytest.raises(ValueError):
+        await pool.get(key='user', factory=failing_factory)
+    assert callCount == 2
+
+
+@pytest.mark.asyncio
+async def test_idle_and_overflow_entries_are_evicted() -> None:
+    pool: AgentExecutorPool[str] = AgentExecutorPool(maxSize=2, idleSeconds=0)
+    for key in ('a', 'b', 'c'):
+        assert await pool.get(key=key, factory=lambda key=key: asyncio.sleep(0, result=key)) == key
+    assert pool.get_stats().size == 1
+    assert pool.get_stats().evictionCount == 2
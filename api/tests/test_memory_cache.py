@@ -0,0 +1,167 @@
+import asyncio
+import gc
+import time
+
+import pytest
+
+from agent_hack import util
+from agent_hack.memory_cache import MemoryCache
+
+NOW = 1_000_000.0
+
+
+class SlowLoader:
+
+    def __init__(self, value: str = 'loaded', loadedTime: float | None = None) -> None:
+        self.value = value
+        self.loadedTime = loadedTime
+        self.callCount = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self) -> tuple[str, float]:
+        self.callCount += 1
+        await self.release.wait()
+        return self.value, self.loadedTime if self.loadedTime is not None else time.time()
+
+
+@pytest.fixture(name='frozenTime')
+def frozen_time_fixture(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(time, 'time', lambda: NOW)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_coalesce_into_one_load() -> None:
+    memoryCache = MemoryCache()
+    loader = SlowLoader()
+    tasks = [asyncio.create_task(memoryCache.get_or_load(key='key', loader=loader, expirySeconds=60)) for _ in range(3)]
+    await asyncio.sleep(0)
+    loader.release.set()
+    assert await asyncio.gather(*tasks) == [('loaded', False), ('loaded', True), ('loaded', True)]
+    assert loader.callCount == 1
+    stats = memoryCache.get_stats()
+    assert (stats.missCount, stats.coalescedCount) == (3, 2)
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_cancel_the_shared_load() -> None:
+    memoryCache = MemoryCache()
+    loader = SlowLoader()
+    firstTask = asyncio.create_task(memoryCache.get_or_load(key='key', loader=loader, expirySeconds=60))
+    secondTask = asyncio.create_task(memoryCache.get_or_load(key='key', loader=loader, expirySeconds=60))
+    await asyncio.sleep(0)
+    firstTask.cancel()
+    await asyncio.sleep(0)
+    loader.release.set()
+    assert await secondTask == ('loaded', True)
+    with pytest.raises(asyncio.CancelledError):
+        await firstTask
+    assert loader.callCount == 1
+    assert memoryCache.get(key='key', expirySeconds=60) == 'loaded'
+
+
+@pytest.mark.asyncio
+async def test_failed_load_with_only_cancelled_callers_is_retrieved() -> None:
+    memoryCache = MemoryCache()
+    loop = asyncio.get_running_loop()
+    unhandledContexts: list[dict[str, object]] = []
+    loop.set_exception_handler(lambda _, context: unhandledContexts.append(context))
+    release = asyncio.Event()
+
+    async def failing_loader() -> tuple[str, float]:
+        await release.wait()
+        raise ValueError('subgraph unavailable')
+
+    task = asyncio.create_task(memoryCache.get_or_load(key='key', loader=failing_loader, expirySeconds=60))
+    await asyncio.sleep(0)
+    inflightLoad = memoryCache._inflightLoads['key']  # pylint: disable=protected-access
+    task.cancel()
+    release.set()
+    await asyncio.wait([task, inflightLoad])
+    del task, inflightLoad
+    gc.collect()
+    await asyncio.sleep(0)
+    loop.set_exception_handler(None)
+    assert unhandledContexts == []
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures('frozenTime')
+async def test_entry_is_fresh_until_it_reaches_the_expiry() -> None:
+    memoryCache = MemoryCache(maxStaleSeconds=30)
+    loader = SlowLoader(value='refreshed')
+    memoryCache.set(key='key', value='cached', loadedTime=NOW - 59.9)
+    assert await memoryCache.get_or_load(key='key', loader=loader, expirySeconds=60) == ('cached', False)
+    assert loader.callCount == 0
+    assert memoryCache.get_stats().hitCount == 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures('frozenTime')
+async def test_expired_entry_is_served_stale_while_it_refreshes() -> None:
+    memoryCache = MemoryCache(maxStaleSeconds=30)
+    loader = SlowLoader(value='refreshed')
+    loader.release.set()
+    memoryCache.set(key='key', value='cached', loadedTime=NOW - 60)
+    assert await memoryCache.get_or_load(key='key', loader=loader, expirySeconds=60) == ('cached', False)
+    assert await memoryCache.get_or_load(key='key', loader=loader, expirySeconds=60) == ('cached', False)
+    await asyncio.sleep(0)
+    assert loader.callCount == 1
+    assert memoryCache.get(key='key', expirySeconds=60) == 'refreshed'
+    assert memoryCache.get_stats().staleHitCount == 2
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures('frozenTime')
+async def test_failed_refresh_keeps_serving_the_stale_entry() -> None:
+    memoryCache = MemoryCache(maxStaleSeconds=30)
+
+    async def failing_loader() -> tuple[str, float]:
+        raise ValueError('subgraph unavailable')
+
+    memoryCache.set(key='key', value='cached', loadedTime=NOW - 70)
+    assert await memoryCache.get_or_load(key='key', loader=failing_loader, expirySeconds=60) == ('cached', False)
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)
+    assert memoryCache.get_stats().refreshFailureCount == 1
+    assert await memoryCache.get_or_load(key='key', loader=failing_loader, expirySeconds=60) == ('cached', False)
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures('frozenTime')
+async def test_entry_past_the_stale_window_is_loaded_before_returning() -> None:
+    memoryCache = MemoryCache(maxStaleSeconds=30)
+    loader = SlowLoader(value='refreshed')
+    loader.release.set()
+    memoryCache.set(key='key', value='cached', loadedTime=NOW - 90)
+    assert await memoryCache.get_or_load(key='key', loader=loader, expirySeconds=60) == ('refreshed', False)
+    assert memoryCache.get_stats().missCount == 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures('frozenTime')
+async def test_old_loaded_time_does_not_get_a_fresh_lifetime() -> None:
+    memoryCache = MemoryCache(maxStaleSeconds=0)
+    loader = SlowLoader(value='from-disk', loadedTime=NOW - 60)
+    loader.release.set()
+    assert await memoryCache.get_or_load(key='key', loader=loader, expirySeconds=60) == ('from-disk', False)
+    assert memoryCache.get(key='key', expirySeconds=60) is None
+
+
+@pytest.mark.asyncio
+async def test_load_or_query_counts_coalesced_callers_separately(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(util, '_memoryCache', MemoryCache())
+    recordedResults: list[str] = []
+    monkeypatch.setattr(util.tracing, 'record_event', lambda name, **labels: recordedResults.append(labels['result']))
+    release = asyncio.Event()
+
+    async def load_or_query_shared(**_: object) -> tuple[list[str], float]:
+        await release.wait()
+        return ['vault'], time.time()
+
+    monkeypatch.setattr(util, '_load_or_query_shared', load_or_query_shared)
+    tasks = [asyncio.create_task(util.load_or_query(requester=None, source='morpho', entityName='vaults', url='', dataDict={})) for _ in range(2)]  # type: ignore[arg-type]
+    await asyncio.sleep(0)
+    release.set()
+    assert await asyncio.gather(*tasks) == [['vault'], ['vault']]
+    assert await util.load_or_query(requester=None, source='morpho', entityName='vaults', url='', dataDict={}) == ['vault']  # type: ignore[arg-type]
+    assert recordedResults == ['coalesced', 'memory_hit']
@@ -0,0 +1,102 @@
+import pytest
+
+from agent_hack.response_cache import ResponseCache
+from agent_hack.response_cache import is_cacheable_question
+from agent_hack.response_cache import normalize_question
+
+YIELD_TOOL_NAMES = {'list_all_yield_options'}
+
+
+def _create_response_cache(version: str | None = 'v1', ttlSeconds: float = 600) -> ResponseCache:
+    return ResponseCache(versionProvider=lambda: version, ttlSeconds=ttlSeconds)
+
+
+@pytest.mark.parametrize('question', [
+    'What are the best yields right now?',
+    'Which vault has the highest APY?',
+    'What interest rates are there on USDC?',
+    'list the earning options for cbBTC',
+])
+def test_general_yield_questions_are_cacheable(question: str) -> None:
+    assert is_cacheable_question(normalizedQuestion=normalize_question(question=question))
+
+
+@pytest.mark.parametrize('question', [
+    'What is my yield?',
+    'What rates can I get on USDC',
+    'show me earning options for cbBTC',
+    'Deposit 10 USDC into the best vault',
+    'Whats the APY on 0x7bfa7c4f149e7415b73bdedfe609237e29cbf34a',
+    'Which vault should I move my balance to for a better rate?',
+    'Check the status of my transaction job',
+    'Hello there',
+    'Swap my ETH into the highest yield',
+])
+def test_wallet_specific_and_unrelated_questions_are_not_cacheable(question: str) -> None:
+    assert not is_cacheable_question(normalizedQuestion=normalize_question(question=question))
+
+
+def test_rephrased_question_is_served_from_the_cache() -> None:
+    responseCache = _create_response_cache()
+    assert responseCache.set(question='What are the best yields?', response='Vault A at 10%', toolNames=YIELD_TOOL_NAMES)
+    assert responseCache.get(question='what are the best yields right now') == 'Vault A at 10%'
+    assert responseCache.get_stats().hitCount == 1
+
+
+def test_question_about_another_asset_is_not_served_from_the_cache() -> None:
+    responseCache = _create_response_cache()
+    assert responseCache.set(question='What are the best USDC yields?', response='Vault A at 10%', toolNames=YIELD_TOOL_NAMES)
+    assert responseCache.get(question='What are the best WETH yields?') is None
+
+
+def test_follow_up_to_a_wallet_question_is_not_served_from_the_cache() -> None:
+    responseCache = _create_response_cache()
+    assert responseCache.set(question='What are the best yields?', response='Vault A at 10%', toolNames=YIELD_TOOL_NAMES)
+    assert responseCache.get(question='What are the best yields?', previousQuestion='What is in my wallet?') is None
+    assert responseCache.get(question='What are the best yields?', previousQuestion='Which vault has the highest APY?') == 'Vault A at 10%'
+    assert responseCache.get_stats().bypassCount == 1
+
+
+def test_answer_to_a_follow_up_of_a_wallet_question_is_not_stored() -> None:
+    responseCache = _create_response_cache()
+    assert not responseCache.set(question='What are the best yields?', response='Given your 500 USDC, Vault A', toolNames=YIELD_TOOL_NAMES, previousQuestion='How much USDC is in my wallet?')
+    assert responseCache.get(question='What are the best yields?') is None
+    assert responseCache.get_stats().storeCount == 0
+
+
+def test_answer_without_any_tool_calls_is_not_stored() -> None:
+    responseCache = _create_response_cache()
+    assert not responseCache.set(question='What are the best yields?', response='As we discussed, Vault A', toolNames=set())
+    assert responseCache.get(question='What are the best yields?') is None
+
+
+def test_answer_using_a_wallet_tool_is_not_stored() -> None:
+    responseCache = _create_response_cache()
+    assert not responseCache.set(question='What are the best yields?', response='Vault A', toolNames={'list_all_yield_options', 'get_balance'})
+
+
+def test_wallet_question_and_empty_answer_are_not_stored() -> None:
+    responseCache = _create_response_cache()
+    assert not responseCache.set(question='What is my yield?', response='5%', toolNames=YIELD_TOOL_NAMES)
+    assert not responseCache.set(question='What are the best yields?', response='', toolNames=YIELD_TOOL_NAMES)
+
+
+def test_nothing_is_cached_before_the_yield_data_has_loaded() -> None:
+    responseCache = _create_response_cache(version=None)
+    assert not responseCache.set(question='What are the best yields?', response='Vault A', toolNames=YIELD_TOOL_NAMES)
+    assert responseCache.get(question='What are the best yields?') is None
+
+
+def test_refreshed_yield_data_clears_the_cache() -> None:
+    version = 'v1'
+    responseCache = ResponseCache(versionProvider=lambda: version)
+    assert responseCache.set(question='What are the best yields?', response='Vault A', toolNames=YIELD_TOOL_NAMES)
+    version = 'v2'
+    assert responseCache.get(question='What are the best yields?') is None
+    assert responseCache.get_stats().size == 0
+
+
+def test_expired_entries_are_not_served() -> None:
+    responseCache = _create_response_cache(ttlSeconds=0)
+    assert responseCache.set(question='What are the best yields?', response='Vault A', toolNames=YIELD_TOOL_NAMES)
+    assert responseCache.get(question='What are the best yields?') is None
@@ -0,0 +1,80 @@
+import asyncio
+import multiprocessing
+import os
+import pathlib
+import time
+
+import pytest
+
+from agent_hack.shared_state import FileSharedState
+from agent_hack.shared_state import LockTimeoutException
+
+PROCESS_COUNT = 4
+INCREMENTS_PER_PROCESS = 10
+
+
+async def _increment_counter(directoryPath: str, incrementCount: int) -> None:
+    sharedState = FileSharedState(directoryPath=directoryPath)
+    counterFilePath = os.path.join(directoryPath, 'counter')
+    for _ in range(incrementCount):
+        async with sharedState.lock(name='counter', timeoutSeconds=30):
+            with open(counterFilePath, encoding='utf-8') as counterFile:
+                count = int(counterFile.read())
+            # Widens the gap between the read and the write so any overlap between holders loses an increment
+            time.sleep(0.002)
+            with open(counterFilePath, 'w', encoding='utf-8') as counterFile:
+                counterFile.write(str(count + 1))
+
+
+def _run_increment_counter(directoryPath: str, incrementCount: int) -> None:
+    asyncio.run(_increment_counter(directoryPath=directoryPath, incrementCount=incrementCount))
+
+
+def test_lock_excludes_other_processes(tmp_path: pathlib.Path) -> None:
+    directoryPath = str(tmp_path)
+    with open(os.path.join(directoryPath, 'counter'), 'w', encoding='utf-8') as counterFile:
+        counterFile.write('0')
+    context = multiprocessing.get_context('spawn')
+    processes = [context.Process(target=_run_increment_counter, args=(directoryPath, INCREMENTS_PER_PROCESS)) for _ in range(PROCESS_COUNT)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(timeout=60)
+        assert process.exitcode == 0
+    with open(os.path.join(directoryPath, 'counter'), encoding='utf-8') as counterFile:
+        assert int(counterFile.read()) == PROCESS_COUNT * INCREMENTS_PER_PROCESS
+    assert os.listdir(os.path.join(directoryPath, 'locks')) == []
+
+
+@pytest.mark.asyncio
+async def test_lock_times_out_while_another_holder_has_it(tmp_path: pathlib.Path) -> None:
+    sharedState = FileSharedState(directoryPath=str(tmp_path))
+    async with sharedState.lock(name='wallet', timeoutSeconds=1):
+        with pytest.raises(LockTimeoutException):
+            async with sharedState.lock(name='wallet', timeoutSeconds=0.1):
+                pass
+    async with sharedState.lock(name='wallet', timeoutSeconds=0.1):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_lock_is_released_when_the_holder_raises(tmp_path: pathlib.Path) -> None:
+    sharedState = FileSharedState(directoryPath=str(tmp_path))
+    with pytest.raises(ValueError):
+        async with sharedState.lock(name='wallet', timeoutSeconds=1):
+            raise ValueError('hydration failed')
+    async with sharedState.lock(name='wallet', timeoutSeconds=0.1):
+        pass
+    assert os.listdir(os.path.join(str(tmp_path), 'locks')) == []
+
+
+@pytest.mark.asyncio
+async def test_values_round_trip_with_their_set_time(tmp_path: pathlib.Path) -> None:
+    sharedState = FileSharedState(directoryPath=str(tmp_path))
+    assert await sharedState.get(key='missing') is None
+    beforeTime = time.time()
+    await sharedState.set(key='cache/morpho vaults', value=b'content')
+    storedValue = await sharedState.get(key='cache/morpho vaults')
+    assert storedValue is not None
+    assert storedValue[0] == b'content'
+    assert storedValue[1] >= beforeTime - 1
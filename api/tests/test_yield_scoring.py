@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+
+from agent_hack.yield_scoring import CONSERVATIVE_SCORING_PROFILE
+from agent_hack.yield_scoring import DEFAULT_SCORING_PROFILE
+from agent_hack.yield_scoring import ScoringProfile
+from agent_hack.yield_scoring import score_vaults
+
+TokenMetrics = tuple[float, float, float] | None
+
+
+def _calculate_token_quality_factor(tokenMetrics: TokenMetrics, profile: ScoringProfile) -> float:
+    # The per-token calculation yield_options used before scoring was vectorized
+    if tokenMetrics is None:
+        return 0.0
+    totalValueLockedUsd, volumeUsd, txCount = tokenMetrics
+    tvlFactor = min(1.0, max(0.0, (totalValueLockedUsd - profile.minTvlUsd) / (profile.goodTvlUsd - profile.minTvlUsd)))
+    volumeFactor = min(1.0, max(0.0, (volumeUsd - profile.minVolumeUsd) / (profile.goodVolumeUsd - profile.minVolumeUsd)))
+    txFactor = min(1.0, max(0.0, (txCount - profile.minTxCount) / (profile.goodTxCount - profile.minTxCount)))
+    return (tvlFactor * profile.tvlWeight) + (volumeFactor * profile.volumeWeight) + (txFactor * profile.txCountWeight)
+
+
+def _score_vaults_one_by_one(baseApys: list[float], vaultRewards: list[list[tuple[int, float]]], uniswapTokens: list[TokenMetrics], aerodromeTokens: list[TokenMetrics], profile: ScoringProfile) -> list[float]:
+    riskAdjustedApys: list[float] = []
+    for baseApy, rewards in zip(baseApys, vaultRewards):
+        overallRiskAdjustedApy = baseApy
+        for tokenIndex, rewardApy in rewards:
+            uniswapFactor = _calculate_token_quality_factor(tokenMetrics=uniswapTokens[tokenIndex], profile=profile)
+            aerodromeFactor = _calculate_token_quality_factor(tokenMetrics=aerodromeTokens[tokenIndex], profile=profile)
+            overallRiskAdjustedApy += rewardApy * max(uniswapFactor, aerodromeFactor)
+        riskAdjustedApys.append(overallRiskAdjustedApy)
+    return riskAdjustedApys
+
+
+def _build_token_metrics(tokens: list[TokenMetrics]) -> np.ndarray:
+    return np.array([token if token is not None else (np.nan, np.nan, np.nan) for token in tokens], dtype=np.float64).reshape(len(tokens), 3)
+
+
+def _generate_tokens(generator: np.random.Generator, tokenCount: int) -> list[TokenMetrics]:
+    return [
+        None if generator.random() < 0.3 else (float(generator.uniform(0, 20_000_000)), float(generator.uniform(0, 10_000_000)), float(generator.integers(0, 20_000)))
+        for _ in range(tokenCount)
+    ]
+
+
+@pytest.mark.parametrize('profile', [DEFAULT_SCORING_PROFILE, CONSERVATIVE_SCORING_PROFILE], ids=lambda profile: profile.name)
+@pytest.mark.parametrize('seed', range(5))
+def test_vectorized_scores_match_per_vault_scores(profile: ScoringProfile, seed: int) -> None:
+    generator = np.random.default_rng(seed)
+    vaultCount = 200
+    tokenCount = 60
+    uniswapTokens = _generate_tokens(generator=generator, tokenCount=tokenCount)
+    aerodromeTokens = _generate_tokens(generator=generator, tokenCount=tokenCount)
+    baseApys = [float(apy) for apy in generator.uniform(0, 0.2, size=vaultCount)]
+    vaultRewards = [
+        [(int(generator.integers(0, tokenCount)), float(generator.uniform(0, 0.3))) for _ in range(int(generator.integers(0, 4)))]
+        for _ in range(vaultCount)
+    ]
+    rewardVaultIndices = np.array([vaultIndex for vaultIndex, rewards in enumerate(vaultRewards) for _ in rewards], dtype=np.int64)
+    rewardTokenIndices = np.array([tokenIndex for rewards in vaultRewards for tokenIndex, _ in rewards], dtype=np.int64)
+    rewardApys = np.array([rewardApy for rewards in vaultRewards for _, rewardApy in rewards], dtype=np.float64)
+    vaultScores = score_vaults(
+        baseApys=np.array(baseApys, dtype=np.float64),
+        rewardVaultIndices=rewardVaultIndices,
+        rewardTokenIndices=rewardTokenIndices,
+        rewardApys=rewardApys,
+        uniswapTokenMetrics=_build_token_metrics(tokens=uniswapTokens),
+        aerodromeTokenMetrics=_build_token_metrics(tokens=aerodromeTokens),
+        profile=profile,
+    )
+    expectedRiskAdjustedApys = _score_vaults_one_by_one(baseApys=baseApys, vaultRewards=vaultRewards, uniswapTokens=uniswapTokens, aerodromeTokens=aerodromeTokens, profile=profile)
+    np.testing.assert_allclose(vaultScores.vaultRiskAdjustedApys, expectedRiskAdjustedApys, rtol=1e-12, atol=1e-15)
+    expectedOrder = sorted(range(vaultCount), key=lambda vaultIndex: expectedRiskAdjustedApys[vaultIndex], reverse=True)
+    assert vaultScores.get_top_vault_indices().tolist() == expectedOrder
+    assert vaultScores.get_top_vault_indices(limit=10).tolist() == expectedOrder[:10]
+
+
+def test_tied_vaults_keep_their_listing_order() -> None:
+    vaultScores = score_vaults(
+        baseApys=np.array([0.05, 0.1, 0.05, 0.1], dtype=np.float64),
+        rewardVaultIndices=np.zeros(0, dtype=np.int64),
+        rewardTokenIndices=np.zeros(0, dtype=np.int64),
+        rewardApys=np.zeros(0, dtype=np.float64),
+        uniswapTokenMetrics=np.zeros((0, 3), dtype=np.float64),
+        aerodromeTokenMetrics=np.zeros((0, 3), dtype=np.float64),
+    )
+    assert vaultScores.get_top_vault_indices().tolist() == [1, 3, 0, 2]
+
+
+def test_rewards_in_tokens_missing_from_both_dexes_count_for_nothing() -> None:
+    vaultScores = score_vaults(
+        baseApys=np.array([0.05], dtype=np.float64),
+        rewardVaultIndices=np.array([0], dtype=np.int64),
+        rewardTokenIndices=np.array([0], dtype=np.int64),
+        rewardApys=np.array([0.5], dtype=np.float64),
+        uniswapTokenMetrics=_build_token_metrics(tokens=[None]),
+        aerodromeTokenMetrics=_build_token_metrics(tokens=[None]),
+    )
+    assert vaultScores.vaultRiskAdjustedApys.tolist() == [0.05]
+    assert vaultScores.rewardRiskAdjustedApys.tolist() == [0.0]
+